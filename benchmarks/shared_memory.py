@@ -0,0 +1,103 @@
+"""
+Benchmark of the batch handoff between the FASTQ parser and encoder processes.
+
+    python -m benchmarks.shared_memory test_data/fastq/hg19/HIC_HEAD_R1.fastq --workers 4
+
+inline: rows rendered in the parsing process
+pool: multiprocessing.Pool, batches and rendered rows are pickled between the processes
+shared_memory: shm.SharedMemoryEncoder, only batch numbers and slot names are pickled
+Every variant writes the rendered rows of all reads to os.devnull.
+"""
+
+import argparse
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from saradomin.fastq import iter_fastq_batches
+from saradomin.render import render_int_rows
+from saradomin.shm import NUCLEOTIDE_CODES, UNKNOWN_BASE_CODE, SharedMemoryEncoder
+
+
+def render_batch(sequences: list[str], qualities: list[str]) -> tuple[bytes, np.ndarray, bytes, np.ndarray]:
+    lengths = np.fromiter(map(len, sequences), dtype=np.int64, count=len(sequences))
+    codes = NUCLEOTIDE_CODES[np.frombuffer("".join(sequences).encode("ascii"), dtype=np.uint8)]
+    scores = np.frombuffer("".join(qualities).encode("ascii"), dtype=np.uint8)
+    nucleotides, nucleotide_ends = render_int_rows(codes, lengths, quoted=UNKNOWN_BASE_CODE)
+    score_rows, score_ends = render_int_rows(scores, lengths)
+    return nucleotides.tobytes(), nucleotide_ends, score_rows.tobytes(), score_ends
+
+
+def write_rows(output_file, nucleotides, nucleotide_ends: np.ndarray, scores, score_ends: np.ndarray) -> None:
+    nucleotide_start, score_start = 0, 0
+    for nucleotide_end, score_end in zip(nucleotide_ends.tolist(), score_ends.tolist()):
+        output_file.write(nucleotides[nucleotide_start:nucleotide_end])
+        output_file.write(scores[score_start:score_end])
+        nucleotide_start, score_start = nucleotide_end, score_end
+
+
+def run_inline(fastq_path: str, batch_size: int, workers: int) -> int:
+    reads = 0
+    with open(fastq_path, "r") as fastq_file, open(os.devnull, "wb") as output_file:
+        for batch in iter_fastq_batches(fastq_file, batch_size):
+            nucleotides, nucleotide_ends, scores, score_ends = render_batch(batch.sequences, batch.qualities)
+            write_rows(output_file, memoryview(nucleotides), nucleotide_ends, memoryview(scores), score_ends)
+            reads += len(batch)
+    return reads
+
+
+def run_pool(fastq_path: str, batch_size: int, workers: int) -> int:
+    reads = 0
+    with (
+        open(fastq_path, "r") as fastq_file,
+        open(os.devnull, "wb") as output_file,
+        multiprocessing.Pool(workers) as pool,
+    ):
+        batches = ((batch.sequences, batch.qualities) for batch in iter_fastq_batches(fastq_file, batch_size))
+        for nucleotides, nucleotide_ends, scores, score_ends in pool.imap(unpack_render_batch, batches):
+            write_rows(output_file, memoryview(nucleotides), nucleotide_ends, memoryview(scores), score_ends)
+            reads += len(nucleotide_ends)
+    return reads
+
+
+def unpack_render_batch(args: tuple[list[str], list[str]]):
+    return render_batch(*args)
+
+
+def run_shared_memory(fastq_path: str, batch_size: int, workers: int) -> int:
+    reads = 0
+    with (
+        open(fastq_path, "r") as fastq_file,
+        open(os.devnull, "wb") as output_file,
+        SharedMemoryEncoder(workers) as encoder,
+    ):
+        for batch, encoded in encoder.imap(iter_fastq_batches(fastq_file, batch_size)):
+            write_rows(
+                output_file, encoded.nucleotide_rows, encoded.nucleotide_ends, encoded.score_rows, encoded.score_ends
+            )
+            reads += len(batch)
+    return reads
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("fastq", help="FASTQ file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--batch-size", type=int, default=65536)
+    parser.add_argument("--repeat", type=int, default=3, help="best of this many runs is reported")
+    args = parser.parse_args()
+
+    for name, function in (("inline", run_inline), ("pool", run_pool), ("shared_memory", run_shared_memory)):
+        timings: list[float] = []
+        for _ in range(args.repeat):
+            start_time = time.perf_counter()
+            reads = function(args.fastq, args.batch_size, args.workers)
+            timings.append(time.perf_counter() - start_time)
+        best = min(timings)
+        print(f"{name:>14}: {best:.3f} s, {reads / best:,.0f} reads/s ({args.workers} workers)")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,84 @@ TRAIN_DATA_PERCENTAGE = 0.9
 KEEP_CORRECT_TRAIN_PAIR = 0.5
 KEEP_CORRECT_TEST_PAIR = 0.0
 
+# Read filtering before encoding. A pair is dropped when either mate fails.
+FILTER_READS = False
+FILTER_MIN_LENGTH = 0
+FILTER_MAX_N_FRACTION = 1.0
+FILTER_MIN_MEAN_QUALITY = 0.0  # PHRED
+FILTER_MIN_PERCENTILE_QUALITY = 0.0  # PHRED
+FILTER_QUALITY_PERCENTILE = 10.0
+
+# Overlapping k-mer token ids exported as KMER row, k-mers containing N get the token id 4**KMER_SIZE
+KMER_EXPORT = False
+KMER_SIZE = 6
+KMER_STRIDE = 1
+KMER_ONLY = False  # export KMER row instead of NUCLEOTIDE row
+
+# PCR duplicate pair removal: "" (disabled), "exact" or "bloom"
+DEDUP_MODE = ""
+DEDUP_PREFIX_LENGTH = 0  # bases of each mate compared, 0 compares whole sequences
+DEDUP_EXPECTED_PAIRS = 10_000_000  # sizes the fixed memory of both modes
+DEDUP_FALSE_POSITIVE_RATE = 0.001  # bloom mode only
+
+# "separate" READ_1/READ_2 files, "interleaved" PAIRS.txt with R1 and R2 rows and a correct pair label per record,
+# or "both"
+OUTPUT_LAYOUT = "separate"
+
+# Subsampling of the read pairs: "" (disabled), "bernoulli" (SUBSAMPLE_FRACTION), "reservoir" (SUBSAMPLE_READS)
+# or "offset" (SUBSAMPLE_READS or SUBSAMPLE_FRACTION, reads records at random byte offsets without a full pass)
+SUBSAMPLE_STRATEGY = ""
+SUBSAMPLE_FRACTION = 0.0
+SUBSAMPLE_READS = 0
+SUBSAMPLE_SEED = 0
+
+# Augmented copies of every read: reverse complement and/or random base substitutions (seeded). Copies are tagged
+# on the UID line ("12\trc", "12\tsub"), stay with their read in the train data and are dropped from the test data
+AUGMENT_REVERSE_COMPLEMENT = False
+AUGMENT_SUBSTITUTION_RATE = 0.0  # probability of substituting a base, 0 = no substituted copy
+AUGMENT_SEED = 0
+
+# Sparse contact matrices of the HiC-Pro .allValidPairs file in FASTQ_DIR at these bin sizes (bp), comma separated,
+# e.g. "1000000,100000,10000". Saved to OUTPUT_DIR/contacts/contacts_<resolution>.npz. "" = disabled
+CONTACT_RESOLUTIONS = ""
+
+# Memory budget of a run, e.g. "8G" or "512M". Stages which do not fit switch to external algorithms. "0" = no limit
+MAX_MEMORY = "0"
+
+# Independent stages (split of R1 and R2, shuffle of train and test R2) run concurrently on a "thread" or "process" pool
+STAGE_WORKERS = 4
+STAGE_EXECUTOR = "thread"
+
+# Processes rendering the NUCLEOTIDE and SCORE rows, batches are handed over in shared memory. 0 = render inline
+ENCODER_WORKERS = 0
+
+# Compression of the train/test outputs after the run: "" (text), "gzip" or "zstd" (needs the zstandard package).
+# Outputs are written as independent frames of OUTPUT_FRAME_READS records with a seek table (<output>.seek.npz),
+# see framed.FramedReader. 0 = default level of the codec
+OUTPUT_COMPRESSION = ""
+OUTPUT_FRAME_READS = 4096
+OUTPUT_COMPRESSION_LEVEL = 0
+
+# Profiling of the pipeline stages: "" (disabled), "deterministic" (cProfile) or "sampling" (stack samples).
+# Per stage .prof and/or .collapsed (flamegraph input) files, PROFILE_MEMORY adds tracemalloc top allocations.
+# Written to PROFILE_DIR, "" = OUTPUT_DIR/profile
+PROFILE_MODE = ""
+PROFILE_MEMORY = False
+PROFILE_DIR = ""
+
+# Progress of the running stages (reads, bytes, reads/s, ETA) every PROGRESS_INTERVAL seconds, 0 = disabled.
+# Written to the log (PROGRESS_LOG) and/or a Prometheus textfile for the node_exporter textfile collector
+PROGRESS_INTERVAL = 0.0
+PROGRESS_TEXTFILE = ""  # e.g. "/var/lib/node_exporter/textfile_collector/saradomin.prom"
+PROGRESS_LOG = True
+
+# Checkpoint of the read encoding (save_fastq) every CHECKPOINT_INTERVAL seconds, 0 = disabled.
+# A run restarted with the same inputs and settings resumes the outputs from their <output>.checkpoint.json
+CHECKPOINT_INTERVAL = 0.0
+
+WRITE_STATS = False  # base composition, per-position quality, read lengths and split counts in OUTPUT_DIR/stats.npz
+WRITE_NAME_INDEX = True  # read name <-> UID index in OUTPUT_DIR/read_names, see names.NameIndex
+
 LOG_CONFIG = {
     "version": 1,
     "formatters": {
@@ -1,5 +1,5 @@
-from saradomin.main import run
+from saradomin.cli import main
 
 
 if __name__ == "__main__":
-    run()
+    main()
@@ -3,7 +3,32 @@ import os
 
 from saradomin.main import run
 
-from tests import test_config
+from tests import (
+    test_config,
+    test_filter,
+    test_kmer,
+    test_partition,
+    test_scheduler,
+    test_shm,
+    test_augment,
+    test_subsample,
+    test_interleave,
+    test_convert,
+    test_verify,
+    test_contacts,
+    test_append,
+    test_batch,
+    test_profiler,
+    test_progress,
+    test_framed,
+    test_copy,
+    test_checkpoint,
+    test_names,
+    test_split,
+    test_dedup,
+    test_planner,
+    test_stats,
+)
 from tests.test_output import test_output_factory
 
 
@@ -39,6 +64,29 @@ if __name__ == "__main__":
     test_class = test_output_factory(fastq_dir_path, output_dir_path)
     tests = unittest.TestLoader().loadTestsFromTestCase(test_class)
     suite.addTests(tests)
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(test_filter))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(test_kmer))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(test_partition))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(test_scheduler))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(test_shm))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(test_augment))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(test_subsample))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(test_interleave))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(test_convert))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(test_verify))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(test_contacts))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(test_append))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(test_batch))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(test_profiler))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(test_progress))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(test_framed))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(test_copy))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(test_checkpoint))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(test_names))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(test_split))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(test_dedup))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(test_planner))
+    suite.addTests(unittest.TestLoader().loadTestsFromModule(test_stats))
 
     runner = unittest.TextTestRunner(verbosity=2)
     runner.run(suite)
@@ -0,0 +1,187 @@
+import glob
+import os
+import shutil
+from datetime import datetime
+
+from . import common, log
+from .framed import find_framed_outputs
+from .interleave import HEADER_END, read_header
+from .manifest import read_manifest, write_manifest
+from .names import merge_name_indexes, name_index_dir
+from .profiler import profiler
+from .stats import DatasetStats
+from .transform import transform_data_to_vectors
+
+APPEND_DIR_NAME: str = "append"
+STATS_FILE_NAME: str = "stats.npz"
+STATS_BACKUP_NAME: str = "stats.npz.pending"  # stats before an unfinished append, restored by rollback_pending
+
+
+def dataset_files(output_dir: str) -> list[str]:
+    """Text outputs of the train and test directories, relative to output_dir."""
+    paths: list[str] = glob.glob(f"{output_dir}/train/*.txt") + glob.glob(f"{output_dir}/test/*.txt")
+    return sorted(os.path.relpath(path, output_dir) for path in paths)
+
+
+def header_without_date(path: str) -> list[str]:
+    with open(path, "r") as f:
+        return [line for line in read_header(f) if not line.startswith("#DATE=")]
+
+
+def update_header_date(path: str) -> bool:
+    """
+    Set the #DATE= line of an output to the current time in place. The header is only rewritten
+    when it keeps its size, the records after it are never moved.
+
+    :return: True when the date was updated.
+    """
+    offset: int = 0
+    with open(path, "r+b") as f:
+        for line in f:
+            if line.startswith(b"#DATE="):
+                old_date: bytes = line[len(b"#DATE=") :].rstrip(b"\n")
+                timespec: str = "microseconds" if len(old_date) > len("YYYY-MM-DDTHH:MM:SS") else "seconds"
+                new_date: bytes = datetime.utcnow().isoformat(timespec=timespec).encode()
+                if len(new_date) != len(old_date):
+                    return False
+                f.seek(offset + len(b"#DATE="))
+                f.write(new_date)
+                return True
+            if line.startswith(HEADER_END.encode()):
+                break
+            offset += len(line)
+    return False
+
+
+def rollback_pending(output_dir: str, manifest: dict) -> dict:
+    """Truncate the outputs to their size and restore the stats of the dataset before an append which did not finish."""
+    pending: dict | None = manifest.pop("pending", None)
+    if pending:
+        for relative_path, size in pending["sizes"].items():
+            os.truncate(f"{output_dir}/{relative_path}", size)
+        if pending.get("stats_backup"):
+            os.replace(f"{output_dir}/{pending['stats_backup']}", f"{output_dir}/{STATS_FILE_NAME}")
+        log.warning(f"rolled back the unfinished append of {pending['fastq_r1']}")
+        write_manifest(output_dir, manifest)
+    return manifest
+
+
+def is_in_dataset(manifest: dict, fastq_r1_path: str) -> bool:
+    for entry in manifest["inputs"]:
+        if entry["fastq_r1"] == os.path.abspath(fastq_r1_path):
+            if entry["size_r1"] != os.path.getsize(fastq_r1_path):
+                log.warning(f"{fastq_r1_path} changed since it was added to the dataset, it is not appended again")
+            return True
+    return False
+
+
+def append_outputs(output_dir: str, lane_dir: str, manifest: dict) -> dict:
+    """
+    Append the records of the outputs of lane_dir to the outputs of output_dir and add the lane to the manifest.
+    The sizes of the outputs and a copy of the stats are recorded in the manifest before,
+    so an interrupted append is rolled back.
+
+    :return: Manifest entry of the lane.
+    """
+    files: list[str] = dataset_files(lane_dir)
+    if files != dataset_files(output_dir):
+        raise ValueError(f"Outputs of the new pair {files} differ from the dataset, was OUTPUT_LAYOUT changed?")
+    for relative_path in files:
+        if header_without_date(f"{output_dir}/{relative_path}") != header_without_date(f"{lane_dir}/{relative_path}"):
+            raise ValueError(f"Header of {relative_path} differs from the dataset, was the configuration changed?")
+
+    entry: dict = read_manifest(lane_dir)["inputs"][0]
+    sizes: dict[str, int] = {path: os.path.getsize(f"{output_dir}/{path}") for path in files}
+    manifest["pending"] = {"fastq_r1": entry["fastq_r1"], "sizes": sizes}
+    stats_path, lane_stats_path = f"{output_dir}/{STATS_FILE_NAME}", f"{lane_dir}/{STATS_FILE_NAME}"
+    merge_stats: bool = os.path.exists(stats_path) and os.path.exists(lane_stats_path)
+    if merge_stats:
+        shutil.copyfile(stats_path, f"{output_dir}/{STATS_BACKUP_NAME}")
+        manifest["pending"]["stats_backup"] = STATS_BACKUP_NAME
+    write_manifest(output_dir, manifest)
+    for relative_path in files:
+        common.append_file_skip_hash_lines(f"{output_dir}/{relative_path}", f"{lane_dir}/{relative_path}")
+        update_header_date(f"{output_dir}/{relative_path}")
+
+    if merge_stats:
+        stats = DatasetStats.load(stats_path)
+        stats.merge(DatasetStats.load(lane_stats_path))
+        stats.save(stats_path + ".tmp")
+        os.replace(stats_path + ".tmp", stats_path)
+
+    index_dir, lane_index_dir = name_index_dir(output_dir), name_index_dir(lane_dir)
+    if os.path.isdir(index_dir) and os.path.isdir(lane_index_dir):
+        # rows of an interrupted append of this pair are dropped, their UIDs start at first_uid
+        merge_name_indexes(index_dir, [index_dir, lane_index_dir], [entry["first_uid"], None])
+    elif os.path.isdir(index_dir):
+        shutil.rmtree(index_dir)
+        log.warning(f"{entry['fastq_r1']} has no read name index, the index of {output_dir} is removed")
+
+    del manifest["pending"]
+    manifest["inputs"].append(entry)
+    manifest["next_uid"] = max(manifest["next_uid"], entry["next_uid"])
+    write_manifest(output_dir, manifest)
+    if merge_stats:
+        os.remove(f"{output_dir}/{STATS_BACKUP_NAME}")
+    return entry
+
+
+@profiler
+def append_new_pairs(
+    fastq_dir: str,
+    output_dir: str,
+    train_data_fraction: float,
+    keep_correct_train_pair: float,
+    keep_correct_test_pair: float,
+    version_: list[int],
+    **transform_options,
+) -> int:
+    """
+    Add the FASTQ pairs of fastq_dir which are not in the dataset of output_dir yet, e.g. new sequencing lanes.
+    Every new pair is transformed on its own with UIDs continuing after the dataset, split into train/test data
+    and disrupted with the same fractions, then its records are appended to the existing outputs.
+    Work is proportional to the new pairs, the existing outputs are only appended to.
+    Without a dataset the first pair is transformed into output_dir.
+
+    :param fastq_dir: Directory with the _R1/_R2 FASTQ pairs.
+    :param output_dir: Output directory of the dataset with its manifest.json.
+    :param train_data_fraction: Fraction of the new reads used as training data.
+    :param keep_correct_train_pair: Fraction of correct pairs kept in the new training data.
+    :param keep_correct_test_pair: Fraction of correct pairs kept in the new testing data.
+    :param version_: Version written to the headers.
+    :param transform_options: Options of transform_data_to_vectors, e.g. read_filter or output_layout.
+    :return: Number of appended pairs.
+    """
+    if find_framed_outputs(output_dir):
+        raise ValueError(f"{output_dir} has compressed outputs, decompress them (e.g. gunzip) before appending")
+    pairs: list[tuple[str, str]] = common.find_r1_r2_pairs(fastq_dir)
+    arguments: tuple = (train_data_fraction, keep_correct_train_pair, keep_correct_test_pair, version_)
+    manifest: dict | None = read_manifest(output_dir)
+    if manifest is None:
+        if os.path.isdir(output_dir) and dataset_files(output_dir):
+            raise ValueError(f"{output_dir} has outputs but no manifest, the new pairs cannot be numbered")
+        if not pairs:
+            log.warning(f"no FASTQ pairs in {fastq_dir}")
+            return 0
+        transform_data_to_vectors(fastq_dir, output_dir, *arguments, fastq_pair=pairs[0], **transform_options)
+        manifest = read_manifest(output_dir)
+    manifest = rollback_pending(output_dir, manifest)
+
+    new_pairs: list[tuple[str, str]] = [pair for pair in pairs if not is_in_dataset(manifest, pair[0])]
+    lane_dir: str = f"{output_dir}/{APPEND_DIR_NAME}"
+    for fastq_r1_path, fastq_r2_path in new_pairs:
+        if os.path.exists(lane_dir):
+            shutil.rmtree(lane_dir)
+        transform_data_to_vectors(
+            fastq_dir,
+            lane_dir,
+            *arguments,
+            fastq_pair=(fastq_r1_path, fastq_r2_path),
+            uid_start=manifest["next_uid"],
+            **transform_options,
+        )
+        entry: dict = append_outputs(output_dir, lane_dir, manifest)
+        shutil.rmtree(lane_dir)
+        log.info(f"appended {entry['reads']} reads of {fastq_r1_path}, first UID {entry['first_uid']}")
+    log.info(f"{len(new_pairs)} new FASTQ pairs appended to {output_dir}, {len(manifest['inputs'])} in the dataset")
+    return len(new_pairs)
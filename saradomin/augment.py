@@ -0,0 +1,128 @@
+import zlib
+from dataclasses import dataclass
+
+import numpy as np
+
+from .fastq import FastqBatch
+from .kmer import KmerTokenizer
+from .render import render_int_rows
+from .shm import NUCLEOTIDE_CODES, UNKNOWN_BASE_CODE
+
+# Codes of the header mapping, A=0, C=1, G=2, T=3, N=4. Characters outside ACGTN keep UNKNOWN_BASE_CODE
+COMPLEMENT_CODES = np.arange(256, dtype=np.uint8)
+COMPLEMENT_CODES[:4] = [3, 2, 1, 0]
+
+REVERSE_COMPLEMENT_TAG: str = "rc"
+SUBSTITUTION_TAG: str = "sub"
+
+
+def reverse_segments(values: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Reverse every segment of a flat array, segments given by their lengths."""
+    ends = np.cumsum(lengths)
+    # position p of the segment [start, end) takes the value at start + end - 1 - p
+    index = np.repeat(2 * ends - lengths - 1, lengths) - np.arange(len(values))
+    return values[index]
+
+
+def reverse_complement(codes: np.ndarray, scores: np.ndarray, lengths: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Reverse complement of a batch of encoded reads, the quality scores are reversed with them.
+
+    :param codes: Flat uint8 array of base codes of all reads.
+    :param scores: Flat array of the quality scores of all reads.
+    :param lengths: Length of every read.
+    :return: Codes and scores of the reverse complement reads.
+    """
+    return COMPLEMENT_CODES[reverse_segments(codes, lengths)], reverse_segments(scores, lengths)
+
+
+def substitute(codes: np.ndarray, rate: float, rng: np.random.Generator) -> np.ndarray:
+    """Replace every A/C/G/T with probability rate by one of the three other bases. N is never substituted."""
+    substituted = codes.copy()
+    mutate = (rng.random(len(codes)) < rate) & (codes < 4)
+    shifts = rng.integers(1, 4, size=int(mutate.sum()), dtype=np.uint8)
+    substituted[mutate] = (codes[mutate] + shifts) % 4
+    return substituted
+
+
+@dataclass(slots=True)
+class AugmentedCopy:
+    """Encoded copy of every read of a batch, rendered rows are sliced per read."""
+
+    tag: str
+    nucleotide_rows: np.ndarray
+    nucleotide_ends: np.ndarray
+    score_rows: np.ndarray
+    score_ends: np.ndarray
+    tokens: list[np.ndarray] | None = None
+
+    def record(self, uid: int, i: int, read_vector_schema: list[str]) -> str:
+        """Text of the augmented copy of read i, the UID line carries the tag."""
+        lines: list[str] = [f"{uid}\t{self.tag}\n"]
+        for row in read_vector_schema:
+            if row == "NUCLEOTIDE":
+                start = self.nucleotide_ends[i - 1] if i else 0
+                lines.append(self.nucleotide_rows[start : self.nucleotide_ends[i]].tobytes().decode("ascii"))
+            elif row == "SCORE":
+                start = self.score_ends[i - 1] if i else 0
+                lines.append(self.score_rows[start : self.score_ends[i]].tobytes().decode("ascii"))
+            elif row == "KMER":
+                lines.append(f"{str(self.tokens[i].tolist())}\n")
+        return "".join(lines)
+
+
+@dataclass(slots=True)
+class Augmenter:
+    """
+    Augmented copies written after every kept read: its reverse complement and/or a copy with random substitutions.
+    Copies keep the UID of their read, so they stay on the same side of the train/test split.
+    """
+
+    reverse_complement: bool = False
+    substitution_rate: float = 0.0
+    seed: int = 0
+
+    def __post_init__(self):
+        if not (0 <= self.substitution_rate <= 1):
+            raise ValueError("Substitution rate must be between 0 and 1")
+
+    def is_active(self) -> bool:
+        return self.reverse_complement or self.substitution_rate > 0
+
+    def batch_rng(self, fastq_read_path: str, batch_start: int) -> np.random.Generator:
+        """Generator of one batch, the same for every run with the same seed, file name and batch position."""
+        file_key: int = zlib.crc32(fastq_read_path.rsplit("/", 1)[-1].encode("utf-8"))
+        return np.random.default_rng([self.seed, file_key, batch_start])
+
+    def augment_batch(
+        self,
+        batch: FastqBatch,
+        rng: np.random.Generator,
+        kmer_tokenizer: KmerTokenizer | None = None,
+    ) -> list[AugmentedCopy]:
+        """
+        :param batch: Batch of reads.
+        :param rng: Generator of the substitutions, see batch_rng.
+        :param kmer_tokenizer: Tokenizer of the KMER row, tokens are only computed when given.
+        :return: Augmented copies of the batch in output order.
+        """
+        lengths = np.fromiter(map(len, batch.sequences), dtype=np.int64, count=len(batch))
+        codes = NUCLEOTIDE_CODES[np.frombuffer("".join(batch.sequences).encode("ascii"), dtype=np.uint8)]
+        scores = np.frombuffer("".join(batch.qualities).encode("ascii"), dtype=np.uint8)
+
+        variants: list[tuple[str, np.ndarray, np.ndarray]] = []
+        if self.reverse_complement:
+            variants.append((REVERSE_COMPLEMENT_TAG, *reverse_complement(codes, scores, lengths)))
+        if self.substitution_rate > 0:
+            variants.append((SUBSTITUTION_TAG, substitute(codes, self.substitution_rate, rng), scores))
+
+        copies: list[AugmentedCopy] = []
+        for tag, variant_codes, variant_scores in variants:
+            nucleotide_rows, nucleotide_ends = render_int_rows(variant_codes, lengths, quoted=UNKNOWN_BASE_CODE)
+            score_rows, score_ends = render_int_rows(variant_scores, lengths)
+            tokens: list[np.ndarray] | None = None
+            if kmer_tokenizer is not None:
+                flat_tokens, counts = kmer_tokenizer.tokenize_codes(np.minimum(variant_codes, 4), lengths)
+                tokens = np.split(flat_tokens, np.cumsum(counts)[:-1])
+            copies.append(AugmentedCopy(tag, nucleotide_rows, nucleotide_ends, score_rows, score_ends, tokens))
+        return copies
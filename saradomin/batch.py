@@ -0,0 +1,172 @@
+import copy
+import glob
+import multiprocessing
+import os
+import time
+import traceback
+from dataclasses import dataclass, field
+from multiprocessing.connection import Connection, wait
+
+from . import common, log, struct as st
+from .main import run_transform
+from .manifest import read_manifest
+from .planner import DICT_ENTRY_OVERHEAD, estimate_record_count
+from .profiler import profiler
+from .progress import start_exporter
+
+BATCH_REPORT_NAME: str = "batch_report.json"
+SAMPLE_LOG_NAME: str = "logs/saradomin.txt"
+
+
+@dataclass
+class Sample:
+    """One sample of a batch, a FASTQ directory transformed into its own output directory."""
+
+    name: str
+    fastq_dir: str
+    output_dir: str
+    memory: int = 0  # reserved part of the batch memory budget
+    result: dict = field(default_factory=dict)
+
+
+def find_samples(patterns: list[str], output_root: str) -> list[Sample]:
+    """
+    Sample directories named by patterns (directories or globs), the output directory of a sample
+    is output_root/<directory name>. Repeated names get a numeric suffix.
+    """
+    fastq_dirs: list[str] = []
+    for pattern in patterns:
+        matches: list[str] = sorted(glob.glob(pattern)) or [pattern]
+        fastq_dirs += [os.path.abspath(match) for match in matches if os.path.abspath(match) not in fastq_dirs]
+    samples: list[Sample] = []
+    names: set[str] = set()
+    for fastq_dir in fastq_dirs:
+        name: str = os.path.basename(fastq_dir.rstrip("/"))
+        while name in names:
+            name += "_1"
+        names.add(name)
+        samples.append(Sample(name, fastq_dir, f"{output_root}/{name}"))
+    return samples
+
+
+def estimate_sample_memory(fastq_dir: str) -> int:
+    """Working set of the UID assignment of a sample, the largest stage without an external algorithm."""
+    try:
+        fastq_r1_path, _ = common.find_r1_r2_files(fastq_dir)
+        return estimate_record_count(fastq_r1_path) * DICT_ENTRY_OVERHEAD
+    except (OSError, TypeError):
+        return 0
+
+
+def sample_log_config(log_config: dict, sample: Sample) -> dict:
+    """Log configuration of a sample, the file handler writes to the sample output directory."""
+    sample_config: dict = copy.deepcopy(log_config)
+    for formatter in sample_config.get("formatters", {}).values():
+        if "format" in formatter:
+            formatter["format"] = formatter["format"].replace(" - %(asctime)s", f" - {sample.name} - %(asctime)s", 1)
+    file_handler: dict | None = sample_config.get("handlers", {}).get("file")
+    if file_handler is not None:
+        file_handler["filename"] = f"{sample.output_dir}/{SAMPLE_LOG_NAME}"
+    return sample_config
+
+
+def run_sample(parsed_config: st.Config, sample: Sample, connection: Connection) -> None:
+    """Transform one sample in its own process and send its result, errors are sent instead of raised."""
+    start_time: float = time.perf_counter()
+    try:
+        sample_config: st.Config = copy.copy(parsed_config)
+        sample_config.FASTQ_DIR = sample.fastq_dir
+        sample_config.OUTPUT_DIR = sample.output_dir
+        if sample.memory:
+            sample_config.MAX_MEMORY = str(sample.memory)
+        sample_config.LOG_CONFIG = sample_log_config(parsed_config.LOG_CONFIG, sample)
+        if sample_config.LOG_CONFIG.get("handlers", {}).get("file"):
+            common.create_file_if_not_exists(sample_config.LOG_CONFIG["handlers"]["file"]["filename"])
+        log.set_up_logger(sample_config.LOG_CONFIG)
+        # the exporter thread of the batch process does not run in the sample process, every sample gets its own
+        textfile: str = sample_config.PROGRESS_TEXTFILE
+        start_exporter(
+            sample_config.PROGRESS_INTERVAL,
+            common.insert_before_extension(textfile, f"_{sample.name}") if textfile else "",
+            sample_config.PROGRESS_LOG,
+        )
+        run_transform(sample_config)
+        manifest: dict | None = read_manifest(sample.output_dir)
+        if manifest is None:
+            raise RuntimeError(f"{sample.fastq_dir} produced no output")
+        result = {"status": "ok", "reads": sum(entry["reads"] for entry in manifest["inputs"])}
+    except Exception as e:
+        log.error(traceback.format_exc())
+        result = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+    result["seconds"] = round(time.perf_counter() - start_time, 3)
+    connection.send(result)
+    connection.close()
+
+
+@profiler
+def run_batch(
+    patterns: list[str], output_root: str, parsed_config: st.Config, workers: int = 1, max_memory: int = 0
+) -> list[Sample]:
+    """
+    Transform many samples, each in its own process with its own output directory and log file.
+    At most workers samples run at once and the memory reserved by the running samples stays within max_memory.
+    Samples are started largest first, a sample waiting for memory lets smaller ones start before it.
+    A failing or crashing sample is reported and the batch goes on. The report is written to
+    output_root/batch_report.json.
+
+    :param patterns: Sample FASTQ directories or glob patterns of them.
+    :param output_root: Directory of the sample output directories.
+    :param parsed_config: Configuration of every sample, FASTQ_DIR and OUTPUT_DIR are replaced.
+    :param workers: Maximum number of samples processed concurrently.
+    :param max_memory: Memory budget of the batch in bytes, every sample reserves its estimated working set
+        and at least an equal share of the budget, which becomes its MAX_MEMORY. 0 = no limit.
+    :return: Samples with their results.
+    """
+    samples: list[Sample] = find_samples(patterns, output_root)
+    workers = max(workers, 1)
+    estimates: dict[str, int] = {sample.name: estimate_sample_memory(sample.fastq_dir) for sample in samples}
+    for sample in samples:
+        if max_memory:
+            sample.memory = min(max(estimates[sample.name], max_memory // workers), max_memory)
+    pending: list[Sample] = sorted(samples, key=lambda s: estimates[s.name], reverse=True)
+    log.info(f"batch of {len(samples)} samples, {workers} workers, memory budget {max_memory or 'unlimited'}")
+
+    context = multiprocessing.get_context()
+    running: dict[int, tuple] = {}
+    while pending or running:
+        reserved: int = sum(sample.memory for _, _, sample in running.values())
+        for sample in list(pending):
+            if len(running) >= workers:
+                break
+            if max_memory and running and reserved + sample.memory > max_memory:
+                continue
+            common.create_dir(sample.output_dir)
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=run_sample, args=(parsed_config, sample, sender), name=sample.name)
+            process.start()
+            sender.close()
+            running[process.sentinel] = (process, receiver, sample)
+            reserved += sample.memory
+            pending.remove(sample)
+            log.info(f"sample {sample.name} started, {len(pending)} pending")
+
+        for sentinel in wait(list(running)):
+            process, receiver, sample = running.pop(sentinel)
+            sample.result = receiver.recv() if receiver.poll() else {}
+            receiver.close()
+            process.join()
+            if not sample.result:
+                sample.result = {"status": "failed", "error": f"process exited with code {process.exitcode}"}
+            log.info(f"sample {sample.name} {sample.result['status']}, {sample.result.get('seconds', '-')} s")
+
+    report: list[dict] = [
+        {"sample": sample.name, "fastq_dir": sample.fastq_dir, "output_dir": sample.output_dir, **sample.result}
+        for sample in samples
+    ]
+    common.create_dir(output_root)
+    failed: int = sum(sample.result["status"] != "ok" for sample in samples)
+    common.write_json_atomic(f"{output_root}/{BATCH_REPORT_NAME}", {"samples": report, "failed": failed})
+    for row in report:
+        log.info(f"{row['sample']}: {row['status']} {row.get('reads', '')} {row.get('error', '')}")
+    log.info(f"batch done, {len(samples) - failed} samples ok, {failed} failed")
+    return samples
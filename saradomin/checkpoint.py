@@ -0,0 +1,203 @@
+import os
+import time
+import zlib
+from dataclasses import asdict, dataclass, field
+from typing import IO
+
+import numpy as np
+
+from . import log
+from .augment import Augmenter
+from .common import read_json, write_json_atomic
+from .fastq import iter_fastq_records, open_fastq
+from .kmer import KmerTokenizer
+from .stats import ReadStats
+
+CHECKPOINT_SUFFIX: str = ".checkpoint.json"
+
+interval: float = 0.0
+
+
+def configure_checkpoints(interval_: float) -> None:
+    """Checkpoint the encoding of the reads every interval_ seconds, 0 = no checkpoints and no resume."""
+    global interval
+    interval = interval_
+    if interval > 0:
+        log.info(f"checkpoints of save_fastq every {interval} s")
+
+
+def checkpoint_path(output_path: str) -> str:
+    return output_path + CHECKPOINT_SUFFIX
+
+
+def fastq_identity(fastq_path: str) -> dict:
+    """Path, size and modification time of an input FASTQ file, a changed file is another input."""
+    stat: os.stat_result = os.stat(fastq_path)
+    return {"fastq": os.path.abspath(fastq_path), "fastq_size": stat.st_size, "fastq_mtime_ns": stat.st_mtime_ns}
+
+
+def derived_fastq_source(source_path: str, settings: dict) -> dict:
+    """
+    Source of a FASTQ file written by the run itself from source_path, e.g. an offset subsample.
+    A restarted run writes the file again, so its checkpoints are keyed on the source and the settings.
+    """
+    return {**fastq_identity(source_path), "settings": settings}
+
+
+def checkpoint_key(
+    fastq_read_path: str,
+    byte_range: tuple[int, int] | None,
+    uid_start: int,
+    read_vector_schema: list[str],
+    keep_mask: np.ndarray | None,
+    augmenter: Augmenter | None,
+    kmer_tokenizer: KmerTokenizer | None = None,
+    source: dict | None = None,
+) -> dict:
+    """
+    Everything the output depends on, a checkpoint of other inputs or settings is not resumed.
+    :param source: Source of a FASTQ file the run writes again when restarted, see derived_fastq_source.
+    Replaces the modification time of the file in the key.
+    """
+    identity: dict = fastq_identity(fastq_read_path)
+    if source is not None:
+        identity["fastq_mtime_ns"] = None
+    return {
+        **identity,
+        "source": source,
+        "byte_range": list(byte_range) if byte_range is not None else None,
+        "uid_start": uid_start,
+        "schema": read_vector_schema,
+        "keep_mask": None if keep_mask is None else [len(keep_mask), zlib.crc32(np.packbits(keep_mask).tobytes())],
+        "augmenter": asdict(augmenter) if augmenter is not None else None,
+        "kmer": asdict(kmer_tokenizer) if kmer_tokenizer is not None else None,
+    }
+
+
+@dataclass(slots=True)
+class FastqCheckpoint:
+    """
+    Progress of save_fastq of one output file, saved at batch boundaries.
+    input_offset is the byte offset of the next record, position the number of records before it (kept or not)
+    and output_size the length of the output up to the last written record.
+    """
+
+    path: str
+    key: dict
+    input_offset: int = 0
+    position: int = 0
+    uid_counter: int = 0
+    output_size: int = 0
+    batch_size: int = 0
+    done: bool = False
+    read_stats: dict | None = None
+    resumed: bool = False
+    saved: float = field(default_factory=time.monotonic)
+
+    def due(self) -> bool:
+        return time.monotonic() - self.saved >= interval
+
+    def save(self, output_file: IO, input_offset: int, position: int, uid_counter: int, read_stats: ReadStats | None):
+        """Flush the output to the disk, then replace the checkpoint file."""
+        output_file.flush()
+        os.fsync(output_file.fileno())
+        self.input_offset = input_offset
+        self.position = position
+        self.uid_counter = uid_counter
+        self.output_size = os.fstat(output_file.fileno()).st_size
+        self.read_stats = read_stats.state() if read_stats is not None else None
+        state: dict = {name: getattr(self, name) for name in STATE_FIELDS}
+        write_json_atomic(self.path, state, sync=True)
+        self.saved = time.monotonic()
+
+    def begin(
+        self,
+        fastq_read_path: str,
+        keep_mask: np.ndarray | None,
+        read_id_counter: dict[str, int] | None,
+        read_stats: ReadStats | None,
+        batch_size: int,
+    ) -> tuple[int, int]:
+        """
+        Restore a resumed checkpoint, a new one records the batch size (batch boundaries seed the augmentation).
+        :return: Byte range of the FASTQ file left to encode.
+        """
+        if self.resumed:
+            self.restore(fastq_read_path, keep_mask, read_id_counter, read_stats)
+        else:
+            self.batch_size = batch_size
+        byte_range: list[int] | None = self.key["byte_range"]
+        return self.input_offset, byte_range[1] if byte_range else self.key["fastq_size"]
+
+    def restore(
+        self,
+        fastq_read_path: str,
+        keep_mask: np.ndarray | None,
+        read_id_counter: dict[str, int] | None,
+        read_stats: ReadStats | None,
+    ) -> None:
+        """
+        Rebuild the state save_fastq had at the checkpoint. The UIDs of the read names before input_offset
+        are assigned again from the FASTQ file, only the names are read (UIDs by position only count the reads).
+        """
+        start: int = self.key["byte_range"][0] if self.key["byte_range"] else 0
+        position, uid_counter = 0, self.key["uid_start"]
+        with open_fastq(fastq_read_path, (start, self.input_offset)) as fastq_file:
+            for read_id, _, _ in iter_fastq_records(fastq_file):
+                if keep_mask is None or keep_mask[position]:
+                    if read_id_counter is None:
+                        uid_counter += 1
+                    elif read_id not in read_id_counter:
+                        read_id_counter[read_id] = uid_counter
+                        uid_counter += 1
+                position += 1
+        if (position, uid_counter) != (self.position, self.uid_counter):
+            raise RuntimeError(
+                f"{fastq_read_path} does not match the checkpoint {self.path}: {position} reads and UID counter "
+                f"{uid_counter}, checkpoint {self.position} and {self.uid_counter}. Delete the checkpoint to start over"
+            )
+        if read_stats is not None and self.read_stats is not None:
+            read_stats.set_state(self.read_stats)
+
+
+STATE_FIELDS: tuple[str, ...] = (
+    "key",
+    "input_offset",
+    "position",
+    "uid_counter",
+    "output_size",
+    "batch_size",
+    "done",
+    "read_stats",
+)
+
+
+def open_checkpoint(output_path: str, key: dict) -> FastqCheckpoint | None:
+    """
+    Checkpoint of an output, None when checkpoints are disabled. A valid checkpoint file is resumed:
+    the output is truncated to the checkpointed size. Otherwise a new checkpoint starts at the beginning.
+    """
+    if interval <= 0:
+        return None
+    path: str = checkpoint_path(output_path)
+    start: int = key["byte_range"][0] if key["byte_range"] else 0
+    checkpoint = FastqCheckpoint(path, key, input_offset=start, uid_counter=key["uid_start"])
+    if not os.path.exists(path):
+        return checkpoint
+    state: dict = read_json(path)
+    if state["key"] != key:
+        log.warning(f"{path} was written for other inputs or settings, {output_path} is written again")
+        return checkpoint
+    if not os.path.exists(output_path) or os.path.getsize(output_path) < state["output_size"]:
+        log.warning(f"{output_path} is shorter than its checkpoint {path}, it is written again")
+        return checkpoint
+    os.truncate(output_path, state["output_size"])
+    checkpoint = FastqCheckpoint(path, **{name: state[name] for name in STATE_FIELDS}, resumed=True)
+    log.info(f"{output_path} resumed at {checkpoint.position} reads, input byte {checkpoint.input_offset}")
+    return checkpoint
+
+
+def remove_checkpoint(output_path: str) -> None:
+    """Remove the checkpoint once the output is complete and about to be changed by later stages."""
+    if os.path.exists(checkpoint_path(output_path)):
+        os.remove(checkpoint_path(output_path))
@@ -0,0 +1,223 @@
+import argparse
+import os
+
+from . import struct as st, log
+from .main import (
+    __version__,
+    run,
+    set_up,
+    build_read_filter,
+    build_kmer_tokenizer,
+    build_deduplicator,
+    build_planner,
+    build_augmenter,
+    build_subsampler,
+    compress_configured_outputs,
+)
+from .append import append_new_pairs
+from .batch import run_batch
+from .convert import convert_text_output, find_text_outputs
+from .framed import CODECS, FRAME_READS, compress_text_output
+from .names import NameIndex, name_index_dir
+from .packed import PACKED_EXTENSION
+from .planner import parse_memory_size
+from .partition import plan_work_units, run_work_unit, merge_work_units
+from .verify import DISRUPTED_TOLERANCE, verify_output
+
+
+def partition(args: argparse.Namespace) -> None:
+    parsed_config: st.Config = set_up()
+    work_dir: str = args.work_dir or f"{parsed_config.OUTPUT_DIR}/work"
+    plan_work_units(parsed_config.FASTQ_DIR, work_dir, args.units)
+
+
+def worker(args: argparse.Namespace) -> None:
+    parsed_config: st.Config = set_up()
+    run_work_unit(
+        args.plan,
+        args.unit,
+        version_=__version__,
+        read_filter=build_read_filter(parsed_config),
+        kmer_tokenizer=build_kmer_tokenizer(parsed_config),
+        kmer_only=parsed_config.KMER_ONLY,
+        deduplicator=build_deduplicator(parsed_config),
+        write_stats=parsed_config.WRITE_STATS,
+        name_index=parsed_config.WRITE_NAME_INDEX,
+        encoder_workers=parsed_config.ENCODER_WORKERS,
+        augmenter=build_augmenter(parsed_config),
+    )
+
+
+def merge(args: argparse.Namespace) -> None:
+    parsed_config: st.Config = set_up()
+    merge_work_units(
+        args.plan,
+        parsed_config.OUTPUT_DIR,
+        parsed_config.TRAIN_DATA_PERCENTAGE,
+        parsed_config.KEEP_CORRECT_TRAIN_PAIR,
+        parsed_config.KEEP_CORRECT_TEST_PAIR,
+        version_=__version__,
+        kmer_tokenizer=build_kmer_tokenizer(parsed_config),
+        kmer_only=parsed_config.KMER_ONLY,
+        write_stats=parsed_config.WRITE_STATS,
+        name_index=parsed_config.WRITE_NAME_INDEX,
+        keep_work_dir=args.keep_work_dir,
+        planner=build_planner(parsed_config),
+        max_workers=parsed_config.STAGE_WORKERS,
+        executor=parsed_config.STAGE_EXECUTOR,
+        output_layout=parsed_config.OUTPUT_LAYOUT,
+        augmenter=build_augmenter(parsed_config),
+    )
+    compress_configured_outputs(parsed_config)
+
+
+def append(args: argparse.Namespace) -> None:
+    parsed_config: st.Config = set_up()
+    append_new_pairs(
+        parsed_config.FASTQ_DIR,
+        parsed_config.OUTPUT_DIR,
+        parsed_config.TRAIN_DATA_PERCENTAGE,
+        parsed_config.KEEP_CORRECT_TRAIN_PAIR,
+        parsed_config.KEEP_CORRECT_TEST_PAIR,
+        version_=__version__,
+        read_filter=build_read_filter(parsed_config),
+        kmer_tokenizer=build_kmer_tokenizer(parsed_config),
+        kmer_only=parsed_config.KMER_ONLY,
+        deduplicator=build_deduplicator(parsed_config),
+        write_stats=parsed_config.WRITE_STATS,
+        name_index=parsed_config.WRITE_NAME_INDEX,
+        planner=build_planner(parsed_config),
+        max_workers=parsed_config.STAGE_WORKERS,
+        executor=parsed_config.STAGE_EXECUTOR,
+        output_layout=parsed_config.OUTPUT_LAYOUT,
+        encoder_workers=parsed_config.ENCODER_WORKERS,
+        augmenter=build_augmenter(parsed_config),
+        subsampler=build_subsampler(parsed_config),
+    )
+
+
+def batch(args: argparse.Namespace) -> None:
+    parsed_config: st.Config = set_up()
+    samples = run_batch(
+        args.samples,
+        args.output_root or parsed_config.OUTPUT_DIR,
+        parsed_config,
+        workers=args.workers,
+        max_memory=parse_memory_size(args.max_memory or parsed_config.MAX_MEMORY),
+    )
+    failed: int = sum(sample.result["status"] != "ok" for sample in samples)
+    if failed:
+        raise SystemExit(f"{failed} of {len(samples)} samples failed")
+
+
+def convert(args: argparse.Namespace) -> None:
+    for path in find_text_outputs(args.paths):
+        output_path = None
+        if args.output_dir:
+            output_path = f"{args.output_dir}/{os.path.splitext(os.path.basename(path))[0]}{PACKED_EXTENSION}"
+        convert_text_output(path, output_path, workers=args.workers)
+
+
+def compress(args: argparse.Namespace) -> None:
+    for path in find_text_outputs(args.paths):
+        compress_text_output(path, args.codec, args.frame_reads, args.workers, args.level, args.keep_text)
+
+
+def verify(args: argparse.Namespace) -> None:
+    parsed_config: st.Config = set_up()
+    report = verify_output(
+        args.output_dir or parsed_config.OUTPUT_DIR,
+        parsed_config.KEEP_CORRECT_TRAIN_PAIR,
+        parsed_config.KEEP_CORRECT_TEST_PAIR,
+        workers=args.workers,
+        tolerance=args.tolerance,
+    )
+    if not report.ok:
+        raise SystemExit(f"verification failed with {len(report.errors)} errors")
+
+
+def lookup(args: argparse.Namespace) -> None:
+    index = NameIndex(name_index_dir(args.output_dir or set_up().OUTPUT_DIR))
+    names: list[str] = list(args.names or [])
+    if args.names_file:
+        with open(args.names_file, "r") as f:
+            names += [line.split()[0] for line in f if line.strip()]
+    for name, uid in zip(names, index.uids_of(names)):
+        print(f"{name}\t{uid if uid >= 0 else 'NA'}")
+    for uid, name in zip(args.uids or [], index.names_of(args.uids or [])):
+        print(f"{uid}\t{name if name is not None else 'NA'}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="saradomin", description="Hi-C FASTQ to neural network datasets.")
+    commands = parser.add_subparsers(dest="command")
+
+    commands.add_parser("run", help="transform FASTQ_DIR into OUTPUT_DIR (default)")
+
+    partition_parser = commands.add_parser("partition", help="split FASTQ_DIR into work units and write a plan file")
+    partition_parser.add_argument("--units", type=int, required=True, help="number of work units")
+    partition_parser.add_argument("--work-dir", help="shared directory of the plan, default OUTPUT_DIR/work")
+    partition_parser.set_defaults(handler=partition)
+
+    worker_parser = commands.add_parser("worker", help="process one work unit of a plan")
+    worker_parser.add_argument("plan", help="path to the plan file")
+    worker_parser.add_argument("unit", type=int, help="index of the work unit")
+    worker_parser.set_defaults(handler=worker)
+
+    merge_parser = commands.add_parser("merge", help="assemble train/test outputs of finished work units")
+    merge_parser.add_argument("plan", help="path to the plan file")
+    merge_parser.add_argument("--keep-work-dir", action="store_true", help="keep unit outputs after the merge")
+    merge_parser.set_defaults(handler=merge)
+
+    append_parser = commands.add_parser(
+        "append", help="add the FASTQ pairs of FASTQ_DIR not in OUTPUT_DIR yet, e.g. new lanes, to the dataset"
+    )
+    append_parser.set_defaults(handler=append)
+
+    batch_parser = commands.add_parser("batch", help="transform many sample FASTQ directories concurrently")
+    batch_parser.add_argument("samples", nargs="+", help="sample FASTQ directories or glob patterns, e.g. 'runs/*'")
+    batch_parser.add_argument("--output-root", help="directory of the sample outputs, default OUTPUT_DIR")
+    batch_parser.add_argument("--workers", type=int, default=os.cpu_count(), help="samples processed at once")
+    batch_parser.add_argument("--max-memory", help="memory budget of all samples, e.g. 64G, default MAX_MEMORY")
+    batch_parser.set_defaults(handler=batch)
+
+    convert_parser = commands.add_parser("convert", help="convert text outputs to the packed format")
+    convert_parser.add_argument("paths", nargs="+", help="text outputs or directories searched for READ_*.txt")
+    convert_parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of parser processes")
+    convert_parser.add_argument("--output-dir", help="directory of the packed outputs, default next to the inputs")
+    convert_parser.set_defaults(handler=convert)
+
+    compress_parser = commands.add_parser("compress", help="compress text outputs into seekable frames")
+    compress_parser.add_argument("paths", nargs="+", help="text outputs or directories searched for READ_*.txt")
+    compress_parser.add_argument("--codec", choices=CODECS, default="gzip", help="frame compression")
+    compress_parser.add_argument("--frame-reads", type=int, default=FRAME_READS, help="records per frame")
+    compress_parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of compressing threads")
+    compress_parser.add_argument("--level", type=int, default=0, help="compression level, 0 = codec default")
+    compress_parser.add_argument("--keep-text", action="store_true", help="keep the text outputs")
+    compress_parser.set_defaults(handler=compress)
+
+    verify_parser = commands.add_parser("verify", help="check the train/test outputs of a run")
+    verify_parser.add_argument("output_dir", nargs="?", help="output directory, default OUTPUT_DIR")
+    verify_parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of scanning processes")
+    verify_parser.add_argument(
+        "--tolerance", type=float, default=DISRUPTED_TOLERANCE, help="allowed difference of the disrupted fraction"
+    )
+    verify_parser.set_defaults(handler=verify)
+
+    lookup_parser = commands.add_parser("lookup", help="UIDs of read names and read names of UIDs of a dataset")
+    lookup_parser.add_argument("output_dir", nargs="?", help="output directory, default OUTPUT_DIR")
+    lookup_parser.add_argument("--names", nargs="+", help="read names, without the '@'")
+    lookup_parser.add_argument("--names-file", help="file with a read name per line, e.g. an .allValidPairs file")
+    lookup_parser.add_argument("--uids", nargs="+", type=int, help="UIDs")
+    lookup_parser.set_defaults(handler=lookup)
+    return parser
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = build_parser().parse_args(argv)
+    if getattr(args, "handler", None) is None:
+        run()
+        return
+    log.info(f"------ START {args.command} -------")
+    args.handler(args)
+    log.info(f"------ END {args.command} -------")
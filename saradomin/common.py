@@ -1,7 +1,28 @@
+import errno
+import json
 import os
 import random
+import shutil
+from array import array
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
 
 from saradomin import log
+from saradomin.progress import track
+
+# in-memory bytes per record of a split or shuffle: offset, size, UID and tag of the index, the write order
+# and the temporaries of the record selection
+INDEX_ENTRY_SIZE: int = 8 * 8
+SPILL_RECORDS: int = 1 << 20  # index entries buffered before they are written to the spill files
+ORDER_CHUNK: int = 1 << 20  # records selected or copied at once
+COLUMN_TYPES: dict[str, str] = {"offsets": "q", "sizes": "q", "uids": "q", "tagged": "b"}
+COPY_CHUNK_SIZE: int = 1 << 30  # largest range handed to one kernel copy
+KERNEL_COPY_METHODS: tuple[str, ...] = tuple(name for name in ("copy_file_range", "sendfile") if hasattr(os, name))
+# errors of a kernel copy the file systems do not support, the next method is tried
+UNSUPPORTED_COPY_ERRNOS: set[int] = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP}
+disabled_copy_methods: set[str] = set()
 
 
 def create_dir(dir_path) -> None:
@@ -21,6 +42,41 @@ def create_file_if_not_exists(path_to_file: str) -> None:
             pass  # Create an empty file
 
 
+def write_json_atomic(path: str, data: dict, sync: bool = False) -> None:
+    """
+    Write JSON to a temporary file and rename it, readers never see a partial file.
+    With sync the file reaches the disk before the rename, it survives a crash of the node.
+    """
+    temp_path: str = path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(data, f, indent=2)
+        if sync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def read_json(path: str) -> dict:
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def find_r1_r2_pairs(dir_path: str) -> list[tuple[str, str]]:
+    """
+    All paired FASTQ files of a directory, e.g. one pair per sequencing lane, sorted by name.
+    The R2 file of an R1 file has the same name with the last _R1 replaced by _R2.
+    """
+    names: list[str] = sorted(os.listdir(dir_path))
+    pairs: list[tuple[str, str]] = []
+    for name in names:
+        if "_R1" not in name:
+            continue
+        head, tail = name.rsplit("_R1", 1)
+        if f"{head}_R2{tail}" in names:
+            pairs.append((os.path.join(dir_path, name), os.path.join(dir_path, f"{head}_R2{tail}")))
+    return pairs
+
+
 def find_r1_r2_files(dir_path: str) -> tuple[str, str]:
     r1_file, r2_file = None, None
 
@@ -33,6 +89,8 @@ def find_r1_r2_files(dir_path: str) -> tuple[str, str]:
         elif "_R2" in file:
             r2_file = full_path
 
+    if len(find_r1_r2_pairs(dir_path)) > 1:
+        log.warning(f"{dir_path} has several FASTQ pairs, only {r1_file} is used, add the others with append")
     return r1_file, r2_file
 
 
@@ -68,48 +126,125 @@ def insert_before_extension(path: str, desired_insert: str) -> str:
     return f"{name}{desired_insert}{ext}"
 
 
-def copy_file_skip_hash_lines(source_path: str, destination_path: str, buffer_size=1024 * 1024):
+def advise_sequential(file) -> None:
+    """Hint the kernel that an opened file is read from start to end, it reads ahead more aggressively."""
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(file.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+
+def copy_once(source_fd: int, destination_fd: int, offset: int, count: int) -> int:
+    """
+    Copy up to count bytes of source_fd from offset to the current position of destination_fd.
+    The copy stays in the kernel (copy_file_range, then sendfile), pread/write is the fallback
+    when the file systems support neither. A method failing as unsupported is not tried again,
+    as is a method copying nothing where pread still finds data (some file systems return 0 instead of an error).
+
+    :return: Number of bytes copied, 0 at the end of the source.
+    """
+    copied_nothing: list[str] = []
+    for method in KERNEL_COPY_METHODS:
+        if method in disabled_copy_methods:
+            continue
+        try:
+            if method == "copy_file_range":
+                copied: int = os.copy_file_range(source_fd, destination_fd, count, offset)
+            else:
+                copied = os.sendfile(destination_fd, source_fd, offset, count)
+        except OSError as e:
+            if e.errno not in UNSUPPORTED_COPY_ERRNOS:
+                raise
+            disabled_copy_methods.add(method)
+            log.debug(f"{method} is not supported ({e}), falling back")
+            continue
+        if copied:
+            return copied
+        copied_nothing.append(method)  # the end of the source, or not supported
+    data: bytes = os.pread(source_fd, count, offset)
+    if data and copied_nothing:
+        disabled_copy_methods.update(copied_nothing)
+        log.debug(f"{', '.join(copied_nothing)} copied nothing before the end of the source, falling back")
+    return os.write(destination_fd, data) if data else 0
+
+
+def copy_range(source_fd: int, destination_fd: int, offset: int, count: int) -> None:
+    """Copy count bytes of source_fd from offset to the current position of destination_fd, see copy_once."""
+    while count > 0:
+        copied: int = copy_once(source_fd, destination_fd, offset, min(count, COPY_CHUNK_SIZE))
+        if not copied:
+            raise OSError(f"source ended {count} bytes before the end of the copied range")
+        offset += copied
+        count -= copied
+
+
+def header_end(file_path: str) -> int:
+    """Size in bytes of the leading lines starting with '#'."""
+    size: int = 0
+    with open(file_path, "rb") as file:
+        for line in file:
+            if not line.startswith(b"#"):
+                break
+            size += len(line)
+    return size
+
+
+def open_for_append(path: str) -> int:
+    """
+    File descriptor positioned at the end of the file. O_APPEND is not used, copy_file_range rejects it.
+    """
+    fd: int = os.open(path, os.O_WRONLY | os.O_CREAT, 0o666)
+    os.lseek(fd, 0, os.SEEK_END)
+    return fd
+
+
+def copy_file_skip_hash_lines(source_path: str, destination_path: str):
     """
     Copy a file from source_path to destination_path, skipping lines at the beginning that start with '#'.
+    The data after the header is copied inside the kernel, see copy_range.
 
     Parameters:
     - source_path: Path to the source file.
     - destination_path: Path to the destination file where the copy will be saved.
-    - buffer_size: Size of the buffer to use while copying, in bytes. Default is 1MB for binary mode.
     """
-    with open(source_path, "r") as source_file, open(destination_path, "w") as destination_file:
-        # Skip lines starting with '#'
-        for line in source_file:
-            if not line.startswith("#"):
-                destination_file.write(line)
-                break
+    offset: int = header_end(source_path)
+    size: int = os.path.getsize(source_path)
+    with open(source_path, "rb") as source_file, open(destination_path, "wb", buffering=0) as destination_file:
+        copy_range(source_file.fileno(), destination_file.fileno(), offset, size - offset)
 
-        # After the first non-'#' line, copy the rest of the file as is
-        while True:
-            chunk = source_file.read(buffer_size)
-            if not chunk:
-                break  # End of file reached
-            destination_file.write(chunk)
 
-
-def append_file_to_another(source_path1: str, source_path2: str, buffer_size=1024 * 1024):
+def append_file_to_another(source_path1: str, source_path2: str):
     """
-    Append the content of the second file to the end of the first file.
+    Append the content of the second file to the end of the first file, inside the kernel, see copy_range.
 
     Parameters:
     - source_path1: Path to the first file which will also be the destination file.
     - source_path2: Path to the second source file.
-    - buffer_size: Size of the buffer to use while copying, in bytes. Default is 1MB for binary mode.
     """
-    # Open the first file in append mode to add content to its end
-    with open(source_path1, "ab") as destination_file:
-        # Read and append content from the second file
+    size: int = os.path.getsize(source_path2)
+    destination_fd: int = open_for_append(source_path1)
+    try:
         with open(source_path2, "rb") as source_file2:
-            while True:
-                chunk = source_file2.read(buffer_size)
-                if not chunk:
-                    break  # End of file reached
-                destination_file.write(chunk)
+            copy_range(source_file2.fileno(), destination_fd, 0, size)
+    finally:
+        os.close(destination_fd)
+
+
+def append_file_skip_hash_lines(destination_path: str, source_path: str):
+    """
+    Append the content of the source file to the end of the destination file, skipping lines at the beginning
+    of the source file that start with '#'. The data after the header is copied inside the kernel, see copy_range.
+
+    Parameters:
+    - destination_path: Path to the file which is appended to.
+    - source_path: Path to the source file.
+    """
+    offset: int = header_end(source_path)
+    size: int = os.path.getsize(source_path)
+    destination_fd: int = open_for_append(destination_path)
+    try:
+        with open(source_path, "rb") as source_file:
+            copy_range(source_file.fileno(), destination_fd, offset, size - offset)
+    finally:
+        os.close(destination_fd)
 
 
 def delete_file(file_path: str) -> None:
@@ -190,73 +325,211 @@ def get_shuffled_values_only(d, fraction_fixed):
     return values_to_shuffle
 
 
-def shuffle_selected_reads(to_shuffle: list[int], file_path: str, output_path: str) -> None:
+def random_permutation(n: int, seed: int | None = None) -> np.ndarray:
+    """Random permutation of range(n) of the seed, by default drawn from the state of the random module."""
+    return np.random.default_rng(random.getrandbits(64) if seed is None else seed).permutation(n)
+
+
+@dataclass(slots=True)
+class RecordIndex:
+    """
+    Byte offsets and sizes of the records of a file, with the UID of every record (first word of its first line)
+    and tagged 1 for augmented copies (UID line with a tag) when indexed with UIDs.
+    The columns are memory-mapped from a spill directory by external splits and shuffles.
     """
-    Shuffles specified groups of lines (each group is three lines) in a large file based on a list of read headers.
-    It writes the shuffled result to a new file.
 
-    :param to_shuffle: List of integers representing read headers that should be shuffled.
+    header_size: int
+    offsets: np.ndarray
+    sizes: np.ndarray
+    uids: np.ndarray | None = None
+    tagged: np.ndarray | None = None
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+
+def load_spilled(path: str, dtype: type) -> np.ndarray:
+    """Memory-mapped array of a spill file, an empty one cannot be mapped."""
+    if not os.path.getsize(path):
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
+
+
+def spill_columns(columns: dict[str, array], spill_files: dict) -> None:
+    for name, column in columns.items():
+        column.tofile(spill_files[name])
+        del column[:]
+
+
+def index_records(
+    file_path: str,
+    lines_per_record: int = 3,
+    skip_header: bool = True,
+    with_uids: bool = False,
+    spill_dir: str | None = None,
+) -> RecordIndex:
+    """
+    Byte offsets and sizes of the records of a file where one record takes lines_per_record lines.
+
+    :param file_path: Path to the file.
+    :param lines_per_record: Number of lines of one record.
+    :param skip_header: Leading lines starting with '#' are not part of any record.
+    :param with_uids: Index the UID and the tag of every record too.
+    :param spill_dir: Optional directory, the columns are written to it every SPILL_RECORDS records
+    and memory-mapped, only a buffer of the index is kept in memory.
+    :return: Index of the records.
+    """
+    columns: dict[str, array] = {
+        name: array(typecode) for name, typecode in COLUMN_TYPES.items() if with_uids or name in ("offsets", "sizes")
+    }
+    offsets, sizes = columns["offsets"], columns["sizes"]
+    uids, tagged = columns.get("uids"), columns.get("tagged")
+    spill_files: dict = {name: open(f"{spill_dir}/{name}.bin", "wb") for name in columns} if spill_dir else {}
+    header_size: int = 0
+    offset: int = 0
+    in_header: bool = skip_header
+    try:
+        with open(file_path, "rb") as file, track("index_records", os.path.basename(file_path), file=file):
+            advise_sequential(file)
+            lines = iter(file)
+            for line in lines:
+                if in_header:
+                    if line.startswith(b"#"):
+                        offset += len(line)
+                        header_size = offset
+                        continue
+                    in_header = False
+                size: int = len(line) + sum(len(next(lines, b"")) for _ in range(lines_per_record - 1))
+                offsets.append(offset)
+                sizes.append(size)
+                if with_uids:
+                    uid_fields: list[bytes] = line.split()
+                    uids.append(int(uid_fields[0]))
+                    tagged.append(len(uid_fields) > 1)
+                offset += size
+                if spill_files and len(offsets) >= SPILL_RECORDS:
+                    spill_columns(columns, spill_files)
+        if spill_files:
+            spill_columns(columns, spill_files)
+    finally:
+        for spill_file in spill_files.values():
+            spill_file.close()
+    dtypes: dict[str, type] = {name: np.int64 if COLUMN_TYPES[name] == "q" else np.int8 for name in columns}
+    if spill_files:
+        return RecordIndex(
+            header_size, **{name: load_spilled(f"{spill_dir}/{name}.bin", dtypes[name]) for name in columns}
+        )
+    return RecordIndex(
+        header_size, **{name: np.frombuffer(column, dtype=dtypes[name]) for name, column in columns.items()}
+    )
+
+
+def find_records(
+    index: RecordIndex, select: Callable[[np.ndarray, np.ndarray], np.ndarray], spill_path: str | None = None
+) -> np.ndarray:
+    """
+    Positions of the records for which select(uids, tagged) is True, evaluated ORDER_CHUNK records at a time.
+    With spill_path the positions are written to the file and memory-mapped.
+    """
+    chunks: list[np.ndarray] = []
+    spill_file = open(spill_path, "wb") if spill_path else None
+    try:
+        for start in range(0, len(index), ORDER_CHUNK):
+            end: int = start + ORDER_CHUNK
+            positions: np.ndarray = np.flatnonzero(select(index.uids[start:end], index.tagged[start:end])) + start
+            if spill_file is not None:
+                positions.astype(np.int64).tofile(spill_file)
+            else:
+                chunks.append(positions)
+    finally:
+        if spill_file is not None:
+            spill_file.close()
+    if spill_path:
+        return load_spilled(spill_path, np.int64)
+    return np.concatenate(chunks).astype(np.int64) if chunks else np.zeros(0, dtype=np.int64)
+
+
+def coalesce_ranges(offsets: np.ndarray, sizes: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Merge byte ranges which follow each other in the source into runs, copied with one call each.
+
+    :return: Offsets, sizes and number of ranges of the runs.
+    """
+    ends: np.ndarray = offsets + sizes
+    breaks: np.ndarray = np.flatnonzero(offsets[1:] != ends[:-1]) + 1
+    starts: np.ndarray = np.concatenate([[0], breaks]).astype(np.int64)
+    stops: np.ndarray = np.concatenate([breaks, [len(offsets)]]).astype(np.int64)
+    if not len(offsets):
+        starts = stops = np.zeros(0, dtype=np.int64)
+    return offsets[starts], ends[stops - 1] - offsets[starts], stops - starts
+
+
+def write_records_in_order(file_path: str, output_path: str, index: RecordIndex, order: np.ndarray) -> None:
+    """
+    Write the header and then the records of file_path in the given order, or only the records in order.
+    Records are copied by offset inside the kernel, records following each other in file_path in one copy.
+    The order is gathered ORDER_CHUNK records at a time, it may be memory-mapped.
+    """
+    with (
+        open(file_path, "rb") as file,
+        open(output_path, "wb", buffering=0) as out,
+        track("write_records_in_order", os.path.basename(file_path), len(order)) as progress,
+    ):
+        copy_range(file.fileno(), out.fileno(), 0, index.header_size)
+        for start in range(0, len(order), ORDER_CHUNK):
+            chunk: np.ndarray = np.asarray(order[start : start + ORDER_CHUNK])
+            run_offsets, run_sizes, run_records = coalesce_ranges(index.offsets[chunk], index.sizes[chunk])
+            for offset, size, records in zip(run_offsets.tolist(), run_sizes.tolist(), run_records.tolist()):
+                copy_range(file.fileno(), out.fileno(), offset, size)
+                progress.add(records)
+
+
+def shuffle_selected_reads(
+    to_shuffle: np.ndarray,
+    file_path: str,
+    output_path: str,
+    lines_per_read: int = 3,
+    spill_dir: str | None = None,
+    seed: int | None = None,
+) -> int:
+    """
+    Shuffle the reads with the given UIDs among their positions and write the result to a new file.
+    Augmented copies of the reads (UID line with a tag) are not shuffled.
+    Only byte offsets are kept in memory, records are copied from the input file by offset inside the kernel,
+    unchanged runs of records with one copy each.
+
+    :param to_shuffle: UIDs of the reads that should be shuffled.
     :param file_path: Path to the input file containing the data.
     :param output_path: Path to the output file where shuffled data will be written.
+    :param lines_per_read: Number of lines of one read, UID line included.
+    :param spill_dir: Optional directory of the external shuffle, the record index and the write order are
+    memory-mapped from it, only the permutation of the selected reads stays in memory. Removed afterwards.
+    :param seed: Seed of the permutation, by default drawn from the state of the random module. Stages running
+    in other threads or processes get a seed, the state of the random module is not shared with them.
+    :return: Number of reads which were moved to another position, i.e. the number of disrupted pairs.
     """
-    # Position index for reads
-    read_positions = []
-
-    # Read the file and index positions of reads to shuffle
-    with open(file_path, "r") as file:
-        while True:
-            line_pos = file.tell()
-            line = file.readline()
-            if not line:
-                break  # End of file
-
-            if line.startswith("#") or line.strip() == "":
-                continue  # Skip headers and empty lines
-
-            read_id = int(line.split()[0])
-            seq = file.readline()
-            score = file.readline()
-
-            # Store the position and content of each read group
-            if read_id in to_shuffle:
-                read_positions.append((line_pos, line, seq, score))
-
-    # Shuffle the positions to reorder them
-    shuffled_positions = random.sample(read_positions, len(read_positions))
-
-    # Now create a map from original positions to shuffled read data
-    position_map = {pos[0]: data for pos, data in zip(read_positions, shuffled_positions)}
-
-    # Write the shuffled result to a new file
-    with open(file_path, "r") as infile, open(output_path, "w") as outfile:
-        infile.seek(0)
-        current_pos = infile.tell()
-        line = infile.readline()
-
-        while line:
-            if line.startswith("#"):
-                # Write headers and other metadata directly
-                outfile.write(line)
-                current_pos = infile.tell()
-                line = infile.readline()
-                continue
-
-            if current_pos in position_map:
-                # Write the shuffled data
-                data = position_map[current_pos]
-                outfile.write(data[1])  # Read ID line
-                outfile.write(data[2])  # Sequence line
-                outfile.write(data[3])  # Score line
-                # Skip the next two lines in the input file since they're already written
-                infile.readline()
-                infile.readline()
-            else:
-                # Write lines that are not part of any group directly
-                outfile.write(line)
-                line = infile.readline()
-                outfile.write(line)
-                line = infile.readline()
-                outfile.write(line)
-
-            current_pos = infile.tell()
-            line = infile.readline()
+    if spill_dir is not None:
+        create_dir(spill_dir)
+    try:
+        index: RecordIndex = index_records(file_path, lines_per_read, with_uids=True, spill_dir=spill_dir)
+        to_shuffle = np.sort(np.asarray(to_shuffle, dtype=np.int64))
+
+        # augmented copies share the UID of their read, they stay in place and keep their correct pair
+        selected_positions: np.ndarray = find_records(
+            index,
+            lambda uids, tagged: np.isin(uids, to_shuffle) & (tagged == 0),
+            f"{spill_dir}/selected.bin" if spill_dir else None,
+        )
+        permutation: np.ndarray = random_permutation(len(selected_positions), seed)
+        if spill_dir is not None:
+            order = np.lib.format.open_memmap(f"{spill_dir}/order.npy", mode="w+", dtype=np.int64, shape=(len(index),))
+            for start in range(0, len(index), ORDER_CHUNK):
+                order[start : start + ORDER_CHUNK] = np.arange(start, min(start + ORDER_CHUNK, len(index)))
+        else:
+            order = np.arange(len(index))
+        order[selected_positions] = selected_positions[permutation]
+        write_records_in_order(file_path, output_path, index, order)
+        return int(np.count_nonzero(permutation != np.arange(len(permutation))))
+    finally:
+        if spill_dir is not None and os.path.exists(spill_dir):
+            shutil.rmtree(spill_dir)
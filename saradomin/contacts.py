@@ -0,0 +1,154 @@
+import os
+from itertools import islice
+
+import numpy as np
+
+from . import common, log
+from .profiler import profiler
+from .progress import track
+
+CONTACTS_DIR_NAME: str = "contacts"
+CONTACT_CHUNK_LINES: int = 1 << 20
+# HiC-Pro allValidPairs columns: read name, chr1, pos1, strand1, chr2, pos2, strand2, ...
+CHROM_1_COLUMN, POS_1_COLUMN, CHROM_2_COLUMN, POS_2_COLUMN = 1, 2, 4, 5
+
+
+def parse_resolutions(text: str) -> list[int]:
+    """Bin sizes in base pairs from a comma separated list, e.g. "1000000,100000"."""
+    resolutions: list[int] = sorted({int(part) for part in text.replace(" ", "").split(",") if part}, reverse=True)
+    if any(resolution <= 0 for resolution in resolutions):
+        raise ValueError("Contact resolutions must be positive")
+    return resolutions
+
+
+def parse_valid_pairs(lines: list[str], chrom_index: dict[str, int]) -> tuple[np.ndarray, ...]:
+    """
+    Chromosome indexes and positions of both ends of a chunk of valid pairs.
+    New chromosome names are added to chrom_index in order of appearance.
+    """
+    columns = [line.split("\t", POS_2_COLUMN + 1) for line in lines]
+    n: int = len(columns)
+    chrom_1 = np.fromiter((chrom_index.setdefault(c[CHROM_1_COLUMN], len(chrom_index)) for c in columns), np.int64, n)
+    chrom_2 = np.fromiter((chrom_index.setdefault(c[CHROM_2_COLUMN], len(chrom_index)) for c in columns), np.int64, n)
+    pos_1 = np.fromiter((int(c[POS_1_COLUMN]) for c in columns), np.int64, n)
+    pos_2 = np.fromiter((int(c[POS_2_COLUMN]) for c in columns), np.int64, n)
+    return chrom_1, pos_1, chrom_2, pos_2
+
+
+def count_unique(coordinates: np.ndarray, counts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Sum the counts of equal rows of coordinates."""
+    unique, inverse = np.unique(coordinates, axis=0, return_inverse=True)
+    return unique, np.bincount(inverse.ravel(), weights=counts, minlength=len(unique)).astype(np.int64)
+
+
+class ContactAccumulator:
+    """
+    Sparse contact counts of one resolution as rows of (chrom 1, bin 1, chrom 2, bin 2).
+    Chunks are counted on their own and merged into the total once the pending rows outgrow it,
+    so every contact is merged a constant number of times on average.
+    """
+
+    def __init__(self, resolution: int, merge_rows: int = CONTACT_CHUNK_LINES):
+        self.resolution = resolution
+        self.merge_rows = merge_rows
+        self.coordinates = np.zeros((0, 4), dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.pending: list[tuple[np.ndarray, np.ndarray]] = []
+        self.pending_rows: int = 0
+
+    def add(self, chrom_1: np.ndarray, pos_1: np.ndarray, chrom_2: np.ndarray, pos_2: np.ndarray) -> None:
+        bin_1, bin_2 = pos_1 // self.resolution, pos_2 // self.resolution
+        # the matrix is symmetric, ends are ordered so every contact is in the upper triangle
+        swap = (chrom_1 > chrom_2) | ((chrom_1 == chrom_2) & (bin_1 > bin_2))
+        coordinates = np.column_stack(
+            [
+                np.where(swap, chrom_2, chrom_1),
+                np.where(swap, bin_2, bin_1),
+                np.where(swap, chrom_1, chrom_2),
+                np.where(swap, bin_1, bin_2),
+            ]
+        )
+        chunk = count_unique(coordinates, np.ones(len(coordinates)))
+        self.pending.append(chunk)
+        self.pending_rows += len(chunk[1])
+        if self.pending_rows > max(len(self.counts), self.merge_rows):
+            self.merge()
+
+    def merge(self) -> None:
+        if not self.pending:
+            return
+        coordinates = np.concatenate([self.coordinates] + [c for c, _ in self.pending])
+        counts = np.concatenate([self.counts] + [n for _, n in self.pending])
+        self.coordinates, self.counts = count_unique(coordinates, counts)
+        self.pending, self.pending_rows = [], 0
+
+    def save(self, path: str, chromosomes: list[str]) -> int:
+        """
+        Save the matrix in COO and CSR form with genome wide bins, chromosome i covers the bins
+        chrom_offsets[i] to chrom_offsets[i + 1]. Only the upper triangle is stored.
+
+        :return: Number of non-zero entries.
+        """
+        self.merge()
+        chrom_bins = np.zeros(len(chromosomes), dtype=np.int64)
+        for chrom_column, bin_column in ((0, 1), (2, 3)):
+            np.maximum.at(chrom_bins, self.coordinates[:, chrom_column], self.coordinates[:, bin_column] + 1)
+        chrom_offsets = np.concatenate([[0], np.cumsum(chrom_bins)])
+        row = chrom_offsets[self.coordinates[:, 0]] + self.coordinates[:, 1]
+        col = chrom_offsets[self.coordinates[:, 2]] + self.coordinates[:, 3]
+        order = np.lexsort((col, row))
+        row, col, counts = row[order], col[order], self.counts[order]
+        np.savez_compressed(
+            path,
+            resolution=self.resolution,
+            chromosomes=np.array(chromosomes),
+            chrom_offsets=chrom_offsets,
+            row=row.astype(np.int32 if chrom_offsets[-1] < 2**31 else np.int64),
+            col=col.astype(np.int32 if chrom_offsets[-1] < 2**31 else np.int64),
+            count=counts.astype(np.uint32),
+            indptr=np.searchsorted(row, np.arange(chrom_offsets[-1] + 1)),
+        )
+        return len(counts)
+
+
+def contact_matrix_path(contacts_dir: str, resolution: int) -> str:
+    return f"{contacts_dir}/contacts_{resolution}.npz"
+
+
+@profiler
+def build_contact_matrices(
+    valid_pairs_path: str, contacts_dir: str, resolutions: list[int], chunk_lines: int = CONTACT_CHUNK_LINES
+) -> dict[int, str]:
+    """
+    Bin both ends of the HiC-Pro valid pairs into sparse contact matrices, one per resolution.
+    The valid pairs are streamed in chunks of chunk_lines lines, all resolutions are counted in the same pass.
+
+    :param valid_pairs_path: Path to the .allValidPairs file.
+    :param contacts_dir: Directory of the matrices, contacts_<resolution>.npz.
+    :param resolutions: Bin sizes in base pairs.
+    :param chunk_lines: Number of valid pairs parsed and binned at once.
+    :return: Paths of the matrices by resolution.
+    """
+    accumulators: list[ContactAccumulator] = [ContactAccumulator(resolution, chunk_lines) for resolution in resolutions]
+    chrom_index: dict[str, int] = {}
+    pairs: int = 0
+    with (
+        open(valid_pairs_path, "r") as valid_pairs_file,
+        track("build_contact_matrices", os.path.basename(valid_pairs_path), file=valid_pairs_file) as progress,
+    ):
+        common.advise_sequential(valid_pairs_file)
+        while lines := list(islice(valid_pairs_file, chunk_lines)):
+            ends = parse_valid_pairs(lines, chrom_index)
+            for accumulator in accumulators:
+                accumulator.add(*ends)
+            pairs += len(lines)
+            progress.add(len(lines))
+
+    common.create_dir(contacts_dir)
+    paths: dict[int, str] = {}
+    for accumulator in accumulators:
+        paths[accumulator.resolution] = contact_matrix_path(contacts_dir, accumulator.resolution)
+        entries: int = accumulator.save(paths[accumulator.resolution], list(chrom_index))
+        log.info(f"contact matrix at {accumulator.resolution} bp: {entries} non-zero bins of {pairs} valid pairs")
+    log.debug(f"contact matrices of {os.path.basename(valid_pairs_path)} saved to {contacts_dir}")
+    return paths
@@ -0,0 +1,229 @@
+import glob
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from . import common, log
+from .interleave import HEADER_END
+from .packed import TAGS, PackedWriter, packed_path, parse_schema, row_dtype
+from .profiler import profiler
+
+CONVERT_CHUNK_SIZE: int = 16 << 20
+NEWLINE: int = ord("\n")
+TAB: int = ord("\t")
+DIGIT_0: int = ord("0")
+DIGIT_9: int = ord("9")
+POWERS_OF_TEN = 10 ** np.arange(19, dtype=np.int64)
+BLANKS: list[int] = [ord(" "), ord("\r")]
+# tag index by the first byte after the tab, the tags start with different bytes; a blank or newline is no tag
+TAG_BY_FIRST_BYTE = np.full(256, -1, dtype=np.int64)
+TAG_BY_FIRST_BYTE[BLANKS + [NEWLINE]] = 0
+TAG_BY_FIRST_BYTE[[ord(tag[0]) for tag in TAGS[1:]]] = np.arange(1, len(TAGS))
+TAG_LENGTHS = np.array([len(tag) for tag in TAGS], dtype=np.int64)
+
+
+def read_text_header(path: str) -> tuple[list[str], int]:
+    """Header lines of a text output and the byte offset of its first record."""
+    header_lines: list[str] = []
+    with open(path, "rb") as f:
+        for line in f:
+            header_lines.append(line.decode())
+            if line.startswith(HEADER_END.encode()):
+                return header_lines, f.tell()
+    raise ValueError(f"{path} has no {HEADER_END} line")
+
+
+def record_start_after(text_file, offset: int, end: int) -> int:
+    """Offset of the first UID line starting after offset, UID lines are the only ones starting with a digit."""
+    text_file.seek(offset)
+    offset += len(text_file.readline())  # partial line
+    while offset < end:
+        line = text_file.readline()
+        if not line or line[:1].isdigit():
+            break
+        offset += len(line)
+    return min(offset, end)
+
+
+def chunk_boundaries(path: str, data_start: int, chunk_size: int) -> list[tuple[int, int]]:
+    """Byte ranges of the data section holding whole records, about chunk_size bytes each."""
+    file_size: int = os.path.getsize(path)
+    starts: list[int] = [data_start]
+    with open(path, "rb") as text_file:
+        for offset in range(data_start + chunk_size, file_size, chunk_size):
+            start = record_start_after(text_file, offset - 1, file_size)
+            if start > starts[-1]:
+                starts.append(start)
+    starts = sorted(set(starts))
+    return [(start, end) for start, end in zip(starts, starts[1:] + [file_size]) if start < end]
+
+
+def parse_tags(data: bytes, buffer: np.ndarray, newlines: np.ndarray, records: int) -> np.ndarray:
+    """
+    Tag indexes of the records of parse_chunk. A tag follows a tab on the UID line, only blanks may follow the tag.
+
+    :param data: Records, the last line ends with a newline.
+    :param buffer: data as uint8 array.
+    :param newlines: Positions of the newlines of data.
+    :param records: Number of records of data.
+    :return: Index into TAGS of every record.
+    """
+    tags = np.zeros(records, dtype=np.uint8)
+    tabs = np.flatnonzero(buffer == TAB)
+    if not len(tabs):
+        return tags
+    lines_per_record: int = len(newlines) // records
+    tab_records, tab_rows = np.divmod(np.searchsorted(newlines, tabs), lines_per_record)
+    if np.any(tab_rows != 0):
+        raise ValueError("Tabs are only expected in UID lines")
+    tag_starts = tabs + 1
+    tag_indexes = TAG_BY_FIRST_BYTE[buffer[tag_starts]]
+    valid = tag_indexes >= 0
+    last: int = len(buffer) - 1
+    for index, tag in enumerate(TAGS[1:], 1):
+        has_tag = tag_indexes == index
+        for i, byte in enumerate(tag.encode()):
+            valid[has_tag] &= buffer[np.minimum(tag_starts[has_tag] + i, last)] == byte
+    # no other bytes than blanks between the tag and the end of the line
+    line_ends = newlines[tab_records * lines_per_record]
+    not_blank = np.concatenate([[0], np.cumsum(~np.isin(buffer, BLANKS))])
+    tag_ends = np.minimum(tag_starts + TAG_LENGTHS[np.maximum(tag_indexes, 0)], line_ends)
+    valid &= not_blank[line_ends] == not_blank[tag_ends]
+    if not np.all(valid):
+        tab: int = int(tabs[np.argmin(valid)])
+        tag: str = data[tab + 1 : int(line_ends[np.argmin(valid)])].decode(errors="replace").strip()
+        raise ValueError(f"Unknown augmentation tag {tag}")
+    tags[tab_records] = tag_indexes
+    return tags
+
+
+def parse_chunk(data: bytes, rows: int) -> tuple[np.ndarray, np.ndarray, dict[str, tuple[np.ndarray, np.ndarray]]]:
+    """
+    Parse whole records of a text output from raw bytes, without evaluating the list lines.
+    Numbers are the runs of digits: a run gets the line it is on and its value is the integer sum of its digits
+    times the power of ten of their position in the run.
+
+    :param data: Records, the last line ends with a newline.
+    :param rows: Number of list lines per record.
+    :return: UIDs, tag indexes and per row index the values and the number of values of every record.
+    """
+    if data and not data.endswith(b"\n"):
+        data += b"\n"
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    newlines = np.flatnonzero(buffer == NEWLINE)
+    lines_per_record: int = rows + 1
+    if len(newlines) % lines_per_record:
+        raise ValueError(f"{len(newlines)} lines are not records of {lines_per_record} lines")
+    records: int = len(newlines) // lines_per_record
+
+    is_digit = (buffer >= DIGIT_0) & (buffer <= DIGIT_9)
+    previous_digit = np.concatenate([[False], is_digit[:-1]])
+    next_digit = np.concatenate([is_digit[1:], [False]])
+    run_starts = np.flatnonzero(is_digit & ~previous_digit)
+    run_ends = np.flatnonzero(is_digit & ~next_digit)
+    if np.any(run_ends - run_starts > 18):
+        raise ValueError("Numbers of more than 18 digits are not supported")
+    digit_positions = np.flatnonzero(is_digit)
+    run_of_digit = np.cumsum(is_digit & ~previous_digit)[digit_positions] - 1
+    weights = (buffer[digit_positions] - DIGIT_0) * POWERS_OF_TEN[run_ends[run_of_digit] - digit_positions]
+    # integer sums of the runs, float64 is not exact from 16 digits on
+    run_values = (
+        np.add.reduceat(weights, np.searchsorted(digit_positions, run_starts))
+        if len(run_starts)
+        else np.zeros(0, dtype=np.int64)
+    )
+
+    run_lines = np.searchsorted(newlines, run_starts)
+    run_records, run_rows = np.divmod(run_lines, lines_per_record)
+
+    first_runs = np.flatnonzero(run_rows == 0)
+    first_runs = first_runs[np.concatenate([[True], run_records[first_runs][1:] != run_records[first_runs][:-1]])]
+    if len(first_runs) != records:
+        raise ValueError("Every record has to start with a UID line")
+    uids = run_values[first_runs]
+
+    tags: np.ndarray = parse_tags(data, buffer, newlines, records)
+
+    values: dict[int, tuple[np.ndarray, np.ndarray]] = {}
+    for row in range(rows):
+        in_row = run_rows == row + 1
+        values[row] = run_values[in_row], np.bincount(run_records[in_row], minlength=records)
+    return uids, tags, values
+
+
+def convert_chunk(path: str, start: int, end: int, read_vector_schema: list[str], part_path: str) -> dict:
+    """
+    Parse the records of a byte range and save their arrays to part_path, runs in a worker process.
+
+    :return: Number of records and number of values of every row of the part.
+    """
+    with open(path, "rb") as f:
+        data: bytes = os.pread(f.fileno(), end - start, start)
+    uids, tags, values = parse_chunk(data, len(read_vector_schema))
+    arrays = {"uid": uids, "tag": tags}
+    for row, name in enumerate(read_vector_schema):
+        row_values, lengths = values[row]
+        arrays[name] = row_values.astype(row_dtype(name))
+        arrays[f"{name}.lengths"] = lengths
+    np.savez(part_path, **arrays)
+    return {"records": len(uids), **{name: len(values[row][0]) for row, name in enumerate(read_vector_schema)}}
+
+
+@profiler
+def convert_text_output(
+    path: str, output_path: str | None = None, workers: int = 1, chunk_size: int = CONVERT_CHUNK_SIZE
+) -> str:
+    """
+    Convert a text output (READ_1.txt, READ_2_test.txt, ...) to the packed format, the header is kept.
+    The data is split into chunks of whole records parsed in parallel, parts are then copied
+    into the packed arrays in file order.
+
+    :param path: Text output file.
+    :param output_path: Packed directory, default next to the text file.
+    :param workers: Number of parser processes.
+    :param chunk_size: Approximate size of a chunk in bytes.
+    :return: Path of the packed directory.
+    """
+    output_path = output_path or packed_path(path)
+    header_lines, data_start = read_text_header(path)
+    if any(line.startswith("#layout=interleaved") for line in header_lines):
+        raise ValueError(f"{path} has the interleaved layout, convert the separate R1 and R2 outputs")
+    read_vector_schema: list[str] = parse_schema(header_lines)
+    chunks = chunk_boundaries(path, data_start, chunk_size)
+    log.info(f"converting {path} in {len(chunks)} chunks with {workers} workers")
+
+    part_dir: str = output_path + ".parts"
+    common.create_dir(part_dir)
+    part_paths: list[str] = [f"{part_dir}/{i}.npz" for i in range(len(chunks))]
+    with ProcessPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = [
+            executor.submit(convert_chunk, path, start, end, read_vector_schema, part_path)
+            for (start, end), part_path in zip(chunks, part_paths)
+        ]
+        counts: list[dict] = [future.result() for future in futures]
+
+    totals: dict = {key: sum(count[key] for count in counts) for key in ["records", *read_vector_schema]}
+    if os.path.exists(output_path):
+        shutil.rmtree(output_path)
+    writer = PackedWriter(output_path, header_lines, read_vector_schema, totals["records"], totals)
+    for part_path in part_paths:
+        with np.load(part_path) as part:
+            rows = {name: (part[name], part[f"{name}.lengths"]) for name in read_vector_schema}
+            writer.write_part(part["uid"], part["tag"], rows)
+    writer.close()
+    shutil.rmtree(part_dir)
+    log.info(f"converted {totals['records']} records of {path} to {output_path}")
+    return output_path
+
+
+def find_text_outputs(paths: list[str]) -> list[str]:
+    """Text outputs named by paths, directories are searched for READ_*.txt files."""
+    found: list[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            found += sorted(glob.glob(f"{path}/**/READ_*.txt", recursive=True))
+        else:
+            found.append(path)
+    return found
@@ -0,0 +1,188 @@
+import hashlib
+import math
+
+import numpy as np
+
+from . import log
+from .fastq import FastqBatch
+
+DEDUP_MODES: tuple[str, ...] = ("exact", "bloom")
+
+
+def pair_fingerprints(sequences_r1: list[str], sequences_r2: list[str], prefix_length: int = 0) -> np.ndarray:
+    """
+    128 bit fingerprint of every (R1 sequence, R2 sequence) pair.
+
+    :param sequences_r1: Sequences of R1 reads.
+    :param sequences_r2: Sequences of R2 mates.
+    :param prefix_length: Only this many first bases of each mate are hashed, 0 hashes the whole sequences.
+    :return: uint64 array of shape (pairs, 2).
+    """
+    end = prefix_length if prefix_length > 0 else None
+    digests = b"".join(
+        hashlib.blake2b(f"{sequence_r1[:end]}\t{sequence_r2[:end]}".encode("ascii"), digest_size=16).digest()
+        for sequence_r1, sequence_r2 in zip(sequences_r1, sequences_r2)
+    )
+    return np.frombuffer(digests, dtype=np.uint64).reshape(-1, 2)
+
+
+def first_occurrences(keys: np.ndarray) -> np.ndarray:
+    """Boolean mask of keys which are not repeated earlier in the same array."""
+    first = np.zeros(len(keys), dtype=bool)
+    _, index = np.unique(keys, axis=0, return_index=True)
+    first[index] = True
+    return first
+
+
+class ExactDeduplicator:
+    """
+    Set of 128 bit pair fingerprints in a fixed size open addressing table, a slot is free while used is False.
+    Memory is allocated once from the expected number of pairs. When the table is full new pairs are
+    no longer remembered, so duplicates can be missed but a unique pair is never dropped.
+    """
+
+    def __init__(self, expected_pairs: int, max_load: float = 0.5):
+        capacity = 1 << max(int(math.ceil(math.log2(max(expected_pairs, 1) / max_load))), 4)
+        self.table = np.zeros((capacity, 2), dtype=np.uint64)
+        self.used = np.zeros(capacity, dtype=bool)
+        self.mask = np.uint64(capacity - 1)
+        self.max_size = int(capacity * max_load)
+        self.size = 0
+        self.warned_full = False
+        log.debug(f"exact dedup table with {capacity} slots, {(self.table.nbytes + capacity) / 1024**2:.1f} MB")
+
+    def add(self, fingerprints: np.ndarray) -> np.ndarray:
+        """
+        Insert fingerprints into the set.
+
+        :param fingerprints: uint64 array of shape (pairs, 2).
+        :return: Boolean array, True where the pair was seen before.
+        """
+        duplicate = ~first_occurrences(fingerprints)
+
+        pending = np.flatnonzero(~duplicate)
+        slots = fingerprints[pending, 0] & self.mask
+        while len(pending):
+            used = self.used[slots]
+            found = used & (self.table[slots] == fingerprints[pending]).all(axis=1)
+            duplicate[pending[found]] = True
+
+            # reaching an empty slot means the key is new, several keys can reach the same slot and the first takes it
+            empty = np.flatnonzero(~used)
+            _, first = np.unique(slots[empty], return_index=True)
+            budget = max(self.max_size - self.size, 0)
+            if len(first) > budget:
+                if not self.warned_full:
+                    log.warning(
+                        "exact dedup table is full, new pairs are not remembered, increase DEDUP_EXPECTED_PAIRS"
+                    )
+                    self.warned_full = True
+                first = first[:budget]
+            claimed = empty[first]
+            self.table[slots[claimed]] = fingerprints[pending[claimed]]
+            self.used[slots[claimed]] = True
+            self.size += len(claimed)
+
+            unresolved = used & ~found
+            # keys which lost their empty slot to another key probe further, the others are done
+            unresolved[empty] = np.isin(slots[empty], slots[claimed])
+            unresolved[claimed] = False
+            slots = (slots + np.uint64(1)) & self.mask  # linear probing
+            pending, slots = pending[unresolved], slots[unresolved]
+        return duplicate
+
+
+class BloomDeduplicator:
+    """
+    Bloom filter of pair fingerprints sized for the expected number of pairs and false positive rate.
+    A false positive drops a unique pair, the rate stays bounded while the number of pairs stays below expected.
+    """
+
+    def __init__(self, expected_pairs: int, false_positive_rate: float):
+        if not (0 < false_positive_rate < 1):
+            raise ValueError("False positive rate must be between 0 and 1")
+        expected_pairs = max(expected_pairs, 1)
+        self.n_bits = int(math.ceil(-expected_pairs * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.n_hashes = max(int(round(self.n_bits / expected_pairs * math.log(2))), 1)
+        self.bits = np.zeros((self.n_bits + 7) // 8, dtype=np.uint8)
+        self.size = 0
+        log.debug(f"bloom filter with {self.n_bits} bits, {self.n_hashes} hashes, {self.bits.nbytes / 1024**2:.1f} MB")
+
+    def bit_positions(self, fingerprints: np.ndarray) -> np.ndarray:
+        # double hashing, h1 + i * h2
+        steps = np.arange(self.n_hashes, dtype=np.uint64)
+        positions = fingerprints[:, :1] + steps * (fingerprints[:, 1:] | np.uint64(1))
+        return positions % np.uint64(self.n_bits)
+
+    def add(self, fingerprints: np.ndarray) -> np.ndarray:
+        """
+        Insert fingerprints into the filter.
+
+        :param fingerprints: uint64 array of shape (pairs, 2).
+        :return: Boolean array, True where the pair was (probably) seen before.
+        """
+        positions = self.bit_positions(fingerprints)
+        byte_index, bit = positions // np.uint64(8), (positions % np.uint64(8)).astype(np.uint8)
+        present = (self.bits[byte_index] >> bit) & 1
+        duplicate = present.all(axis=1) | ~first_occurrences(fingerprints)
+
+        new = ~duplicate
+        np.bitwise_or.at(self.bits, byte_index[new].ravel(), (np.uint8(1) << bit[new]).ravel())
+        self.size += int(new.sum())
+        return duplicate
+
+    def false_positive_rate(self) -> float:
+        """Current false positive rate estimated from the number of inserted pairs."""
+        return (1 - math.exp(-self.n_hashes * self.size / self.n_bits)) ** self.n_hashes
+
+
+class PairDeduplicator:
+    """Drops pairs whose (R1, R2) sequences, or their prefixes, were already seen."""
+
+    def __init__(
+        self, mode: str, expected_pairs: int, false_positive_rate: float = 0.001, prefix_length: int = 0
+    ) -> None:
+        if mode not in DEDUP_MODES:
+            raise ValueError(f"Unknown dedup mode {mode}, expected one of {DEDUP_MODES}")
+        self.mode = mode
+        self.prefix_length = prefix_length
+        if mode == "exact":
+            self.seen = ExactDeduplicator(expected_pairs)
+        else:
+            self.seen = BloomDeduplicator(expected_pairs, false_positive_rate)
+        self.pairs = 0
+        self.duplicates = 0
+
+    def find_duplicates(self, batch_r1: FastqBatch, batch_r2: FastqBatch, candidates: np.ndarray) -> np.ndarray:
+        """
+        :param batch_r1: Batch of R1 reads.
+        :param batch_r2: Batch of R2 mates.
+        :param candidates: Boolean mask of pairs to consider, the others are neither checked nor remembered.
+        :return: Boolean mask of the batch, True where the pair is a duplicate.
+        """
+        duplicate = np.zeros(len(batch_r1), dtype=bool)
+        index = np.flatnonzero(candidates)
+        if len(index):
+            fingerprints = pair_fingerprints(
+                [batch_r1.sequences[i] for i in index], [batch_r2.sequences[i] for i in index], self.prefix_length
+            )
+            duplicate[index] = self.seen.add(fingerprints)
+        self.pairs += len(index)
+        self.duplicates += int(duplicate.sum())
+        return duplicate
+
+    def memory_size(self) -> int:
+        """Bytes of the fingerprint table or of the bloom filter, allocated once and filled as pairs are added."""
+        if isinstance(self.seen, ExactDeduplicator):
+            return self.seen.table.nbytes + self.seen.used.nbytes
+        return self.seen.bits.nbytes
+
+    def duplicate_rate(self) -> float:
+        return self.duplicates / self.pairs if self.pairs else 0.0
+
+    def report(self) -> None:
+        log.info(
+            f"dedup {self.mode}: {self.duplicates} duplicates of {self.pairs} pairs, rate {self.duplicate_rate():.4f}"
+        )
+        if isinstance(self.seen, BloomDeduplicator):
+            log.info(f"dedup bloom: estimated false positive rate {self.seen.false_positive_rate():.6f}")
@@ -0,0 +1,116 @@
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator, TextIO
+
+from .common import advise_sequential
+
+
+@dataclass(slots=True)
+class FastqBatch:
+    read_ids: list[str] = field(default_factory=list)
+    sequences: list[str] = field(default_factory=list)
+    qualities: list[str] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.read_ids)
+
+
+class LineRange:
+    """
+    Decoded lines of an opened binary file from byte offset start up to byte offset end.
+    offset is the byte position after the last line read, e.g. the end of the last record of a batch.
+    """
+
+    __slots__ = ("binary_file", "offset", "end")
+
+    def __init__(self, binary_file, start: int, end: int):
+        self.binary_file = binary_file
+        self.offset: int = start
+        self.end: int = end
+        binary_file.seek(start)
+
+    def __iter__(self) -> "LineRange":
+        return self
+
+    def __next__(self) -> str:
+        if self.offset >= self.end:
+            raise StopIteration
+        line: bytes = self.binary_file.readline()
+        if not line:
+            raise StopIteration
+        self.offset += len(line)
+        return line.decode("ascii")
+
+
+@contextmanager
+def open_fastq(fastq_path: str, byte_range: tuple[int, int] | None = None):
+    """
+    Open a FASTQ file for reading lines, optionally only the lines of a byte range.
+    The byte range must start and end at record boundaries, see partition.plan_work_units.
+    """
+    if byte_range is None:
+        with open(fastq_path, "r") as fastq_file:
+            advise_sequential(fastq_file)
+            yield fastq_file
+    else:
+        with open(fastq_path, "rb") as binary_file:
+            advise_sequential(binary_file)
+            yield LineRange(binary_file, *byte_range)
+
+
+def iter_fastq_records(fastq_file: TextIO) -> Iterator[tuple[str, str, str]]:
+    """
+    Yield (read_id, sequence, quality) for every record of an opened FASTQ file.
+    The read_id is the first word of the header line without the '@' character.
+    """
+    for line in fastq_file:
+        if line.startswith("@"):
+            read_id = line.split()[0][1:]  # Remove the '@' character
+            sequence_line = next(fastq_file).strip()  # Nucleotide sequence
+            next(fastq_file)  # Skip the '+' line
+            quality_line = next(fastq_file).strip()  # PHRED quality scores
+            yield read_id, sequence_line, quality_line
+
+
+def iter_fastq_batches(fastq_file: TextIO, batch_size: int) -> Iterator[FastqBatch]:
+    """Group the records of an opened FASTQ file into batches of at most batch_size reads."""
+    batch = FastqBatch()
+    for read_id, sequence, quality in iter_fastq_records(fastq_file):
+        batch.read_ids.append(read_id)
+        batch.sequences.append(sequence)
+        batch.qualities.append(quality)
+        if len(batch) == batch_size:
+            yield batch
+            batch = FastqBatch()
+    if len(batch):
+        yield batch
+
+
+def iter_paired_batches(
+    fastq_r1_path: str,
+    fastq_r2_path: str,
+    batch_size: int = 65536,
+    r1_range: tuple[int, int] | None = None,
+    r2_range: tuple[int, int] | None = None,
+) -> Iterator[tuple[FastqBatch, FastqBatch]]:
+    """
+    Read R1 and R2 FASTQ files in lockstep and yield batches of mates.
+    The n-th record of R1 is expected to be the mate of the n-th record of R2.
+
+    :param fastq_r1_path: Path to the R1 FASTQ file.
+    :param fastq_r2_path: Path to the R2 FASTQ file.
+    :param batch_size: Maximum number of pairs in one batch.
+    :param r1_range: Optional byte range of R1 to read.
+    :param r2_range: Optional byte range of R2 to read, must hold the mates of r1_range.
+    :return: Iterator of (R1 batch, R2 batch) with the same number of reads.
+    """
+    with open_fastq(fastq_r1_path, r1_range) as r1_file, open_fastq(fastq_r2_path, r2_range) as r2_file:
+        r1_batches = iter_fastq_batches(r1_file, batch_size)
+        r2_batches = iter_fastq_batches(r2_file, batch_size)
+        for batch_r1 in r1_batches:
+            batch_r2 = next(r2_batches, FastqBatch())
+            if len(batch_r1) != len(batch_r2):
+                raise ValueError(f"{fastq_r1_path} and {fastq_r2_path} do not contain the same number of reads")
+            yield batch_r1, batch_r2
+        if next(r2_batches, None) is not None:
+            raise ValueError(f"{fastq_r1_path} and {fastq_r2_path} do not contain the same number of reads")
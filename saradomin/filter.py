@@ -0,0 +1,91 @@
+import warnings
+from dataclasses import dataclass
+
+import numpy as np
+
+from .fastq import FastqBatch
+
+
+@dataclass(slots=True)
+class ReadFilter:
+    min_length: int = 0
+    max_n_fraction: float = 1.0
+    min_mean_quality: float = 0.0  # PHRED
+    min_percentile_quality: float = 0.0  # PHRED
+    quality_percentile: float = 10.0
+    phred_offset: int = 33
+
+    def is_active(self) -> bool:
+        return (
+            self.min_length > 0
+            or self.max_n_fraction < 1.0
+            or self.min_mean_quality > 0.0
+            or self.min_percentile_quality > 0.0
+        )
+
+
+def segment_sums(values: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """
+    Sum consecutive segments of a flat array. Segment i has lengths[i] elements.
+    Empty segments sum to 0.
+    """
+    sums = np.zeros(len(lengths), dtype=np.int64)
+    non_empty = lengths > 0
+    if not non_empty.any():
+        return sums
+    starts = np.cumsum(lengths) - lengths
+    # reduceat sums up to the next given index, skipping empty segments keeps the boundaries right
+    sums[non_empty] = np.add.reduceat(values.astype(np.int64), starts[non_empty])
+    return sums
+
+
+def segment_percentiles(values: np.ndarray, lengths: np.ndarray, percentile: float) -> np.ndarray:
+    """Percentile of every segment of a flat array. The segments are padded with NaN to the longest one."""
+    max_length = int(lengths.max(initial=0))
+    padded = np.full((len(lengths), max(max_length, 1)), np.nan)
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    columns = np.arange(len(values)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    padded[rows, columns] = values
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)  # all-NaN rows of empty reads
+        result = np.nanpercentile(padded, percentile, axis=1)
+    return np.nan_to_num(result, nan=0.0)
+
+
+def evaluate_batch(read_filter: ReadFilter, batch: FastqBatch) -> dict[str, np.ndarray]:
+    """
+    Evaluate every active filter on a batch of reads with vectorized operations.
+
+    :param read_filter: Thresholds of the filters.
+    :param batch: Batch of FASTQ reads.
+    :return: Dictionary filter name -> boolean array, True where the read fails the filter.
+    """
+    lengths = np.fromiter(map(len, batch.sequences), dtype=np.int64, count=len(batch))
+    sequences = np.frombuffer("".join(batch.sequences).encode("ascii"), dtype=np.uint8)
+    qualities = np.frombuffer("".join(batch.qualities).encode("ascii"), dtype=np.uint8).astype(np.int16)
+    qualities -= read_filter.phred_offset
+    safe_lengths = np.maximum(lengths, 1)
+
+    failed: dict[str, np.ndarray] = {}
+    if read_filter.min_length > 0:
+        failed["min_length"] = lengths < read_filter.min_length
+    if read_filter.max_n_fraction < 1.0:
+        n_counts = segment_sums((sequences == ord("N")) | (sequences == ord("n")), lengths)
+        failed["max_n_fraction"] = n_counts / safe_lengths > read_filter.max_n_fraction
+    if read_filter.min_mean_quality > 0.0:
+        failed["min_mean_quality"] = segment_sums(qualities, lengths) / safe_lengths < read_filter.min_mean_quality
+    if read_filter.min_percentile_quality > 0.0:
+        percentiles = segment_percentiles(qualities, lengths, read_filter.quality_percentile)
+        failed["min_percentile_quality"] = percentiles < read_filter.min_percentile_quality
+    return failed
+
+
+def filter_pairs(read_filter: ReadFilter, batch_r1: FastqBatch, batch_r2: FastqBatch) -> dict[str, np.ndarray]:
+    """
+    Evaluate the filters on both mates. A pair fails a filter when either mate fails it.
+
+    :return: Dictionary filter name -> boolean array, True where the pair fails the filter.
+    """
+    failed_r1 = evaluate_batch(read_filter, batch_r1)
+    failed_r2 = evaluate_batch(read_filter, batch_r2)
+    return {name: failed_r1[name] | failed_r2[name] for name in failed_r1}
@@ -0,0 +1,248 @@
+import glob
+import gzip
+import os
+import zlib
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Iterator
+
+import numpy as np
+
+from . import common, log
+from .convert import read_text_header
+from .packed import parse_schema
+from .profiler import profiler
+
+CODECS: tuple[str, ...] = ("gzip", "zstd")
+CODEC_EXTENSIONS: dict[str, str] = {"gzip": ".gz", "zstd": ".zst"}
+DEFAULT_LEVELS: dict[str, int] = {"gzip": 6, "zstd": 3}
+SEEK_TABLE_SUFFIX: str = ".seek.npz"
+FRAME_READS: int = 4096
+
+
+def zstd_module():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ValueError("zstd compression needs the zstandard package, pip install zstandard") from e
+    return zstandard
+
+
+def compress_frame(data: bytes, codec: str, level: int = 0) -> bytes:
+    """One independent frame, a gzip member or a zstd frame. Concatenated frames are a valid gzip/zstd file."""
+    level = level or DEFAULT_LEVELS[codec]
+    if codec == "gzip":
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    return zstd_module().ZstdCompressor(level=level).compress(data)
+
+
+def decompress_frame(data: bytes, codec: str) -> bytes:
+    if codec == "gzip":
+        return zlib.decompress(data, wbits=31)
+    return zstd_module().ZstdDecompressor().decompress(data)
+
+
+def framed_path(text_path: str, codec: str) -> str:
+    return text_path + CODEC_EXTENSIONS[codec]
+
+
+def seek_table_path(path: str) -> str:
+    return path + SEEK_TABLE_SUFFIX
+
+
+def find_framed_outputs(output_dir: str) -> list[str]:
+    """Compressed outputs of the train and test directories."""
+    paths: list[str] = []
+    for extension in CODEC_EXTENSIONS.values():
+        paths += glob.glob(f"{output_dir}/train/*.txt{extension}") + glob.glob(f"{output_dir}/test/*.txt{extension}")
+    return sorted(paths)
+
+
+def iter_frames(path: str, data_start: int, lines_per_record: int, frame_reads: int) -> Iterator[tuple[bytes, list]]:
+    """Raw records of a text output in groups of frame_reads records, with the UIDs of the group."""
+    with open(path, "rb") as text_file:
+        common.advise_sequential(text_file)
+        text_file.seek(data_start)
+        while lines := list(islice(text_file, frame_reads * lines_per_record)):
+            if len(lines) % lines_per_record:
+                raise ValueError(f"{path} ends with an incomplete record")
+            yield b"".join(lines), [int(line.split(maxsplit=1)[0]) for line in lines[::lines_per_record]]
+
+
+def compress_in_order(frames: Iterator[tuple[bytes, list]], codec: str, level: int, workers: int) -> Iterator[tuple]:
+    """Compress frames on a thread pool (zlib and zstd release the GIL), at most 2 * workers frames in flight."""
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending: list = []
+        for data, uids in frames:
+            pending.append((executor.submit(compress_frame, data, codec, level), uids))
+            if len(pending) >= 2 * workers:
+                future, uids_ = pending.pop(0)
+                yield future.result(), uids_
+        for future, uids_ in pending:
+            yield future.result(), uids_
+
+
+@profiler
+def compress_text_output(
+    path: str,
+    codec: str = "gzip",
+    frame_reads: int = FRAME_READS,
+    workers: int = 1,
+    level: int = 0,
+    keep_text: bool = False,
+) -> str:
+    """
+    Compress a text output into independently decompressible frames of frame_reads records.
+    Frame 0 holds the header. The seek table next to the output (<output>.seek.npz) has the byte offset,
+    first record and UID range of every frame and the UIDs sorted with the position of their record,
+    so readers decompress only the frames they need, also for UIDs of a shuffled output.
+    The output stays a valid gzip/zstd file, e.g. zcat READ_1.txt.gz gives the text output.
+
+    :param path: Text output file.
+    :param codec: "gzip" or "zstd" (needs the zstandard package).
+    :param frame_reads: Number of records of a frame.
+    :param workers: Number of compressing threads.
+    :param level: Compression level, 0 = default of the codec.
+    :param keep_text: Keep the text output, by default it is deleted once the compressed output is complete.
+    :return: Path of the compressed output.
+    """
+    if codec not in CODECS:
+        raise ValueError(f"Unknown codec {codec}, expected one of {CODECS}")
+    header_lines, data_start = read_text_header(path)
+    lines_per_record: int = len(parse_schema(header_lines)) + 1
+    output_path: str = framed_path(path, codec)
+
+    offsets: list[int] = [0]
+    first_records: list[int] = [0]
+    min_uids, max_uids = [-1], [-1]
+    record_uids: array = array("q")
+    records: int = 0
+    with open(output_path + ".tmp", "wb") as output_file:
+        output_file.write(compress_frame("".join(header_lines).encode(), codec, level))
+        frames = iter_frames(path, data_start, lines_per_record, frame_reads)
+        for frame, uids in compress_in_order(frames, codec, level, max(workers, 1)):
+            offsets.append(output_file.tell())
+            first_records.append(records)
+            min_uids.append(min(uids))
+            max_uids.append(max(uids))
+            record_uids.extend(uids)
+            output_file.write(frame)
+            records += len(uids)
+        offsets.append(output_file.tell())
+        first_records.append(records)
+    uids: np.ndarray = np.frombuffer(record_uids, dtype=np.int64)
+    uid_records: np.ndarray = np.argsort(uids, kind="stable")
+
+    with open(seek_table_path(output_path) + ".tmp", "wb") as table_file:
+        np.savez(
+            table_file,
+            codec=np.array(codec),
+            frame_reads=frame_reads,
+            lines_per_record=lines_per_record,
+            offsets=np.array(offsets, dtype=np.int64),
+            first_records=np.array(first_records, dtype=np.int64),
+            min_uids=np.array(min_uids, dtype=np.int64),
+            max_uids=np.array(max_uids, dtype=np.int64),
+            uids=uids[uid_records],
+            uid_records=uid_records.astype(np.int64),
+        )
+    os.replace(output_path + ".tmp", output_path)
+    os.replace(seek_table_path(output_path) + ".tmp", seek_table_path(output_path))
+    if not keep_text:
+        os.remove(path)
+    log.debug(f"{path}: {records} records in {len(offsets) - 2} {codec} frames of {frame_reads} records")
+    return output_path
+
+
+@profiler
+def compress_outputs(
+    output_dir: str, codec: str = "gzip", frame_reads: int = FRAME_READS, workers: int = 1, level: int = 0
+) -> list[str]:
+    """Compress every text output of the train and test directories of output_dir, see compress_text_output."""
+    paths: list[str] = sorted(glob.glob(f"{output_dir}/train/*.txt") + glob.glob(f"{output_dir}/test/*.txt"))
+    text_bytes: int = sum(os.path.getsize(path) for path in paths)
+    framed_paths: list[str] = [compress_text_output(path, codec, frame_reads, workers, level) for path in paths]
+    framed_bytes: int = sum(os.path.getsize(path) for path in framed_paths)
+    log.info(f"{len(paths)} outputs compressed from {text_bytes / 1024**2:.1f} MB to {framed_bytes / 1024**2:.1f} MB")
+    return framed_paths
+
+
+class FramedReader:
+    """
+    Random access to a compressed output. Records are addressed by their position in the output,
+    only the frames holding the requested records are read and decompressed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with np.load(seek_table_path(path)) as table:
+            self.codec: str = str(table["codec"])
+            self.lines_per_record: int = int(table["lines_per_record"])
+            self.offsets: np.ndarray = table["offsets"]
+            self.first_records: np.ndarray = table["first_records"]
+            self.min_uids: np.ndarray = table["min_uids"]
+            self.max_uids: np.ndarray = table["max_uids"]
+            self.uids: np.ndarray = table["uids"]
+            self.uid_records: np.ndarray = table["uid_records"]
+
+    def __len__(self) -> int:
+        return int(self.first_records[-1])
+
+    @property
+    def frames(self) -> int:
+        """Number of record frames, the header frame not included."""
+        return len(self.offsets) - 2
+
+    def read_frame(self, frame: int) -> bytes:
+        """Decompressed frame, 0 is the header and 1 to frames hold the records."""
+        with open(self.path, "rb") as f:
+            start, end = int(self.offsets[frame]), int(self.offsets[frame + 1])
+            return decompress_frame(os.pread(f.fileno(), end - start, start), self.codec)
+
+    def read_frames(self, frames: list[int], workers: int = 1) -> list[bytes]:
+        """Decompressed frames in the given order, decompressed on workers threads."""
+        if workers <= 1 or len(frames) <= 1:
+            return [self.read_frame(frame) for frame in frames]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(self.read_frame, frames))
+
+    def header(self) -> list[str]:
+        return self.read_frame(0).decode().splitlines(keepends=True)
+
+    def frame_of(self, record: int) -> int:
+        if not 0 <= record < len(self):
+            raise IndexError(f"record {record} out of range of {len(self)} records")
+        return int(np.searchsorted(self.first_records, record, side="right")) - 1
+
+    def records(self, start: int, stop: int, workers: int = 1) -> list[str]:
+        """Text of the records start to stop (exclusive), a UID line and the row lines each."""
+        stop = min(stop, len(self))
+        if start >= stop:
+            return []
+        frames: list[int] = list(range(self.frame_of(start), self.frame_of(stop - 1) + 1))
+        lines: list[str] = []
+        for data in self.read_frames(frames, workers):
+            lines += data.decode().splitlines(keepends=True)
+        first: int = int(self.first_records[frames[0]])
+        n: int = self.lines_per_record
+        return ["".join(lines[i * n : (i + 1) * n]) for i in range(start - first, stop - first)]
+
+    def record(self, record: int) -> str:
+        return self.records(record, record + 1)[0]
+
+    def find_uid(self, uid: int) -> list[str]:
+        """Records with the UID, the read and its augmented copies. Only frames holding them are read."""
+        start, stop = np.searchsorted(self.uids, [uid, uid + 1])
+        positions: np.ndarray = np.sort(self.uid_records[start:stop])
+        frames: list[int] = sorted({self.frame_of(int(position)) for position in positions})
+        lines_of: dict[int, list[str]] = {
+            frame: data.decode().splitlines(keepends=True) for frame, data in zip(frames, self.read_frames(frames))
+        }
+        found: list[str] = []
+        n: int = self.lines_per_record
+        for position in positions:
+            frame: int = self.frame_of(int(position))
+            i: int = (int(position) - int(self.first_records[frame])) * n
+            found.append("".join(lines_of[frame][i : i + n]))
+        return found
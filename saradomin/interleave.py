@@ -0,0 +1,71 @@
+import os
+
+from .profiler import profiler
+
+FILE_PAIRS_NAME: str = "PAIRS.txt"
+OUTPUT_LAYOUTS: tuple[str, ...] = ("separate", "interleaved", "both")
+HEADER_END: str = "####END####"
+
+
+def read_header(file) -> list[str]:
+    """Header lines of an opened output file up to and including the end line."""
+    header_lines: list[str] = []
+    for line in file:
+        header_lines.append(line)
+        if line.startswith(HEADER_END):
+            break
+    return header_lines
+
+
+def pair_schema(read_vector_schema: list[str]) -> str:
+    """Rows of an interleaved record, the first row holds both UIDs and the label."""
+    rows: list[str] = ["UID_R1 UID_R2 CORRECT_PAIR"]
+    rows += [f"R1 {row}" for row in read_vector_schema] + [f"R2 {row}" for row in read_vector_schema]
+    return "\t".join(f"{i}.row {name}" for i, name in enumerate(rows, start=1))
+
+
+def pair_uid(uid_line: str) -> str:
+    """UID of a read for the pair line, an augmentation tag is joined with ':' e.g. 12:rc."""
+    return ":".join(uid_line.split())
+
+
+@profiler
+def interleave_pairs(r1_path: str, r2_path: str, output_path: str, read_vector_schema: list[str]) -> int:
+    """
+    Write the n-th read of r1_path and the n-th read of r2_path as one record:
+    12<TAB>12<TAB>1      UIDs of R1 and R2 and 1 when they are the same read, 0 for a disrupted pair
+    [R1 rows ...]
+    [R2 rows ...]
+    The header of r1_path is kept, its schema line describes the pair record.
+
+    :param r1_path: Output file of R1 reads.
+    :param r2_path: Output file of R2 reads, possibly shuffled.
+    :param output_path: Interleaved output file.
+    :param read_vector_schema: Rows of a read after its UID.
+    :return: Number of pairs written.
+    """
+    rows: int = len(read_vector_schema)
+    pairs: int = 0
+    temp_path: str = output_path + ".tmp"
+    with open(r1_path, "r") as r1_file, open(r2_path, "r") as r2_file, open(temp_path, "w") as output_file:
+        read_header(r2_file)
+        for line in read_header(r1_file):
+            if line.startswith("#schema="):
+                line = f"#schema={pair_schema(read_vector_schema)} \n#layout=interleaved\n"
+            output_file.write(line)
+
+        for uid_r1 in r1_file:
+            uid_r2 = r2_file.readline()
+            if not uid_r2:
+                raise ValueError(f"{r1_path} has more reads than {r2_path}")
+            rows_r1 = [next(r1_file) for _ in range(rows)]
+            rows_r2 = [r2_file.readline() for _ in range(rows)]
+            correct: int = int(uid_r1 == uid_r2)
+            output_file.write(f"{pair_uid(uid_r1)}\t{pair_uid(uid_r2)}\t{correct}\n")
+            output_file.writelines(rows_r1)
+            output_file.writelines(rows_r2)
+            pairs += 1
+        if r2_file.readline():
+            raise ValueError(f"{r2_path} has more reads than {r1_path}")
+    os.replace(temp_path, output_path)
+    return pairs
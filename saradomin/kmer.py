@@ -0,0 +1,80 @@
+from dataclasses import dataclass
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Same codes as the mapping written to the header, every unknown character is treated as N
+BASE_CODES = np.full(256, 4, dtype=np.uint8)
+for _code, _bases in enumerate(("Aa", "Cc", "Gg", "Tt")):
+    for _base in _bases:
+        BASE_CODES[ord(_base)] = _code
+
+
+def encode_bases(sequences: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Encode a batch of nucleotide sequences with a lookup table.
+
+    :param sequences: Nucleotide sequences.
+    :return: Flat uint8 array of the codes of all sequences and the length of every sequence.
+    """
+    lengths = np.fromiter(map(len, sequences), dtype=np.int64, count=len(sequences))
+    codes = BASE_CODES[np.frombuffer("".join(sequences).encode("ascii"), dtype=np.uint8)]
+    return codes, lengths
+
+
+@dataclass(slots=True)
+class KmerTokenizer:
+    """
+    Overlapping k-mer tokens. The token id of a k-mer is its base-4 number (A=0, C=1, G=2, T=3),
+    the first base being the most significant digit. Every k-mer containing N gets the n_token id.
+    """
+
+    k: int = 6
+    stride: int = 1
+
+    def __post_init__(self):
+        if self.k < 1 or self.stride < 1:
+            raise ValueError("k and stride must be positive")
+
+    @property
+    def n_token(self) -> int:
+        return 4**self.k
+
+    @property
+    def vocabulary_size(self) -> int:
+        return self.n_token + 1
+
+    def vocabulary(self) -> dict:
+        return {"k": self.k, "stride": self.stride, "size": self.vocabulary_size, "n_token": self.n_token}
+
+    def token_counts(self, lengths: np.ndarray) -> np.ndarray:
+        return np.where(lengths >= self.k, (lengths - self.k) // self.stride + 1, 0)
+
+    def tokenize_codes(self, codes: np.ndarray, lengths: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Tokenize a batch of encoded reads at once.
+
+        :param codes: Flat array of base codes of all reads.
+        :param lengths: Length of every read.
+        :return: Flat int64 array of the tokens of all reads and the number of tokens of every read.
+        """
+        counts = self.token_counts(lengths)
+        if len(codes) < self.k or counts.sum() == 0:
+            return np.zeros(0, dtype=np.int64), counts
+
+        # windows are computed over the whole batch, only the ones starting inside a read are taken
+        windows = sliding_window_view(codes, self.k)
+        read_starts = np.cumsum(lengths) - lengths
+        token_index = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        window_starts = np.repeat(read_starts, counts) + token_index * self.stride
+        selected = windows[window_starts]
+
+        powers = 4 ** np.arange(self.k - 1, -1, -1, dtype=np.int64)
+        tokens = selected.astype(np.int64) @ powers
+        tokens[(selected == 4).any(axis=1)] = self.n_token
+        return tokens, counts
+
+    def tokenize_batch(self, sequences: list[str]) -> list[np.ndarray]:
+        """Tokenize a batch of nucleotide sequences, returns tokens of every sequence."""
+        tokens, counts = self.tokenize_codes(*encode_bases(sequences))
+        return np.split(tokens, np.cumsum(counts)[:-1])
@@ -8,6 +8,17 @@ import config
 
 from . import struct as st, log
 from .common import create_file_if_not_exists
+from .dedup import PairDeduplicator
+from .filter import ReadFilter
+from .framed import compress_outputs
+from .augment import Augmenter
+from .checkpoint import configure_checkpoints
+from .contacts import parse_resolutions
+from .kmer import KmerTokenizer
+from .planner import MemoryPlanner, parse_memory_size
+from .profiler import configure_profiling
+from .progress import start_exporter
+from .subsample import Subsampler
 from .transform import transform_data_to_vectors
 
 
@@ -37,7 +48,10 @@ def load_config() -> ModuleType:
         env_value = os.getenv(field_info.name)
         if env_value is not None:
             field_type = type(getattr(app_config, field_info.name, field_info.default))
-            setattr(app_config, field_info.name, field_type(env_value))
+            if field_type is bool:
+                setattr(app_config, field_info.name, env_value.strip().lower() in ("1", "true", "yes"))
+            else:
+                setattr(app_config, field_info.name, field_type(env_value))
     return app_config
 
 
@@ -54,8 +68,67 @@ def parse_namespace(config_: ModuleType) -> st.Config:
     return st.Config(**parsed)
 
 
-def run():
-    log.info("------ START  -------")
+def build_read_filter(config_: st.Config) -> ReadFilter | None:
+    """Build the read filter from configuration, None when filtering is disabled."""
+    if not config_.FILTER_READS:
+        return None
+    return ReadFilter(
+        min_length=config_.FILTER_MIN_LENGTH,
+        max_n_fraction=config_.FILTER_MAX_N_FRACTION,
+        min_mean_quality=config_.FILTER_MIN_MEAN_QUALITY,
+        min_percentile_quality=config_.FILTER_MIN_PERCENTILE_QUALITY,
+        quality_percentile=config_.FILTER_QUALITY_PERCENTILE,
+    )
+
+
+def build_kmer_tokenizer(config_: st.Config) -> KmerTokenizer | None:
+    """Build the k-mer tokenizer from configuration, None when the k-mer export is disabled."""
+    if not config_.KMER_EXPORT:
+        return None
+    return KmerTokenizer(k=config_.KMER_SIZE, stride=config_.KMER_STRIDE)
+
+
+def build_deduplicator(config_: st.Config) -> PairDeduplicator | None:
+    """Build the duplicate pair removal from configuration, None when it is disabled."""
+    if not config_.DEDUP_MODE:
+        return None
+    return PairDeduplicator(
+        config_.DEDUP_MODE,
+        config_.DEDUP_EXPECTED_PAIRS,
+        config_.DEDUP_FALSE_POSITIVE_RATE,
+        config_.DEDUP_PREFIX_LENGTH,
+    )
+
+
+def build_augmenter(config_: st.Config) -> Augmenter | None:
+    """Build the augmentation from configuration, None when no augmentation is enabled."""
+    augmenter = Augmenter(
+        reverse_complement=config_.AUGMENT_REVERSE_COMPLEMENT,
+        substitution_rate=config_.AUGMENT_SUBSTITUTION_RATE,
+        seed=config_.AUGMENT_SEED,
+    )
+    return augmenter if augmenter.is_active() else None
+
+
+def build_subsampler(config_: st.Config) -> Subsampler | None:
+    """Build the subsampler from configuration, None when subsampling is disabled."""
+    if not config_.SUBSAMPLE_STRATEGY:
+        return None
+    return Subsampler(
+        strategy=config_.SUBSAMPLE_STRATEGY,
+        fraction=config_.SUBSAMPLE_FRACTION,
+        reads=config_.SUBSAMPLE_READS,
+        seed=config_.SUBSAMPLE_SEED,
+    )
+
+
+def build_planner(config_: st.Config) -> MemoryPlanner:
+    """Build the memory planner from configuration."""
+    return MemoryPlanner(parse_memory_size(config_.MAX_MEMORY))
+
+
+def set_up() -> st.Config:
+    """Load configuration and set up the logger."""
     config_: ModuleType = load_config()
     parsed_config: st.Config = parse_namespace(config_)
 
@@ -64,7 +137,18 @@ def run():
         file_path: str = parsed_config.LOG_CONFIG["handlers"]["file"].get("filename")
         create_file_if_not_exists(file_path)
     log.set_up_logger(parsed_config.LOG_CONFIG)
+    configure_profiling(
+        parsed_config.PROFILE_MODE,
+        parsed_config.PROFILE_DIR or f"{parsed_config.OUTPUT_DIR}/profile",
+        parsed_config.PROFILE_MEMORY,
+    )
+    start_exporter(parsed_config.PROGRESS_INTERVAL, parsed_config.PROGRESS_TEXTFILE, parsed_config.PROGRESS_LOG)
+    configure_checkpoints(parsed_config.CHECKPOINT_INTERVAL)
+    return parsed_config
+
 
+def run_transform(parsed_config: st.Config) -> None:
+    """Transform FASTQ_DIR into OUTPUT_DIR with the given configuration."""
     transform_data_to_vectors(
         parsed_config.FASTQ_DIR,
         parsed_config.OUTPUT_DIR,
@@ -72,5 +156,38 @@ def run():
         parsed_config.KEEP_CORRECT_TRAIN_PAIR,
         keep_correct_test_pair=parsed_config.KEEP_CORRECT_TEST_PAIR,
         version_=__version__,
+        read_filter=build_read_filter(parsed_config),
+        kmer_tokenizer=build_kmer_tokenizer(parsed_config),
+        kmer_only=parsed_config.KMER_ONLY,
+        deduplicator=build_deduplicator(parsed_config),
+        write_stats=parsed_config.WRITE_STATS,
+        name_index=parsed_config.WRITE_NAME_INDEX,
+        planner=build_planner(parsed_config),
+        max_workers=parsed_config.STAGE_WORKERS,
+        executor=parsed_config.STAGE_EXECUTOR,
+        output_layout=parsed_config.OUTPUT_LAYOUT,
+        encoder_workers=parsed_config.ENCODER_WORKERS,
+        augmenter=build_augmenter(parsed_config),
+        subsampler=build_subsampler(parsed_config),
+        contact_resolutions=parse_resolutions(parsed_config.CONTACT_RESOLUTIONS),
     )
+    compress_configured_outputs(parsed_config)
+
+
+def compress_configured_outputs(parsed_config: st.Config) -> None:
+    """Compress the outputs of OUTPUT_DIR into seekable frames when OUTPUT_COMPRESSION is set."""
+    if parsed_config.OUTPUT_COMPRESSION:
+        compress_outputs(
+            parsed_config.OUTPUT_DIR,
+            parsed_config.OUTPUT_COMPRESSION,
+            parsed_config.OUTPUT_FRAME_READS,
+            workers=max(parsed_config.STAGE_WORKERS, 1),
+            level=parsed_config.OUTPUT_COMPRESSION_LEVEL,
+        )
+
+
+def run():
+    log.info("------ START  -------")
+    parsed_config: st.Config = set_up()
+    run_transform(parsed_config)
     log.info("------ END  -------")
@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+
+from . import common
+
+MANIFEST_FILE_NAME: str = "manifest.json"
+
+
+def manifest_path(output_dir: str) -> str:
+    return f"{output_dir}/{MANIFEST_FILE_NAME}"
+
+
+def read_manifest(output_dir: str) -> dict | None:
+    """Manifest of an output directory, None when the directory has none."""
+    path: str = manifest_path(output_dir)
+    return common.read_json(path) if os.path.exists(path) else None
+
+
+def write_manifest(output_dir: str, manifest: dict) -> None:
+    common.write_json_atomic(manifest_path(output_dir), manifest)
+
+
+def input_entry(
+    fastq_r1_path: str, fastq_r2_path: str, uids: np.ndarray | list[int], first_uid: int, counts: dict
+) -> dict:
+    """
+    Manifest entry of one FASTQ pair of the dataset.
+
+    :param fastq_r1_path: R1 FASTQ file.
+    :param fastq_r2_path: R2 FASTQ file.
+    :param uids: UIDs given to the reads of the pair.
+    :param first_uid: First UID the pair could use.
+    :param counts: Train/test and disrupted pair counts of split_and_disrupt.
+    """
+    return {
+        "fastq_r1": os.path.abspath(fastq_r1_path),
+        "fastq_r2": os.path.abspath(fastq_r2_path),
+        "size_r1": os.path.getsize(fastq_r1_path),
+        "size_r2": os.path.getsize(fastq_r2_path),
+        "first_uid": first_uid,
+        "next_uid": int(np.max(uids)) + 1 if len(uids) else first_uid,
+        "reads": len(uids),
+        **counts,
+    }
+
+
+def new_manifest(version: list[int], read_vector_schema: list[str], output_layout: str, inputs: list[dict]) -> dict:
+    """
+    Manifest of a dataset built from inputs, next_uid is the first UID of the next appended pair.
+    """
+    return {
+        "pre_processing_version": version,
+        "schema": read_vector_schema,
+        "output_layout": output_layout,
+        "next_uid": max([entry["next_uid"] for entry in inputs], default=0),
+        "inputs": inputs,
+    }
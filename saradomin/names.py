@@ -0,0 +1,318 @@
+import os
+import shutil
+from itertools import compress, islice
+from typing import Sequence
+
+import numpy as np
+
+from . import log
+from .fastq import iter_fastq_records, open_fastq
+from .planner import MemoryPlanner
+from .profiler import profiler
+
+NAME_INDEX_DIR_NAME: str = "read_names"
+FNV_OFFSET: np.uint64 = np.uint64(0xCBF29CE484222325)
+FNV_PRIME: np.uint64 = np.uint64(0x100000001B3)
+HASH_CHUNK: int = 1 << 20  # names hashed at once, a chunk is a (names, longest name) byte matrix
+CHUNK_NAME_SIZE: int = 256  # bytes object, byte matrix row and hash temporaries of a name of a chunk
+# names are stored as UTF-8, undecodable bytes of a name round trip as surrogates
+NAME_ENCODING: str = "utf-8"
+NAME_ERRORS: str = "surrogateescape"
+
+# Files of an index, rows sorted by UID:
+# uids.npy[row], name of the row = names.bin[name_offsets.npy[row] : name_offsets.npy[row + 1]]
+# hashes.npy sorted, hashes.npy[i] is the hash of the name of row hash_rows.npy[i]
+
+
+def name_index_dir(output_dir: str) -> str:
+    return f"{output_dir}/{NAME_INDEX_DIR_NAME}"
+
+
+def encode_names(names: Sequence[str | bytes]) -> list[bytes]:
+    return [name.encode(NAME_ENCODING, NAME_ERRORS) if isinstance(name, str) else name for name in names]
+
+
+def hash_names(names: Sequence[bytes]) -> np.ndarray:
+    """64-bit FNV-1a of every name, computed column by column over a chunk of names at once."""
+    hashes: np.ndarray = np.empty(len(names), dtype=np.uint64)
+    for start in range(0, len(names), HASH_CHUNK):
+        chunk: np.ndarray = np.array(names[start : start + HASH_CHUNK], dtype=bytes)
+        matrix: np.ndarray = chunk.view(np.uint8).reshape(len(chunk), chunk.dtype.itemsize)
+        lengths: np.ndarray = np.char.str_len(chunk)
+        chunk_hashes: np.ndarray = np.full(len(chunk), FNV_OFFSET, dtype=np.uint64)
+        for column in range(matrix.shape[1]):
+            active: np.ndarray = lengths > column
+            chunk_hashes[active] = (chunk_hashes[active] ^ matrix[active, column]) * FNV_PRIME
+        hashes[start : start + len(chunk)] = chunk_hashes
+    return hashes
+
+
+def gather_bytes(blob: np.ndarray, starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Concatenation of the byte ranges blob[start : start + length]."""
+    total: int = int(lengths.sum())
+    within: np.ndarray = np.arange(total, dtype=np.int64) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return blob[np.repeat(starts, lengths) + within]
+
+
+def write_rows(
+    index_dir: str, uids: np.ndarray, lengths: np.ndarray, blobs: list[np.ndarray], hashes: np.ndarray
+) -> None:
+    """
+    Write an index of rows given in any order. The names of the rows are the concatenation of blobs,
+    lengths long each. The index is written next to index_dir and renamed, readers never see a partial index.
+    """
+    if len(uids) > 1 and np.any(np.diff(uids) < 0):
+        order: np.ndarray = np.argsort(uids, kind="stable")
+        blob: np.ndarray = np.concatenate(blobs) if blobs else np.zeros(0, dtype=np.uint8)
+        blobs = [gather_bytes(blob, (np.cumsum(lengths) - lengths)[order], lengths[order])]
+        uids, lengths, hashes = uids[order], lengths[order], hashes[order]
+
+    temp_dir: str = index_dir + ".tmp"
+    if os.path.exists(temp_dir):
+        shutil.rmtree(temp_dir)
+    os.makedirs(temp_dir)
+    hash_rows: np.ndarray = np.argsort(hashes, kind="stable")
+    np.save(f"{temp_dir}/uids.npy", np.asarray(uids, dtype=np.int64))
+    np.save(f"{temp_dir}/name_offsets.npy", np.concatenate(([0], np.cumsum(lengths, dtype=np.int64))))
+    with open(f"{temp_dir}/names.bin", "wb") as f:
+        for blob in blobs:
+            f.write(memoryview(np.ascontiguousarray(blob)))
+    np.save(f"{temp_dir}/hashes.npy", hashes[hash_rows])
+    np.save(f"{temp_dir}/hash_rows.npy", hash_rows.astype(np.int64))
+    if os.path.exists(index_dir):
+        shutil.rmtree(index_dir)
+    os.replace(temp_dir, index_dir)
+
+
+class NameIndexWriter:
+    """
+    Writes an index of a known number of rows chunk by chunk. The names go straight to names.bin, the UIDs,
+    name offsets and hashes to memory-mapped files, only the names of one chunk are held as bytes objects.
+    Rows added out of UID order are sorted in memory by write_rows when the index is closed.
+    """
+
+    def __init__(self, index_dir: str, rows: int):
+        self.index_dir = index_dir
+        self.temp_dir: str = index_dir + ".tmp"
+        if os.path.exists(self.temp_dir):
+            shutil.rmtree(self.temp_dir)
+        os.makedirs(self.temp_dir)
+        self.rows: int = 0
+        self.uids: np.ndarray = self.open_array("uids.npy", np.int64, rows)
+        self.name_offsets: np.ndarray = self.open_array("name_offsets.npy", np.int64, rows + 1)
+        self.name_offsets[0] = 0
+        self.row_hashes: np.ndarray = self.open_array("row_hashes.npy", np.uint64, rows)
+        self.names_file = open(f"{self.temp_dir}/names.bin", "wb")
+
+    def open_array(self, name: str, dtype: type, rows: int) -> np.ndarray:
+        return np.lib.format.open_memmap(f"{self.temp_dir}/{name}", mode="w+", dtype=dtype, shape=(rows,))
+
+    def add(self, names: list[bytes], uids: np.ndarray) -> None:
+        end: int = self.rows + len(names)
+        lengths: np.ndarray = np.fromiter(map(len, names), dtype=np.int64, count=len(names))
+        self.uids[self.rows : end] = uids
+        self.name_offsets[self.rows + 1 : end + 1] = self.name_offsets[self.rows] + np.cumsum(lengths)
+        self.row_hashes[self.rows : end] = hash_names(names)
+        self.names_file.write(b"".join(names))
+        self.rows = end
+
+    def close(self) -> None:
+        """Sort the hashes and move the index to index_dir, readers never see a partial index."""
+        self.names_file.close()
+        if self.rows != len(self.uids):
+            raise ValueError(f"{self.index_dir} got {self.rows} rows, {len(self.uids)} expected")
+        if self.rows > 1 and np.any(np.diff(self.uids) < 0):
+            names: np.ndarray = np.fromfile(f"{self.temp_dir}/names.bin", dtype=np.uint8)
+            uids, lengths, hashes = np.array(self.uids), np.diff(self.name_offsets), np.array(self.row_hashes)
+            self.uids = self.name_offsets = self.row_hashes = None
+            write_rows(self.index_dir, uids, lengths, [names], hashes)
+            return
+        hash_rows: np.ndarray = np.argsort(self.row_hashes, kind="stable")
+        np.save(f"{self.temp_dir}/hashes.npy", self.row_hashes[hash_rows])
+        np.save(f"{self.temp_dir}/hash_rows.npy", hash_rows.astype(np.int64))
+        for array in (self.uids, self.name_offsets, self.row_hashes):
+            array.flush()
+        self.uids = self.name_offsets = self.row_hashes = None
+        os.remove(f"{self.temp_dir}/row_hashes.npy")
+        if os.path.exists(self.index_dir):
+            shutil.rmtree(self.index_dir)
+        os.replace(self.temp_dir, self.index_dir)
+
+
+def name_index_working_set(rows: int) -> int:
+    """Bytes NameIndexWriter holds in memory: the argsort and the sorted copy of the hashes and one chunk of names."""
+    return rows * 2 * 8 + min(rows, HASH_CHUNK) * CHUNK_NAME_SIZE
+
+
+@profiler
+def write_name_index(output_dir: str, read_id_counter: dict[str, int], planner: MemoryPlanner | None = None) -> str:
+    """
+    Write the read name <-> UID index of a dataset to output_dir/read_names, see NameIndex.
+    The names are encoded and hashed HASH_CHUNK at a time, see NameIndexWriter.
+
+    :param output_dir: Output directory of the dataset.
+    :param read_id_counter: Read names and their UIDs.
+    :param planner: Optional memory planner, warns when the working set of the index does not fit.
+    :return: Path of the index directory.
+    """
+    rows: int = len(read_id_counter)
+    if planner is not None:
+        planner.check("write_name_index", name_index_working_set(rows))
+    index_dir: str = name_index_dir(output_dir)
+    writer = NameIndexWriter(index_dir, rows)
+    names, uids = iter(read_id_counter), iter(read_id_counter.values())
+    for start in range(0, rows, HASH_CHUNK):
+        chunk: list[bytes] = encode_names(list(islice(names, HASH_CHUNK)))
+        writer.add(chunk, np.fromiter(islice(uids, len(chunk)), dtype=np.int64, count=len(chunk)))
+    writer.close()
+    log.info(f"{rows} read names indexed in {index_dir}")
+    return index_dir
+
+
+@profiler
+def write_fastq_name_index(
+    output_dir: str,
+    fastq_path: str,
+    keep_mask: np.ndarray | None,
+    uid_start: int,
+    reads: int,
+    planner: MemoryPlanner | None = None,
+) -> str:
+    """
+    Write the read name index of reads which got their UIDs by position (save_fastq without read_id_counter),
+    the n-th kept read of fastq_path has the UID uid_start + n. The names are read from the FASTQ file again.
+
+    :param output_dir: Output directory of the dataset.
+    :param fastq_path: The encoded R1 FASTQ file.
+    :param keep_mask: Optional boolean mask of the kept reads, see select_pairs.
+    :param uid_start: UID of the first kept read.
+    :param reads: Number of kept reads.
+    :param planner: Optional memory planner, warns when the working set of the index does not fit.
+    :return: Path of the index directory.
+    """
+    if planner is not None:
+        planner.check("write_name_index", name_index_working_set(reads))
+    index_dir: str = name_index_dir(output_dir)
+    writer = NameIndexWriter(index_dir, reads)
+    with open_fastq(fastq_path) as fastq_file:
+        names = (read_id for read_id, _, _ in iter_fastq_records(fastq_file))
+        if keep_mask is not None:
+            names = compress(names, keep_mask)
+        for start in range(uid_start, uid_start + reads, HASH_CHUNK):
+            chunk: list[bytes] = encode_names(list(islice(names, HASH_CHUNK)))
+            writer.add(chunk, np.arange(start, start + len(chunk), dtype=np.int64))
+    writer.close()
+    log.info(f"{reads} read names of {fastq_path} indexed in {index_dir}")
+    return index_dir
+
+
+@profiler
+def merge_name_indexes(index_dir: str, source_dirs: list[str], next_uids: list[int] | None = None) -> None:
+    """
+    Write the index of the rows of all source indexes, e.g. of the work units or of an appended FASTQ pair.
+    index_dir may be one of the sources.
+
+    :param index_dir: Directory of the merged index.
+    :param source_dirs: Index directories.
+    :param next_uids: Optional UID limit per source, rows from it on are dropped (left by an interrupted append).
+    """
+    uids, lengths, blobs, hashes = [], [], [], []
+    for i, source_dir in enumerate(source_dirs):
+        index = NameIndex(source_dir)
+        rows: int = len(index)
+        if next_uids is not None and next_uids[i] is not None:
+            rows = int(np.searchsorted(index.uids, next_uids[i]))
+        kept: np.ndarray = index.hash_rows < rows
+        uids.append(np.array(index.uids[:rows]))
+        lengths.append(np.diff(index.name_offsets[: rows + 1]))
+        blobs.append(np.array(index.names[: index.name_offsets[rows]]))
+        row_hashes: np.ndarray = np.empty(rows, dtype=np.uint64)
+        row_hashes[index.hash_rows[kept]] = index.hashes[kept]
+        hashes.append(row_hashes)
+    write_rows(index_dir, np.concatenate(uids), np.concatenate(lengths), blobs, np.concatenate(hashes))
+
+
+class NameIndex:
+    """
+    Memory-mapped read name <-> UID index of a dataset. Names are found by binary search of their hash,
+    UIDs by binary search of the sorted UIDs. Lookups of many names or UIDs at once are vectorised.
+    """
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        self.uids: np.ndarray = np.load(f"{index_dir}/uids.npy", mmap_mode="r")
+        self.name_offsets: np.ndarray = np.load(f"{index_dir}/name_offsets.npy", mmap_mode="r")
+        self.hashes: np.ndarray = np.load(f"{index_dir}/hashes.npy", mmap_mode="r")
+        self.hash_rows: np.ndarray = np.load(f"{index_dir}/hash_rows.npy", mmap_mode="r")
+        names_path: str = f"{index_dir}/names.bin"
+        self.names: np.ndarray = (
+            np.memmap(names_path, dtype=np.uint8, mode="r")
+            if os.path.getsize(names_path)
+            else np.zeros(0, dtype=np.uint8)
+        )
+
+    def __len__(self) -> int:
+        return len(self.uids)
+
+    def row_names(self, rows: np.ndarray) -> list[str]:
+        starts: np.ndarray = self.name_offsets[rows]
+        lengths: np.ndarray = self.name_offsets[rows + 1] - starts
+        blob: bytes = gather_bytes(self.names, starts, lengths).tobytes()
+        return [
+            blob[end - length : end].decode(NAME_ENCODING, NAME_ERRORS)
+            for end, length in zip(np.cumsum(lengths).tolist(), lengths.tolist())
+        ]
+
+    def names_equal(self, rows: np.ndarray, names: list[bytes]) -> np.ndarray:
+        """Whether the name of rows[i] is names[i], all bytes are compared at once."""
+        starts: np.ndarray = self.name_offsets[rows]
+        lengths: np.ndarray = self.name_offsets[rows + 1] - starts
+        query_lengths: np.ndarray = np.fromiter(map(len, names), dtype=np.int64, count=len(names))
+        same_length: np.ndarray = np.flatnonzero(lengths == query_lengths)
+        stored: np.ndarray = gather_bytes(self.names, starts[same_length], lengths[same_length])
+        query: np.ndarray = np.frombuffer(b"".join(names[i] for i in same_length), dtype=np.uint8)
+        owners: np.ndarray = np.repeat(np.arange(len(same_length)), lengths[same_length])
+        mismatches: np.ndarray = np.bincount(owners, weights=stored != query, minlength=len(same_length))
+        equal: np.ndarray = np.zeros(len(rows), dtype=bool)
+        equal[same_length] = mismatches == 0
+        return equal
+
+    def uids_of(self, names: Sequence[str | bytes]) -> np.ndarray:
+        """UIDs of the read names, -1 for names not in the dataset."""
+        encoded: list[bytes] = encode_names(names)
+        hashes: np.ndarray = hash_names(encoded)
+        positions: np.ndarray = np.searchsorted(self.hashes, hashes)
+        found: np.ndarray = positions < len(self.hashes)
+        found[found] = self.hashes[positions[found]] == hashes[found]
+        uids: np.ndarray = np.full(len(encoded), -1, dtype=np.int64)
+        candidates: np.ndarray = np.flatnonzero(found)
+        rows: np.ndarray = self.hash_rows[positions[candidates]]
+        equal: np.ndarray = self.names_equal(rows, [encoded[i] for i in candidates])
+        uids[candidates[equal]] = self.uids[rows[equal]]
+        for i in candidates[~equal]:  # another name with the same hash comes first
+            position: int = int(positions[i]) + 1
+            while position < len(self.hashes) and self.hashes[position] == hashes[i]:
+                row: int = int(self.hash_rows[position])
+                if self.names_equal(np.array([row]), [encoded[i]])[0]:
+                    uids[i] = self.uids[row]
+                    break
+                position += 1
+        return uids
+
+    def uid_of(self, name: str) -> int | None:
+        uid: int = int(self.uids_of([name])[0])
+        return uid if uid >= 0 else None
+
+    def names_of(self, uids: Sequence[int] | np.ndarray) -> list[str | None]:
+        """Read names of the UIDs, None for UIDs not in the dataset."""
+        uids = np.asarray(uids, dtype=np.int64)
+        rows: np.ndarray = np.searchsorted(self.uids, uids)
+        found: np.ndarray = rows < len(self.uids)
+        found[found] = self.uids[rows[found]] == uids[found]
+        names: list[str | None] = [None] * len(uids)
+        for i, name in zip(np.flatnonzero(found), self.row_names(rows[found])):
+            names[i] = name
+        return names
+
+    def name_of(self, uid: int) -> str | None:
+        return self.names_of([uid])[0]
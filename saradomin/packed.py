@@ -0,0 +1,133 @@
+import json
+import os
+import re
+
+import numpy as np
+
+from . import common
+
+PACKED_FORMAT: str = "saradomin-packed"
+PACKED_VERSION: int = 1
+PACKED_EXTENSION: str = ".packed"
+HEADER_FILE_NAME: str = "header.json"
+
+# Tags of augmented copies, index 0 = original read
+TAGS: tuple[str, ...] = ("", "rc", "sub")
+ROW_DTYPES: dict[str, type] = {"NUCLEOTIDE": np.uint8, "SCORE": np.uint8, "KMER": np.int32}
+
+
+def row_dtype(row: str) -> np.dtype:
+    return np.dtype(ROW_DTYPES.get(row, np.int64))
+
+
+def parse_schema(header_lines: list[str]) -> list[str]:
+    """Rows after the UID, from the #schema= line of a text output header."""
+    for line in header_lines:
+        if line.startswith("#schema="):
+            names: list[str] = re.findall(r"\d+\.row ([^\t]+)", line[len("#schema=") :])
+            return [name.strip() for name in names[1:]]
+    raise ValueError("Header has no #schema= line")
+
+
+def packed_path(text_path: str) -> str:
+    """Packed directory next to a text output, READ_1.txt -> READ_1.packed."""
+    return os.path.splitext(text_path)[0] + PACKED_EXTENSION
+
+
+class PackedWriter:
+    """
+    Packed output of one text output file, a directory of NumPy arrays which can be memory mapped:
+    header.json          original header lines, schema and number of records
+    uid.npy              int64 UID of every record
+    tag.npy              uint8 index into TAGS, augmented copies have a tag
+    <ROW>.npy            values of the row of all records, e.g. NUCLEOTIDE.npy
+    <ROW>.offsets.npy    int64, values of record i are <ROW>[offsets[i] : offsets[i + 1]]
+    Arrays are allocated with their final size, parts are copied in with write_part.
+    """
+
+    def __init__(self, path: str, header_lines: list[str], read_vector_schema: list[str], records: int, values: dict):
+        """
+        :param path: Packed directory.
+        :param header_lines: Header lines of the text output.
+        :param read_vector_schema: Rows after the UID.
+        :param records: Number of records.
+        :param values: Number of values of every row.
+        """
+        self.path = path
+        self.read_vector_schema = read_vector_schema
+        common.create_dir(path)
+        self.uid = np.lib.format.open_memmap(f"{path}/uid.npy", mode="w+", dtype=np.int64, shape=(records,))
+        self.tag = np.lib.format.open_memmap(f"{path}/tag.npy", mode="w+", dtype=np.uint8, shape=(records,))
+        self.rows: dict[str, np.memmap] = {}
+        self.offsets: dict[str, np.memmap] = {}
+        for row in read_vector_schema:
+            self.rows[row] = np.lib.format.open_memmap(
+                f"{path}/{row}.npy", mode="w+", dtype=row_dtype(row), shape=(values[row],)
+            )
+            self.offsets[row] = np.lib.format.open_memmap(
+                f"{path}/{row}.offsets.npy", mode="w+", dtype=np.int64, shape=(records + 1,)
+            )
+            self.offsets[row][0] = 0
+        self.record_position: int = 0
+        self.value_positions: dict[str, int] = {row: 0 for row in read_vector_schema}
+        header = {
+            "format": PACKED_FORMAT,
+            "version": PACKED_VERSION,
+            "schema": read_vector_schema,
+            "records": records,
+            "tags": list(TAGS),
+            "header": header_lines,
+        }
+        with open(f"{path}/{HEADER_FILE_NAME}", "w") as f:
+            json.dump(header, f, indent=2)
+
+    def write_part(self, uids: np.ndarray, tags: np.ndarray, rows: dict[str, tuple[np.ndarray, np.ndarray]]) -> None:
+        """
+        Append the next records.
+
+        :param uids: UIDs of the records.
+        :param tags: Tag indexes of the records.
+        :param rows: Values and number of values per record of every row.
+        """
+        start, end = self.record_position, self.record_position + len(uids)
+        self.uid[start:end] = uids
+        self.tag[start:end] = tags
+        for row in self.read_vector_schema:
+            values, lengths = rows[row]
+            value_start = self.value_positions[row]
+            self.rows[row][value_start : value_start + len(values)] = values
+            self.offsets[row][start + 1 : end + 1] = value_start + np.cumsum(lengths)
+            self.value_positions[row] = value_start + len(values)
+        self.record_position = end
+
+    def close(self) -> None:
+        for array in [self.uid, self.tag, *self.rows.values(), *self.offsets.values()]:
+            array.flush()
+
+
+class PackedReader:
+    """Random access to the records of a packed output, arrays are memory mapped."""
+
+    def __init__(self, path: str):
+        with open(f"{path}/{HEADER_FILE_NAME}", "r") as f:
+            self.header: dict = json.load(f)
+        if self.header.get("format") != PACKED_FORMAT:
+            raise ValueError(f"{path} is not a packed saradomin output")
+        self.read_vector_schema: list[str] = self.header["schema"]
+        self.uid = np.load(f"{path}/uid.npy", mmap_mode="r")
+        self.tag = np.load(f"{path}/tag.npy", mmap_mode="r")
+        self.rows = {row: np.load(f"{path}/{row}.npy", mmap_mode="r") for row in self.read_vector_schema}
+        self.offsets = {row: np.load(f"{path}/{row}.offsets.npy", mmap_mode="r") for row in self.read_vector_schema}
+
+    def __len__(self) -> int:
+        return len(self.uid)
+
+    def row(self, name: str, i: int) -> np.ndarray:
+        return self.rows[name][self.offsets[name][i] : self.offsets[name][i + 1]]
+
+    def record(self, i: int) -> dict:
+        """UID, tag and rows of record i."""
+        record = {"UID": int(self.uid[i]), "TAG": TAGS[self.tag[i]]}
+        for name in self.read_vector_schema:
+            record[name] = self.row(name, i)
+        return record
@@ -0,0 +1,290 @@
+import os
+import shutil
+
+import numpy as np
+
+from . import common, log
+from .augment import Augmenter
+from .checkpoint import remove_checkpoint
+from .common import read_json, write_json_atomic
+from .dedup import PairDeduplicator
+from .filter import ReadFilter
+from .kmer import KmerTokenizer
+from .manifest import input_entry, new_manifest, write_manifest
+from .names import merge_name_indexes, name_index_dir, write_name_index
+from .planner import MemoryPlanner
+from .profiler import profiler
+from .selection import select_pairs
+from .stats import DatasetStats
+from .transform import (
+    FILE_R1_NAME,
+    FILE_R2_NAME,
+    build_read_vector_schema,
+    create_file_header,
+    split_and_disrupt,
+    transform_one_read,
+)
+
+PLAN_FILE_NAME: str = "plan.json"
+DONE_FILE_NAME: str = "done.json"
+
+
+def get_unit_dir(work_dir: str, unit_index: int) -> str:
+    return f"{work_dir}/unit_{unit_index:05d}"
+
+
+def remove_work_units(work_dir: str, unit_dirs: list[str]) -> None:
+    """
+    Remove the unit outputs and the plan. The work directory may be given by the user and hold other files,
+    it is removed only when nothing else is left in it.
+    """
+    for unit_dir in unit_dirs:
+        shutil.rmtree(unit_dir)
+    os.remove(f"{work_dir}/{PLAN_FILE_NAME}")
+    if not os.listdir(work_dir):
+        os.rmdir(work_dir)
+    else:
+        log.info(f"{work_dir} is kept, it holds files of other jobs")
+
+
+def read_record(fastq_file) -> list[bytes]:
+    """Read the 4 lines of one FASTQ record from a binary file, empty list at the end of the file."""
+    lines: list[bytes] = [fastq_file.readline() for _ in range(4)]
+    if not lines[0]:
+        return []
+    if not lines[0].startswith(b"@") or not lines[2].startswith(b"+"):
+        raise ValueError(f"Malformed FASTQ record at {fastq_file.name}: {lines[0]!r}")
+    return lines
+
+
+def scan_unit_boundaries(fastq_r1_path: str, fastq_r2_path: str, n_units: int) -> list[dict]:
+    """
+    Scan R1 and R2 in lockstep and cut them into work units at record boundaries.
+    Units have about the same number of R1 bytes and the mates of a unit are always in the same unit.
+
+    :return: List of units with the byte ranges of R1 and R2, index of the first record and number of records.
+    """
+    target: int = max(os.path.getsize(fastq_r1_path) // max(n_units, 1), 1)
+    units: list[dict] = []
+    r1_start, r2_start, first_record = 0, 0, 0
+    r1_offset, r2_offset, records = 0, 0, 0
+    with open(fastq_r1_path, "rb") as r1_file, open(fastq_r2_path, "rb") as r2_file:
+        while True:
+            record_r1, record_r2 = read_record(r1_file), read_record(r2_file)
+            if bool(record_r1) != bool(record_r2):
+                raise ValueError(f"{fastq_r1_path} and {fastq_r2_path} do not contain the same number of reads")
+            if not record_r1:
+                break
+            r1_offset += sum(map(len, record_r1))
+            r2_offset += sum(map(len, record_r2))
+            records += 1
+            if r1_offset - r1_start >= target and len(units) < n_units - 1:
+                units.append(
+                    {
+                        "r1_range": [r1_start, r1_offset],
+                        "r2_range": [r2_start, r2_offset],
+                        "first_record": first_record,
+                        "records": records - first_record,
+                    }
+                )
+                r1_start, r2_start, first_record = r1_offset, r2_offset, records
+    if records > first_record or not units:
+        units.append(
+            {
+                "r1_range": [r1_start, r1_offset],
+                "r2_range": [r2_start, r2_offset],
+                "first_record": first_record,
+                "records": records - first_record,
+            }
+        )
+    return units
+
+
+@profiler
+def plan_work_units(fastq_dir: str, work_dir: str, n_units: int) -> str:
+    """
+    Split the paired FASTQ files of fastq_dir into byte-range work units and write the plan file.
+
+    :param fastq_dir: Directory with the _R1 and _R2 FASTQ files.
+    :param work_dir: Shared directory of the plan and of the worker outputs.
+    :param n_units: Wanted number of work units.
+    :return: Path to the plan file.
+    """
+    fastq_r1_path, fastq_r2_path = common.find_r1_r2_files(fastq_dir)
+    units: list[dict] = scan_unit_boundaries(fastq_r1_path, fastq_r2_path, n_units)
+    common.create_dir(work_dir)
+    plan_path: str = f"{work_dir}/{PLAN_FILE_NAME}"
+    write_json_atomic(
+        plan_path,
+        {
+            "fastq_r1": os.path.abspath(fastq_r1_path),
+            "fastq_r2": os.path.abspath(fastq_r2_path),
+            "work_dir": os.path.abspath(work_dir),
+            "total_records": sum(unit["records"] for unit in units),
+            "units": units,
+        },
+    )
+    log.info(f"planned {len(units)} work units in {plan_path}")
+    return plan_path
+
+
+@profiler
+def run_work_unit(
+    plan_path: str,
+    unit_index: int,
+    version_: list[int],
+    read_filter: ReadFilter | None = None,
+    kmer_tokenizer: KmerTokenizer | None = None,
+    kmer_only: bool = False,
+    deduplicator: PairDeduplicator | None = None,
+    write_stats: bool = False,
+    encoder_workers: int = 0,
+    augmenter: Augmenter | None = None,
+    name_index: bool = False,
+) -> None:
+    """
+    Encode one work unit independently of the others.
+    UIDs of the unit start at the index of its first record, so they are unique across units.
+    Duplicate pairs are only detected within the unit.
+
+    :param plan_path: Path to the plan file written by plan_work_units.
+    :param unit_index: Index of the unit in the plan.
+    :param encoder_workers: Number of processes rendering the rows of the reads, 0 renders them inline.
+    :param augmenter: Optional augmentation of the reads.
+    :param name_index: Write the read name index of the unit, merged by merge_work_units.
+    :return: None. Writes READ_1.txt, READ_2.txt, uids.npy, optional stats.npz, read_names and done.json
+    to the unit directory.
+    """
+    plan: dict = read_json(plan_path)
+    unit: dict = plan["units"][unit_index]
+    unit_dir: str = get_unit_dir(plan["work_dir"], unit_index)
+    common.create_dir(unit_dir)
+    r1_range: tuple[int, int] = tuple(unit["r1_range"])
+    r2_range: tuple[int, int] = tuple(unit["r2_range"])
+
+    read_vector_schema: list[str] = build_read_vector_schema(kmer_tokenizer, kmer_only)
+    keep_mask: np.ndarray | None = select_pairs(
+        plan["fastq_r1"], plan["fastq_r2"], read_filter, deduplicator, r1_range=r1_range, r2_range=r2_range
+    )
+
+    stats: DatasetStats | None = DatasetStats() if write_stats else None
+    read_id_counter: dict[str, int] = {}
+    for fastq_path, file_name, byte_range, mate in (
+        (plan["fastq_r1"], FILE_R1_NAME, r1_range, "R1"),
+        (plan["fastq_r2"], FILE_R2_NAME, r2_range, "R2"),
+    ):
+        transform_one_read(
+            fastq_path,
+            f"{unit_dir}/{file_name}",
+            read_vector_schema,
+            read_id_counter,
+            version_,
+            keep_mask,
+            kmer_tokenizer,
+            stats.mates[mate] if stats else None,
+            byte_range=byte_range,
+            uid_start=unit["first_record"],
+            encoder_workers=encoder_workers,
+            augmenter=augmenter,
+        )
+
+    np.save(f"{unit_dir}/uids.npy", np.fromiter(read_id_counter.values(), dtype=np.int64, count=len(read_id_counter)))
+    if stats is not None:
+        stats.save(f"{unit_dir}/stats.npz")
+    if name_index:
+        write_name_index(unit_dir, read_id_counter)
+    write_json_atomic(f"{unit_dir}/{DONE_FILE_NAME}", {"unit": unit_index, "reads": len(read_id_counter)})
+    for file_name in (FILE_R1_NAME, FILE_R2_NAME):
+        remove_checkpoint(f"{unit_dir}/{file_name}")
+    log.info(f"work unit {unit_index} done, {len(read_id_counter)} reads")
+
+
+@profiler
+def merge_work_units(
+    plan_path: str,
+    output_dir: str,
+    train_data_fraction: float,
+    keep_correct_train_pair: float,
+    keep_correct_test_pair: float,
+    version_: list[int],
+    kmer_tokenizer: KmerTokenizer | None = None,
+    kmer_only: bool = False,
+    write_stats: bool = False,
+    keep_work_dir: bool = False,
+    planner: MemoryPlanner | None = None,
+    max_workers: int = 1,
+    executor: str = "thread",
+    augmenter: Augmenter | None = None,
+    output_layout: str = "separate",
+    name_index: bool = False,
+) -> None:
+    """
+    Concatenate the outputs of all work units in plan order, then split them into train/test data
+    and disrupt the pairs exactly like a single job.
+
+    :param plan_path: Path to the plan file written by plan_work_units.
+    :param output_dir: Directory where the train and test data are written.
+    :param write_stats: Merge the stats of the units into output_dir/stats.npz, only when every unit has stats.
+    :param keep_work_dir: Keep the unit outputs after a successful merge.
+    :param planner: Optional memory planner of the split and shuffle stages, see split_and_disrupt.
+    :param max_workers: Number of independent split and shuffle stages run concurrently.
+    :param executor: "thread" or "process" pool of the stages.
+    :param augmenter: Augmentation the units were encoded with, recorded in the header.
+    :param output_layout: "separate" READ_1/READ_2 files, "interleaved" PAIRS files or "both".
+    :param name_index: Merge the read name indexes of the units into output_dir/read_names.
+    """
+    plan: dict = read_json(plan_path)
+    unit_dirs: list[str] = [get_unit_dir(plan["work_dir"], i) for i in range(len(plan["units"]))]
+    missing: list[str] = [d for d in unit_dirs if not os.path.exists(f"{d}/{DONE_FILE_NAME}")]
+    if missing:
+        raise RuntimeError(f"Work units are not finished: {missing}")
+
+    read_vector_schema: list[str] = build_read_vector_schema(kmer_tokenizer, kmer_only)
+    train_dir: str = f"{output_dir}/train"
+    common.create_dir(train_dir)
+    common.create_dir(f"{output_dir}/test")
+    for file_name in (FILE_R1_NAME, FILE_R2_NAME):
+        output_path: str = f"{train_dir}/{file_name}"
+        create_file_header(output_path, read_vector_schema, version_, kmer_tokenizer, augmenter)
+        for unit_dir in unit_dirs:
+            common.append_file_skip_hash_lines(output_path, f"{unit_dir}/{file_name}")
+
+    uids: np.ndarray = np.concatenate([np.load(f"{d}/uids.npy") for d in unit_dirs])
+    counts: dict[str, int] = split_and_disrupt(
+        output_dir,
+        uids,
+        train_data_fraction,
+        keep_correct_train_pair,
+        keep_correct_test_pair,
+        len(read_vector_schema) + 1,
+        planner,
+        max_workers,
+        executor,
+        read_vector_schema,
+        output_layout,
+    )
+
+    entry: dict = input_entry(plan["fastq_r1"], plan["fastq_r2"], uids, 0, counts)
+    write_manifest(output_dir, new_manifest(version_, read_vector_schema, output_layout, [entry]))
+
+    if write_stats:
+        missing = [d for d in unit_dirs if not os.path.exists(f"{d}/stats.npz")]
+        if missing:
+            log.warning(f"work units without stats {missing}, {output_dir} gets no stats")
+        else:
+            stats = DatasetStats()
+            for unit_dir in unit_dirs:
+                stats.merge(DatasetStats.load(f"{unit_dir}/stats.npz"))
+            stats.counts = counts
+            stats.save(f"{output_dir}/stats.npz")
+    if name_index:
+        unit_indexes: list[str] = [name_index_dir(d) for d in unit_dirs]
+        missing = [d for d in unit_indexes if not os.path.isdir(d)]
+        if missing:
+            log.warning(f"work units without read name index {missing}, {output_dir} gets no index")
+        else:
+            merge_name_indexes(name_index_dir(output_dir), unit_indexes)
+
+    log.info(f"merged {len(unit_dirs)} work units, {len(uids)} reads")
+    if not keep_work_dir:
+        remove_work_units(plan["work_dir"], unit_dirs)
@@ -0,0 +1,101 @@
+import os
+
+import psutil
+
+from . import log
+
+MEMORY_UNITS: dict[str, int] = {"K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+# Rough CPython sizes used by the estimates
+DICT_ENTRY_OVERHEAD: int = 120  # dict entry with str key and int value
+KEEP_MASK_ENTRY_SIZE: int = 2  # bool of a pair in the batch masks and in their concatenation
+
+
+def parse_memory_size(value: str | int) -> int:
+    """
+    Parse a memory size like 512M, 8G or a number of bytes.
+    0 or an empty string means no limit.
+    """
+    if isinstance(value, int):
+        return value
+    value = value.strip().upper().removesuffix("B")
+    if not value:
+        return 0
+    if value[-1] in MEMORY_UNITS:
+        return int(float(value[:-1]) * MEMORY_UNITS[value[-1]])
+    return int(value)
+
+
+def estimate_record_count(file_path: str, lines_per_record: int = 4, sample_records: int = 1000) -> int:
+    """Estimate the number of records of a line based file from the size of the first records."""
+    file_size: int = os.path.getsize(file_path)
+    sampled_bytes, sampled_records = 0, 0
+    with open(file_path, "rb") as f:
+        while sampled_records < sample_records:
+            record = [f.readline() for _ in range(lines_per_record)]
+            if not record[0]:
+                break
+            sampled_bytes += sum(map(len, record))
+            sampled_records += 1
+    if not sampled_records:
+        return 0
+    return int(file_size / (sampled_bytes / sampled_records))
+
+
+def estimate_range_record_count(file_path: str, byte_range: tuple[int, int] | None = None) -> int:
+    """Estimated number of FASTQ records of a file or of a byte range of it."""
+    records: int = estimate_record_count(file_path)
+    if byte_range is None:
+        return records
+    return records * (byte_range[1] - byte_range[0]) // max(os.path.getsize(file_path), 1)
+
+
+class MemoryPlanner:
+    """
+    Chooses between the in-memory and the external (spilling) algorithm of a stage.
+    The working set of the stage is compared with the budget left by the current process.
+    Only the budget is kept, so the planner can be passed to stages run in worker processes.
+    """
+
+    def __init__(self, max_memory: int = 0):
+        self.max_memory = max_memory
+
+    def available(self) -> int | None:
+        """Bytes the next stage may use, None when there is no limit."""
+        if self.max_memory <= 0:
+            return None
+        return max(self.max_memory - psutil.Process().memory_info().rss, 0)
+
+    def fits(self, stage: str, working_set: int) -> bool:
+        """
+        :param stage: Name of the stage, for the log.
+        :param working_set: Estimated bytes the in-memory algorithm needs.
+        :return: True when the in-memory algorithm fits into the budget.
+        """
+        available: int | None = self.available()
+        in_memory: bool = available is None or working_set <= available
+        budget: str = "unlimited" if available is None else f"{available / 1024**2:.1f} MB"
+        log.info(
+            f"stage {stage}: working set {working_set / 1024**2:.1f} MB, available {budget}, "
+            f"{'in-memory' if in_memory else 'external'}"
+        )
+        return in_memory
+
+    def concurrent_stages(self, stage: str, working_sets: list[int], max_workers: int) -> int:
+        """
+        Number of stages which may run at once, the largest working sets of that many stages fit together.
+        :param stage: Name of the stage group, for the log.
+        :param working_sets: Estimated bytes of every stage of the group.
+        :param max_workers: Configured number of stages run at once.
+        :return: Between 1 and max_workers, 0 when not even the largest stage fits alone.
+        """
+        largest: list[int] = sorted(working_sets, reverse=True)[: max(max_workers, 1)]
+        workers: int = len(largest)
+        while workers and not self.fits(f"{stage} ({workers} at once)", sum(largest[:workers])):
+            workers -= 1
+        return workers
+
+    def check(self, stage: str, working_set: int) -> None:
+        """Log a warning when a stage without an external algorithm does not fit into the budget."""
+        if not self.fits(stage, working_set):
+            log.warning(f"stage {stage} has no external algorithm and may exceed MAX_MEMORY")
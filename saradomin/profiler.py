@@ -2,9 +2,183 @@ from saradomin import log
 
 import time
 import functools
+import itertools
+import cProfile
+import pstats
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass, field
 import psutil
 import os
 
+PROFILE_MODES: tuple[str, ...] = ("deterministic", "sampling")
+MIN_PATH_SECONDS: float = 1e-6  # call paths below this time are left out of the collapsed stacks
+MAX_STACK_DEPTH: int = 256
+
+
+@dataclass
+class ProfileSettings:
+    """Opt-in hot-path profiling of the @profiler stages, off when mode is "" and memory is False."""
+
+    mode: str = ""
+    output_dir: str = ""
+    memory: bool = False
+    memory_top: int = 20
+    interval: float = 0.005  # seconds between two samples of the sampling mode
+
+    def is_active(self) -> bool:
+        return bool(self.mode or self.memory)
+
+
+@dataclass
+class StageProfile:
+    """Profiling state of one running stage."""
+
+    name: str
+    frame: object = None
+    profile: cProfile.Profile | None = None
+    samples: Counter = field(default_factory=Counter)
+    snapshot: tracemalloc.Snapshot | None = None
+
+
+settings = ProfileSettings()
+stage_counter = itertools.count()
+# running stages per thread, only the innermost stage of a thread is profiled
+active_stages: dict[int, list[StageProfile]] = {}
+sampler: threading.Thread | None = None
+
+
+def configure_profiling(mode: str = "", output_dir: str = "", memory: bool = False, memory_top: int = 20) -> None:
+    """
+    Switch profiling of the @profiler stages on or off. For every stage run output_dir gets <stage>.<pid>.<n> files
+    - deterministic: .prof (cProfile stats) and .collapsed (stacks weighted by microseconds)
+    - sampling: .collapsed (stacks weighted by number of samples)
+    - memory: .memory.txt, top allocations at the end of the stage and growth since its start
+    Time of a nested stage is only in the files of the nested stage. Disabled profiling costs one check per stage.
+    """
+    global settings
+    if mode and mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode {mode}, expected one of {PROFILE_MODES}")
+    settings = ProfileSettings(mode, output_dir, memory, memory_top)
+    if settings.is_active():
+        os.makedirs(output_dir, exist_ok=True)
+        log.info(f"profiling stages, mode {mode or '-'}, memory {memory}, output {output_dir}")
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def frame_name(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def function_name(function: tuple[str, int, str]) -> str:
+    file_name, line, name = function
+    return f"{name} ({os.path.basename(file_name)}:{line})"
+
+
+def sample_stacks() -> None:
+    """Sampling loop, adds the stack of every thread below its innermost running stage to that stage."""
+    while True:
+        time.sleep(settings.interval)
+        frames = sys._current_frames()
+        for thread_id, stages in list(active_stages.items()):
+            if not stages or thread_id not in frames:
+                continue
+            stage: StageProfile = stages[-1]
+            names: list[str] = []
+            frame = frames[thread_id]
+            while frame is not None and frame is not stage.frame and len(names) < MAX_STACK_DEPTH:
+                names.append(frame_name(frame.f_code))
+                frame = frame.f_back
+            if names:
+                stage.samples[";".join(reversed(names))] += 1
+
+
+def collapsed_stacks(stats: pstats.Stats) -> Counter:
+    """
+    Collapsed stacks of a cProfile run. cProfile only records caller/callee edges, the time of a function is
+    split between the paths reaching it in proportion to the time of its edges, as flamegraph converters do.
+
+    :return: Stack "a;b;c" to microseconds of self time.
+    """
+    callees: dict[tuple, list[tuple[tuple, float]]] = {function: [] for function in stats.stats}
+    roots: list[tuple] = []
+    for function, (_, _, _, _, callers) in stats.stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((function, edge[3]))
+        if not callers and function[0] != __file__:  # stage bookkeeping of this module is left out
+            roots.append(function)
+
+    stacks: Counter = Counter()
+
+    def walk(function: tuple, path: list[str], seen: set, seconds: float) -> None:
+        _, _, self_time, total_time, _ = stats.stats[function]
+        scale: float = seconds / total_time if total_time else 0.0
+        path = path + [function_name(function)]
+        stacks[";".join(path)] += self_time * scale * 1e6
+        for callee, edge_time in callees.get(function, []):
+            if callee not in seen and edge_time * scale >= MIN_PATH_SECONDS and len(path) < MAX_STACK_DEPTH:
+                walk(callee, path, seen | {callee}, edge_time * scale)
+
+    for root in roots:
+        walk(root, [], {root}, stats.stats[root][3])
+    return stacks
+
+
+def write_collapsed(path: str, stacks: Counter) -> None:
+    with open(path, "w") as f:
+        for stack, weight in sorted(stacks.items()):
+            if round(weight) > 0:
+                f.write(f"{stack} {round(weight)}\n")
+
+
+def start_stage(name: str) -> StageProfile:
+    global sampler
+    stage = StageProfile(name, frame=sys._getframe(1))  # wrapper frame, sampled stacks stop below it
+    stages: list[StageProfile] = active_stages.setdefault(threading.get_ident(), [])
+    if stages and stages[-1].profile is not None:
+        stages[-1].profile.disable()
+    if settings.mode == "deterministic":
+        stage.profile = cProfile.Profile()
+    elif settings.mode == "sampling" and (sampler is None or not sampler.is_alive()):
+        sampler = threading.Thread(target=sample_stacks, name="stage-sampler", daemon=True)
+        sampler.start()
+    if settings.memory:
+        stage.snapshot = tracemalloc.take_snapshot()
+    stages.append(stage)
+    if stage.profile is not None:
+        stage.profile.enable()
+    return stage
+
+
+def finish_stage(stage: StageProfile) -> None:
+    if stage.profile is not None:
+        stage.profile.disable()
+    stages: list[StageProfile] = active_stages[threading.get_ident()]
+    stages.pop()
+
+    path: str = f"{settings.output_dir}/{stage.name}.{os.getpid()}.{next(stage_counter):03d}"
+    if stage.profile is not None:
+        stats = pstats.Stats(stage.profile)
+        stats.dump_stats(f"{path}.prof")
+        write_collapsed(f"{path}.collapsed", collapsed_stacks(stats))
+    elif settings.mode == "sampling":
+        write_collapsed(f"{path}.collapsed", stage.samples)
+    if stage.snapshot is not None:
+        snapshot = tracemalloc.take_snapshot()
+        with open(f"{path}.memory.txt", "w") as f:
+            f.write(f"# top {settings.memory_top} allocations at the end of {stage.name}\n")
+            f.writelines(f"{stat}\n" for stat in snapshot.statistics("lineno")[: settings.memory_top])
+            f.write(f"# top {settings.memory_top} allocation changes during {stage.name}\n")
+            f.writelines(f"{stat}\n" for stat in snapshot.compare_to(stage.snapshot, "lineno")[: settings.memory_top])
+    log.debug(f"profile of {stage.name} written to {path}.*")
+    if stages and stages[-1].profile is not None:
+        stages[-1].profile.enable()
+
 
 def profiler(func):
     @functools.wraps(func)
@@ -16,7 +190,14 @@ def profiler(func):
         log.info(f"START: {func.__name__}")
 
         start_time = time.time()
-        result = func(*args, **kwargs)
+        if settings.is_active():
+            stage = start_stage(func.__name__)
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                finish_stage(stage)
+        else:
+            result = func(*args, **kwargs)
         end_time = time.time()
 
         # Memory and CPU usage after function execution
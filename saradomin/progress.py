@@ -0,0 +1,213 @@
+import atexit
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import IO, Iterator
+
+from . import log
+
+METRIC_PREFIX: str = "saradomin_stage"
+
+
+class StageProgress:
+    """
+    Progress of one running stage. The stage adds to reads (and bytes) once per batch or chunk,
+    or lets the exporter read the byte position of its input file, so the hot loop stays untouched.
+    """
+
+    __slots__ = ("stage", "name", "reads", "bytes", "total_reads", "total_bytes", "started", "file", "file_start")
+
+    def __init__(self, stage: str, name: str = "", total_reads: int = 0, total_bytes: int = 0, file: IO | None = None):
+        self.stage = stage
+        self.name = name
+        self.reads: int = 0
+        self.bytes: int = 0
+        self.total_reads = total_reads
+        self.total_bytes = total_bytes
+        self.started: float = time.monotonic()
+        self.file = file
+        self.file_start: int = file_position(file) if file is not None else 0
+
+    def add(self, reads: int, bytes_: int = 0) -> None:
+        self.reads += reads
+        self.bytes += bytes_
+
+    def processed_bytes(self) -> int:
+        if self.file is None:
+            return self.bytes
+        return max(file_position(self.file) - self.file_start, 0)
+
+    def fraction(self) -> float | None:
+        """Done fraction of the stage, None when its size is unknown."""
+        if self.total_bytes:
+            return min(self.processed_bytes() / self.total_bytes, 1.0)
+        if self.total_reads:
+            return min(self.reads / self.total_reads, 1.0)
+        return None
+
+
+running: dict[int, StageProgress] = {}
+progress_ids = itertools.count()
+exporter: "ProgressExporter | None" = None
+
+
+def file_position(file: IO) -> int:
+    """Byte position of the file descriptor, read ahead of the buffered reader by at most its buffer."""
+    return os.lseek(file.fileno(), 0, os.SEEK_CUR)
+
+
+@contextmanager
+def track(
+    stage: str, name: str = "", total_reads: int = 0, total_bytes: int = 0, file: IO | None = None
+) -> Iterator[StageProgress]:
+    """
+    Register a running stage for the exporter.
+
+    :param stage: Name of the stage.
+    :param name: Input of the stage, e.g. the file name, stages of the same name run concurrently.
+    :param total_reads: Expected number of reads, for the ETA.
+    :param total_bytes: Expected number of bytes, default the size of file.
+    :param file: Opened input file, its position is the number of processed bytes.
+    """
+    if file is not None and not total_bytes:
+        total_bytes = os.fstat(file.fileno()).st_size
+    progress = StageProgress(stage, name, total_reads, total_bytes, file)
+    progress_id: int = next(progress_ids)
+    running[progress_id] = progress
+    try:
+        yield progress
+    finally:
+        del running[progress_id]
+
+
+def format_seconds(seconds: float) -> str:
+    return time.strftime("%H:%M:%S", time.gmtime(seconds)) if seconds < 86400 else f"{seconds / 86400:.1f} days"
+
+
+class ProgressExporter(threading.Thread):
+    """
+    Writes the progress of the running stages every interval seconds to a Prometheus textfile
+    (node_exporter textfile collector) and/or the log.
+    """
+
+    def __init__(self, interval: float, textfile: str = "", to_log: bool = True):
+        super().__init__(name="progress-exporter", daemon=True)
+        self.interval = interval
+        self.textfile = textfile
+        self.to_log = to_log
+        self.previous: dict[int, tuple[float, int, int]] = {}  # time, reads and bytes at the last export
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            self.export()
+
+    def stop(self) -> None:
+        """Stop exporting, the textfile is rewritten once without the stages still registered."""
+        if not self.stopped.is_set():
+            self.stopped.set()
+            if self.is_alive() and threading.current_thread() is not self:
+                self.join()  # a running export finishes first
+            if self.textfile:
+                write_textfile(self.textfile, [])
+
+    def snapshot(self) -> list[dict]:
+        now: float = time.monotonic()
+        rows: list[dict] = []
+        previous: dict[int, tuple[float, int, int]] = {}
+        for progress_id, progress in list(running.items()):
+            try:
+                processed_bytes: int = progress.processed_bytes()
+            except OSError:  # the input was closed after the stage ended
+                continue
+            last_time, last_reads, last_bytes = self.previous.get(progress_id, (progress.started, 0, 0))
+            elapsed: float = max(now - last_time, 1e-9)
+            fraction: float | None = progress.fraction()
+            stage_seconds: float = now - progress.started
+            rows.append(
+                {
+                    "stage": progress.stage,
+                    "name": progress.name,
+                    "reads": progress.reads,
+                    "bytes": processed_bytes,
+                    "total_bytes": progress.total_bytes,
+                    "reads_per_second": (progress.reads - last_reads) / elapsed,
+                    "bytes_per_second": (processed_bytes - last_bytes) / elapsed,
+                    "elapsed_seconds": stage_seconds,
+                    "eta_seconds": stage_seconds * (1 - fraction) / fraction if fraction else None,
+                    "fraction": fraction,
+                }
+            )
+            previous[progress_id] = (now, progress.reads, processed_bytes)
+        self.previous = previous
+        return rows
+
+    def export(self) -> None:
+        rows: list[dict] = self.snapshot()
+        if self.textfile:
+            write_textfile(self.textfile, rows)
+        if self.to_log:
+            for row in rows:
+                parts: list[str] = [f"{row['bytes'] / 1024**2:.1f} MB", f"{row['bytes_per_second'] / 1024**2:.1f} MB/s"]
+                if row["reads"]:
+                    parts = [f"{row['reads']} reads", f"{row['reads_per_second']:.0f} reads/s"] + parts
+                if row["fraction"] is not None:
+                    parts.append(f"{row['fraction'] * 100:.1f}%")
+                if row["eta_seconds"] is not None:
+                    parts.append(f"ETA {format_seconds(row['eta_seconds'])}")
+                log.info(f"{row['stage']} {row['name']}: {', '.join(parts)}")
+
+
+def write_textfile(path: str, rows: list[dict]) -> None:
+    """Prometheus text format, written to a temporary file and renamed as the textfile collector expects."""
+    metrics: list[tuple[str, str, str]] = [
+        ("reads", "reads", "Reads processed by the running stage."),
+        ("bytes", "bytes", "Input bytes processed by the running stage."),
+        ("size_bytes", "total_bytes", "Input bytes of the running stage, 0 when unknown."),
+        ("reads_per_second", "reads_per_second", "Reads per second since the last export."),
+        ("bytes_per_second", "bytes_per_second", "Input bytes per second since the last export."),
+        ("elapsed_seconds", "elapsed_seconds", "Run time of the stage."),
+        ("eta_seconds", "eta_seconds", "Estimated time until the stage is done."),
+    ]
+    lines: list[str] = []
+    for metric, key, help_text in metrics:
+        lines += [f"# HELP {METRIC_PREFIX}_{metric} {help_text}", f"# TYPE {METRIC_PREFIX}_{metric} gauge"]
+        for row in rows:
+            if row[key] is not None:
+                labels: str = f'stage="{row["stage"]}",input="{row["name"]}",pid="{os.getpid()}"'
+                value: str = str(row[key]) if isinstance(row[key], int) else f"{row[key]:.6g}"
+                lines.append(f"{METRIC_PREFIX}_{metric}{{{labels}}} {value}")
+    lines += [
+        "# HELP saradomin_progress_timestamp_seconds Time of the last export.",
+        "# TYPE saradomin_progress_timestamp_seconds gauge",
+        f"saradomin_progress_timestamp_seconds {time.time():.3f}",
+    ]
+    temp_path: str = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(temp_path, path)
+
+
+def start_exporter(interval: float, textfile: str = "", to_log: bool = True) -> ProgressExporter | None:
+    """
+    Start the progress exporter of this process, replacing a running one. Nothing is started when interval is 0.
+
+    :param interval: Seconds between two exports.
+    :param textfile: Path of the Prometheus textfile, "" = no textfile.
+    :param to_log: Log the progress of every running stage.
+    """
+    global exporter
+    if exporter is not None:
+        exporter.stop()
+        exporter = None
+    if interval <= 0 or not (textfile or to_log):
+        return None
+    if textfile:
+        os.makedirs(os.path.dirname(os.path.abspath(textfile)), exist_ok=True)
+    exporter = ProgressExporter(interval, textfile, to_log)
+    exporter.start()
+    atexit.register(exporter.stop)
+    log.info(f"progress exported every {interval} s to {textfile or 'the log'}")
+    return exporter
@@ -0,0 +1,90 @@
+from functools import lru_cache
+
+import numpy as np
+
+# ASCII digits of every value up to 999 and their number
+MAX_RENDERED_VALUE: int = 999
+DIGITS = np.zeros((MAX_RENDERED_VALUE + 1, 3), dtype=np.uint8)
+DIGIT_COUNTS = np.zeros(MAX_RENDERED_VALUE + 1, dtype=np.int64)
+for _value in range(MAX_RENDERED_VALUE + 1):
+    _digits = str(_value).encode("ascii")
+    DIGITS[_value, : len(_digits)] = np.frombuffer(_digits, dtype=np.uint8)
+    DIGIT_COUNTS[_value] = len(_digits)
+MAX_GLYPH_SIZE: int = 5  # a quoted value, '100'
+
+
+@lru_cache
+def glyph_table(quoted: int | None) -> tuple[np.ndarray, np.ndarray]:
+    """Text of every value and its size, the quoted value is rendered as str() renders a string, e.g. '100'."""
+    glyphs = np.zeros((MAX_RENDERED_VALUE + 1, MAX_GLYPH_SIZE), dtype=np.uint8)
+    glyphs[:, :3] = DIGITS
+    sizes = DIGIT_COUNTS.copy()
+    if quoted is not None:
+        text = f"'{quoted}'".encode("ascii")
+        glyphs[quoted, : len(text)] = np.frombuffer(text, dtype=np.uint8)
+        sizes[quoted] = len(text)
+    return glyphs, sizes
+
+
+def rendered_size_bound(n_rows: int, n_values: int) -> int:
+    """Upper bound of the bytes render_int_rows needs, every value quoted."""
+    return 3 * n_rows + (MAX_GLYPH_SIZE + 2) * n_values
+
+
+def render_int_rows(
+    values: np.ndarray,
+    lengths: np.ndarray,
+    out: np.ndarray | None = None,
+    row_ends: np.ndarray | None = None,
+    quoted: int | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Render rows of small integers as text lines, byte for byte the same as f"{str(list_of_ints)}\\n".
+    With quoted the value is rendered as a string in the list, like the '100' of unknown bases of encode_sequence.
+
+    :param values: Flat array of the values of all rows, 0 - 999.
+    :param lengths: Number of values of every row.
+    :param out: Optional uint8 buffer to render into, e.g. a shared memory view.
+    :param row_ends: Optional int64 buffer for the end offsets of the rows.
+    :param quoted: Optional value rendered in quotes.
+    :return: Rendered bytes (view of out) and the end offset of every row.
+    """
+    values = np.asarray(values)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    if len(values) and int(values.max()) > MAX_RENDERED_VALUE:
+        raise ValueError(f"Only values up to {MAX_RENDERED_VALUE} can be rendered")
+    glyphs, glyph_sizes = glyph_table(quoted)
+    n_digits = glyph_sizes[values]
+    pieces = n_digits + 2  # digits followed by ", " or "]\n"
+
+    row_of_value = np.repeat(np.arange(len(lengths)), lengths)
+    row_sizes = 1 + np.bincount(row_of_value, weights=pieces, minlength=len(lengths)).astype(np.int64)
+    row_sizes += 2 * (lengths == 0)  # "[]\n"
+    if row_ends is None:
+        row_ends = np.empty(len(lengths), dtype=np.int64)
+    np.cumsum(row_sizes, out=row_ends)
+    row_starts = row_ends - row_sizes
+    size = int(row_ends[-1]) if len(row_ends) else 0
+    if out is None:
+        out = np.empty(size, dtype=np.uint8)
+    elif len(out) < size:
+        raise ValueError(f"Rendered rows need {size} bytes, buffer has {len(out)}")
+    out = out[:size]
+
+    out[row_starts] = ord("[")
+    first_value = np.cumsum(lengths) - lengths
+    piece_starts = np.cumsum(pieces) - pieces
+    value_starts = row_starts[row_of_value] + 1 + piece_starts - piece_starts[first_value[row_of_value]]
+    for digit in range(int(n_digits.max()) if len(values) else 0):
+        has_digit = n_digits > digit
+        out[value_starts[has_digit] + digit] = glyphs[values[has_digit], digit]
+
+    is_last = np.zeros(len(values), dtype=bool)
+    is_last[(first_value + lengths - 1)[lengths > 0]] = True
+    separators = value_starts + n_digits
+    out[separators] = np.where(is_last, ord("]"), ord(","))
+    out[separators + 1] = np.where(is_last, ord("\n"), ord(" "))
+    empty_rows = row_starts[lengths == 0]
+    out[empty_rows + 1] = ord("]")
+    out[empty_rows + 2] = ord("\n")
+    return out, row_ends
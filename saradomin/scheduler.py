@@ -0,0 +1,113 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from . import log
+
+EXECUTORS: tuple[str, ...] = ("thread", "process")
+
+
+def run_timed(func: Callable, args: tuple, kwargs: dict) -> tuple[Any, float]:
+    start_time = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start_time
+
+
+@dataclass
+class Stage:
+    """
+    One step of the pipeline. Inputs and outputs are artifact names, usually file paths.
+    A stage is ready when every stage producing one of its inputs is finished.
+    """
+
+    name: str
+    func: Callable
+    args: tuple = ()
+    kwargs: dict = field(default_factory=dict)
+    inputs: tuple[str, ...] = ()
+    outputs: tuple[str, ...] = ()
+
+
+class StageGraph:
+    """Stages with declared inputs and outputs, independent stages run concurrently."""
+
+    def __init__(self):
+        self.stages: dict[str, Stage] = {}
+        self.timings: dict[str, float] = {}
+
+    def add(
+        self, name: str, func: Callable, *args, inputs: tuple[str, ...] = (), outputs: tuple[str, ...] = (), **kwargs
+    ) -> Stage:
+        if name in self.stages:
+            raise ValueError(f"Stage {name} is already in the graph")
+        stage = Stage(name, func, args, kwargs, tuple(inputs), tuple(outputs))
+        self.stages[name] = stage
+        return stage
+
+    def dependencies(self) -> dict[str, set[str]]:
+        """
+        Map every stage to the stages producing its inputs.
+        Inputs without a producer are expected to exist before the graph runs.
+        """
+        producers: dict[str, str] = {}
+        for stage in self.stages.values():
+            for output in stage.outputs:
+                if output in producers:
+                    raise ValueError(f"{output} is produced by both {producers[output]} and {stage.name}")
+                producers[output] = stage.name
+        return {
+            stage.name: {producers[i] for i in stage.inputs if i in producers and producers[i] != stage.name}
+            for stage in self.stages.values()
+        }
+
+    def run(self, max_workers: int = 1, executor: str = "thread") -> dict[str, Any]:
+        """
+        Run all stages, at most max_workers at the same time. Stages are submitted in the order they were added
+        as soon as they are ready. The first failing stage cancels the stages which did not start yet.
+
+        :param max_workers: Concurrency limit, 1 runs the stages one after another.
+        :param executor: "thread" or "process". Stage functions and arguments must be picklable for processes.
+        :return: Results of the stages by name.
+        """
+        if executor not in EXECUTORS:
+            raise ValueError(f"Unknown executor {executor}, expected one of {EXECUTORS}")
+        dependencies: dict[str, set[str]] = self.dependencies()
+        waiting: list[str] = list(self.stages)
+        running: dict[Future, str] = {}
+        results: dict[str, Any] = {}
+        start_time = time.perf_counter()
+
+        pool_class = ThreadPoolExecutor if executor == "thread" else ProcessPoolExecutor
+        with pool_class(max_workers=max(max_workers, 1)) as pool:
+            while waiting or running:
+                for name in [n for n in waiting if dependencies[n] <= results.keys()]:
+                    if len(running) >= max(max_workers, 1):
+                        break
+                    waiting.remove(name)
+                    running[self.submit(pool, self.stages[name])] = name
+                if not running:
+                    raise ValueError(f"Stages {waiting} depend on each other")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name], self.timings[name] = future.result()
+                    except BaseException:
+                        for pending in running:
+                            pending.cancel()
+                        log.error(f"stage {name} failed")
+                        raise
+                    log.info(f"stage {name} finished in {self.timings[name]:.4f} seconds")
+
+        log.info(
+            f"{len(self.stages)} stages finished in {time.perf_counter() - start_time:.4f} seconds, "
+            f"sum of stage times {sum(self.timings.values()):.4f} seconds"
+        )
+        return results
+
+    @staticmethod
+    def submit(pool: Executor, stage: Stage) -> Future:
+        log.debug(f"stage {stage.name} started")
+        return pool.submit(run_timed, stage.func, stage.args, stage.kwargs)
@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+
+from . import log
+from .dedup import PairDeduplicator
+from .fastq import iter_paired_batches
+from .filter import ReadFilter, filter_pairs
+from .planner import estimate_range_record_count
+from .profiler import profiler
+from .progress import track
+from .subsample import Subsampler
+
+
+@profiler
+def select_pairs(
+    fastq_r1_path: str,
+    fastq_r2_path: str,
+    read_filter: ReadFilter | None = None,
+    deduplicator: PairDeduplicator | None = None,
+    batch_size: int = 65536,
+    r1_range: tuple[int, int] | None = None,
+    r2_range: tuple[int, int] | None = None,
+    subsampler: Subsampler | None = None,
+) -> np.ndarray | None:
+    """
+    Decide which read pairs are kept before they are encoded.
+    Both FASTQ files are read in lockstep, so a pair is dropped together when either mate fails.
+
+    :param fastq_r1_path: Path to the R1 FASTQ file.
+    :param fastq_r2_path: Path to the R2 FASTQ file.
+    :param read_filter: Read filter thresholds. None or an inactive filter keeps every pair.
+    :param deduplicator: Optional duplicate pair removal, only pairs passing the filters are checked.
+    :param batch_size: Number of pairs evaluated at once.
+    :param r1_range: Optional byte range of R1 to process.
+    :param r2_range: Optional byte range of R2 to process.
+    :param subsampler: Optional streaming subsampling, the sample is drawn from the pairs passing filters and dedup.
+    :return: Boolean mask indexed by the position of the pair in the FASTQ files, None when every pair is kept.
+    """
+    if read_filter is not None and not read_filter.is_active():
+        read_filter = None
+    if read_filter is None and deduplicator is None and subsampler is None:
+        return None
+    sampler = subsampler.streaming_sampler() if subsampler is not None else None
+
+    masks: list[np.ndarray] = []
+    failed_counts: dict[str, int] = {}
+    position: int = 0
+    total_reads: int = estimate_range_record_count(fastq_r1_path, r1_range)
+    with track("select_pairs", os.path.basename(fastq_r1_path), total_reads) as progress:
+        for batch_r1, batch_r2 in iter_paired_batches(fastq_r1_path, fastq_r2_path, batch_size, r1_range, r2_range):
+            keep = np.ones(len(batch_r1), dtype=bool)
+            if read_filter is not None:
+                for name, failed in filter_pairs(read_filter, batch_r1, batch_r2).items():
+                    failed_counts[name] = failed_counts.get(name, 0) + int(failed.sum())
+                    keep &= ~failed
+            if deduplicator is not None:
+                keep &= ~deduplicator.find_duplicates(batch_r1, batch_r2, keep)
+            if sampler is not None:
+                keep = sampler.sample(keep, position)
+            masks.append(keep)
+            position += len(batch_r1)
+            progress.add(len(batch_r1))
+
+    keep_mask = np.concatenate(masks) if masks else np.zeros(0, dtype=bool)
+    if sampler is not None:
+        keep_mask = sampler.finish(keep_mask)
+        log.info(f"subsample {subsampler.strategy}: {int(keep_mask.sum())} pairs sampled")
+    total: int = len(keep_mask)
+    kept: int = int(keep_mask.sum())
+    for name, count in failed_counts.items():
+        log.info(f"filter {name}: {count} pairs failed")
+    if deduplicator is not None:
+        deduplicator.report()
+    log.info(f"kept {kept} of {total} pairs, dropped {total - kept}")
+    return keep_mask
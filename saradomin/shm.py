@@ -0,0 +1,280 @@
+import multiprocessing
+import queue
+import traceback
+from multiprocessing import resource_tracker
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+from typing import Iterable, Iterator
+
+import numpy as np
+
+from . import log
+from .fastq import FastqBatch
+from .render import render_int_rows, rendered_size_bound
+
+# Codes of the NUCLEOTIDE row, same as encode_sequence. Characters outside ACGTN get 100, which encode_sequence
+# writes as the string '100', render it with quoted=UNKNOWN_BASE_CODE
+UNKNOWN_BASE_CODE: int = 100
+NUCLEOTIDE_CODES = np.full(256, UNKNOWN_BASE_CODE, dtype=np.uint8)
+for _code, _bases in enumerate(("Aa", "Cc", "Gg", "Tt", "Nn")):
+    for _base in _bases:
+        NUCLEOTIDE_CODES[ord(_base)] = _code
+
+SLOT_HEADER_SIZE: int = 64  # int64 n_reads, n_bases, rendered NUCLEOTIDE bytes, rendered SCORE bytes
+WORKER_POLL_SECONDS: float = 0.5
+
+
+@dataclass(slots=True)
+class SlotLayout:
+    """
+    Layout of one batch in a shared memory slot:
+    header | lengths | NUCLEOTIDE row ends | SCORE row ends | sequences | qualities | rendered rows
+    """
+
+    n_reads: int
+    n_bases: int
+
+    @property
+    def size(self) -> int:
+        return SLOT_HEADER_SIZE + 3 * 8 * self.n_reads + 2 * self.n_bases + self.rendered_capacity
+
+    @property
+    def rendered_capacity(self) -> int:
+        return 2 * rendered_size_bound(self.n_reads, self.n_bases)
+
+    def views(self, buffer) -> dict[str, np.ndarray]:
+        """Numpy views of the regions of the slot, no data is copied."""
+        n, b = self.n_reads, self.n_bases
+        offset = SLOT_HEADER_SIZE
+        views: dict[str, np.ndarray] = {}
+        for name, dtype, count in (
+            ("lengths", np.int64, n),
+            ("nucleotide_ends", np.int64, n),
+            ("score_ends", np.int64, n),
+            ("sequences", np.uint8, b),
+            ("qualities", np.uint8, b),
+            ("rendered", np.uint8, self.rendered_capacity),
+        ):
+            views[name] = np.ndarray(count, dtype=dtype, buffer=buffer, offset=offset)
+            offset += count * np.dtype(dtype).itemsize
+        return views
+
+
+def slot_header(buffer) -> np.ndarray:
+    return np.ndarray(4, dtype=np.int64, buffer=buffer)
+
+
+def encode_slot(buffer) -> None:
+    """Encode and render the NUCLEOTIDE and SCORE rows of the batch in a slot, in place."""
+    header = slot_header(buffer)
+    views = SlotLayout(int(header[0]), int(header[1])).views(buffer)
+    rendered = views["rendered"]
+    nucleotides, _ = render_int_rows(
+        NUCLEOTIDE_CODES[views["sequences"]],
+        views["lengths"],
+        rendered,
+        views["nucleotide_ends"],
+        quoted=UNKNOWN_BASE_CODE,
+    )
+    # the SCORE row holds the ASCII values of the quality string, the raw bytes
+    scores, _ = render_int_rows(views["qualities"], views["lengths"], rendered[len(nucleotides) :], views["score_ends"])
+    header[2], header[3] = len(nucleotides), len(scores)
+
+
+def encoder_worker(tasks, done) -> None:
+    """
+    Worker process. Receives (batch number, ring number, slot name), encodes the slot in place and answers
+    (batch number, None) or (batch number, traceback). None stops the worker.
+    A task of a new ring detaches the slots of the replaced ring, which has no batches in flight any more.
+    """
+    attached: dict[str, SharedMemory] = {}
+    attached_ring: int = -1
+    try:
+        while (task := tasks.get()) is not None:
+            number, ring, name = task
+            try:
+                if ring != attached_ring:
+                    for block in attached.values():
+                        block.close()
+                    attached, attached_ring = {}, ring
+                if name not in attached:
+                    attached[name] = SharedMemory(name=name)
+                encode_slot(attached[name].buf)
+                done.put((number, None))
+            except Exception:
+                done.put((number, traceback.format_exc()))
+    finally:
+        for block in attached.values():
+            block.close()
+
+
+@dataclass(slots=True)
+class EncodedBatch:
+    """Rendered rows of a batch, views into a shared memory slot valid until the next batch is requested."""
+
+    nucleotide_rows: memoryview
+    score_rows: memoryview
+    nucleotide_ends: np.ndarray
+    score_ends: np.ndarray
+
+    def nucleotide_row(self, i: int) -> memoryview:
+        return self.nucleotide_rows[self.nucleotide_ends[i - 1] if i else 0 : self.nucleotide_ends[i]]
+
+    def score_row(self, i: int) -> memoryview:
+        return self.score_rows[self.score_ends[i - 1] if i else 0 : self.score_ends[i]]
+
+
+class SharedRing:
+    """Fixed number of shared memory slots of the same size, reused round robin."""
+
+    def __init__(self, n_slots: int, slot_size: int):
+        self.slot_size = slot_size
+        self.blocks: list[SharedMemory] = []
+        for _ in range(n_slots):
+            self.blocks.append(SharedMemory(create=True, size=slot_size))
+        self.free: list[int] = list(range(n_slots))
+        log.debug(f"shared ring with {n_slots} slots of {slot_size / 1024**2:.1f} MB")
+
+    def write_batch(self, slot: int, batch: FastqBatch) -> None:
+        """Copy the raw sequences and qualities of a batch into a slot."""
+        lengths = np.fromiter(map(len, batch.sequences), dtype=np.int64, count=len(batch))
+        layout = SlotLayout(len(batch), int(lengths.sum()))
+        if layout.size > self.slot_size:
+            raise ValueError(f"Batch of {len(batch)} reads needs {layout.size} bytes, slots have {self.slot_size}")
+        buffer = self.blocks[slot].buf
+        slot_header(buffer)[:2] = layout.n_reads, layout.n_bases
+        views = layout.views(buffer)
+        views["lengths"][:] = lengths
+        views["sequences"][:] = np.frombuffer("".join(batch.sequences).encode("ascii"), dtype=np.uint8)
+        views["qualities"][:] = np.frombuffer("".join(batch.qualities).encode("ascii"), dtype=np.uint8)
+
+    def encoded(self, slot: int) -> EncodedBatch:
+        buffer = self.blocks[slot].buf
+        header = slot_header(buffer)
+        views = SlotLayout(int(header[0]), int(header[1])).views(buffer)
+        rendered = memoryview(views["rendered"])
+        nucleotide_size, score_size = int(header[2]), int(header[3])
+        return EncodedBatch(
+            rendered[:nucleotide_size],
+            rendered[nucleotide_size : nucleotide_size + score_size],
+            views["nucleotide_ends"],
+            views["score_ends"],
+        )
+
+    def close(self) -> None:
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+
+class SharedMemoryEncoder:
+    """
+    Encoder processes fed through a ring of shared memory slots. The parser (the calling process) copies the raw
+    reads of a batch into a free slot, a worker renders the NUCLEOTIDE and SCORE rows into the same slot and the
+    writer reads them from there. Only batch numbers, ring numbers and slot names are pickled.
+    When every slot is in use the parser waits for the writer, which bounds the memory in flight.
+
+    with SharedMemoryEncoder(workers=4) as encoder:
+        for batch, encoded in encoder.imap(batches):
+            ...
+    """
+
+    def __init__(self, workers: int, n_slots: int = 0, slot_size: int = 0):
+        """
+        :param workers: Number of encoder processes.
+        :param n_slots: Number of slots, default twice the number of workers.
+        :param slot_size: Bytes of a slot. By default twice the size needed by the first batch,
+        the ring is replaced by a larger one when a batch of longer reads does not fit.
+        """
+        self.workers = max(workers, 1)
+        self.n_slots = n_slots or 2 * self.workers
+        self.slot_size = slot_size
+        self.ring: SharedRing | None = None
+        self.rings: int = 0
+        context = multiprocessing.get_context()
+        self.tasks = context.Queue()
+        self.done = context.Queue()
+        self.processes = [
+            context.Process(target=encoder_worker, args=(self.tasks, self.done), daemon=True)
+            for _ in range(self.workers)
+        ]
+
+    def __enter__(self) -> "SharedMemoryEncoder":
+        # workers have to share the tracker of this process, a tracker of their own would unlink the slots at exit
+        resource_tracker.ensure_running()
+        for process in self.processes:
+            process.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Stop the workers and release the shared memory."""
+        for process in self.processes:
+            if process.is_alive():
+                self.tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        for q in (self.tasks, self.done):
+            q.close()
+            q.cancel_join_thread()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+    def receive(self) -> int:
+        """Wait for the next finished batch, raise when a worker failed or died."""
+        while True:
+            try:
+                number, error = self.done.get(timeout=WORKER_POLL_SECONDS)
+            except queue.Empty:
+                dead = [p.pid for p in self.processes if not p.is_alive()]
+                if dead:
+                    raise RuntimeError(f"Encoder processes {dead} stopped unexpectedly")
+                continue
+            if error is not None:
+                raise RuntimeError(f"Encoding of batch {number} failed:\n{error}")
+            return number
+
+    def imap(self, batches: Iterable[FastqBatch]) -> Iterator[tuple[FastqBatch, EncodedBatch]]:
+        """
+        Encode batches in the worker processes and yield them in input order.
+        The EncodedBatch views are only valid until the next batch is requested, its slot is reused then.
+        """
+        batches = iter(batches)
+        in_flight: dict[int, tuple[FastqBatch, int]] = {}
+        finished: set[int] = set()
+        submitted, next_number = 0, 0
+        batch: FastqBatch | None = next(batches, None)
+        while True:
+            while batch is not None and (self.ring is None or self.ring.free):
+                size: int = SlotLayout(len(batch), sum(map(len, batch.sequences))).size
+                if self.ring is not None and size > self.ring.slot_size and not self.slot_size:
+                    if len(self.ring.free) < self.n_slots:
+                        break  # longer reads, the ring is replaced once its slots are back
+                    self.ring.close()
+                    self.ring = None
+                if self.ring is None:
+                    self.ring = SharedRing(self.n_slots, self.slot_size or 2 * size)
+                    self.rings += 1
+                slot = self.ring.free.pop()
+                self.ring.write_batch(slot, batch)
+                self.tasks.put((submitted, self.rings, self.ring.blocks[slot].name))
+                in_flight[submitted] = (batch, slot)
+                submitted += 1
+                batch = next(batches, None)
+            if next_number == submitted:
+                return
+
+            while next_number not in finished:
+                finished.add(self.receive())
+            finished.remove(next_number)
+            done_batch, slot = in_flight.pop(next_number)
+            yield done_batch, self.ring.encoded(slot)
+            self.ring.free.append(slot)
+            next_number += 1
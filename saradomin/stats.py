@@ -0,0 +1,126 @@
+import json
+
+import numpy as np
+
+from .fastq import FastqBatch
+from .kmer import encode_bases
+
+N_BASE_CODES: int = 5  # A, C, G, T, N
+N_QUALITIES: int = 94  # PHRED 0 - 93
+
+
+def grow(array: np.ndarray, rows: int) -> np.ndarray:
+    """Pad array with zero rows so it has at least the given number of rows."""
+    if len(array) >= rows:
+        return array
+    return np.pad(array, [(0, rows - len(array))] + [(0, 0)] * (array.ndim - 1))
+
+
+class ReadStats:
+    """
+    Accumulators of one mate. Histograms are indexed by the position in the read and grow with the longest read.
+    - base_counts[position, base code]
+    - quality_counts[position, PHRED]
+    - length_counts[read length]
+    """
+
+    def __init__(self, phred_offset: int = 33):
+        self.phred_offset = phred_offset
+        self.base_counts = np.zeros((0, N_BASE_CODES), dtype=np.int64)
+        self.quality_counts = np.zeros((0, N_QUALITIES), dtype=np.int64)
+        self.length_counts = np.zeros(0, dtype=np.int64)
+
+    @property
+    def reads(self) -> int:
+        return int(self.length_counts.sum())
+
+    def add_batch(self, batch: FastqBatch, keep: np.ndarray | None = None) -> None:
+        """
+        :param batch: Batch of reads.
+        :param keep: Optional boolean mask, only reads with True are counted.
+        """
+        sequences, qualities = batch.sequences, batch.qualities
+        if keep is not None:
+            index = np.flatnonzero(keep)
+            sequences = [sequences[i] for i in index]
+            qualities = [qualities[i] for i in index]
+        self.add_sequences(sequences, qualities)
+
+    def add_sequences(self, sequences: list[str], qualities: list[str]) -> None:
+        codes, lengths = encode_bases(sequences)
+        if not len(lengths):
+            return
+        max_length = int(lengths.max())
+        positions = np.arange(len(codes)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        scores = np.frombuffer("".join(qualities).encode("ascii"), dtype=np.uint8).astype(np.int64)
+        scores = np.clip(scores - self.phred_offset, 0, N_QUALITIES - 1)
+
+        self.base_counts = grow(self.base_counts, max_length)
+        self.quality_counts = grow(self.quality_counts, max_length)
+        self.length_counts = grow(self.length_counts, max_length + 1)
+        self.base_counts[:max_length] += np.bincount(
+            positions * N_BASE_CODES + codes, minlength=max_length * N_BASE_CODES
+        ).reshape(max_length, N_BASE_CODES)
+        self.quality_counts[:max_length] += np.bincount(
+            positions * N_QUALITIES + scores, minlength=max_length * N_QUALITIES
+        ).reshape(max_length, N_QUALITIES)
+        self.length_counts[: max_length + 1] += np.bincount(lengths, minlength=max_length + 1)
+
+    def state(self) -> dict:
+        """Accumulators as JSON lists, e.g. for a checkpoint."""
+        return {
+            "base_counts": self.base_counts.tolist(),
+            "quality_counts": self.quality_counts.tolist(),
+            "length_counts": self.length_counts.tolist(),
+        }
+
+    def set_state(self, state: dict) -> None:
+        self.base_counts = np.array(state["base_counts"], dtype=np.int64).reshape(-1, N_BASE_CODES)
+        self.quality_counts = np.array(state["quality_counts"], dtype=np.int64).reshape(-1, N_QUALITIES)
+        self.length_counts = np.array(state["length_counts"], dtype=np.int64)
+
+    def merge(self, other: "ReadStats") -> None:
+        """Add accumulators of another ReadStats, e.g. of a worker process."""
+        self.base_counts = grow(self.base_counts, len(other.base_counts))
+        self.quality_counts = grow(self.quality_counts, len(other.quality_counts))
+        self.length_counts = grow(self.length_counts, len(other.length_counts))
+        self.base_counts[: len(other.base_counts)] += other.base_counts
+        self.quality_counts[: len(other.quality_counts)] += other.quality_counts
+        self.length_counts[: len(other.length_counts)] += other.length_counts
+
+
+class DatasetStats:
+    """Statistics of a whole run, accumulators of both mates and counts of the train/test split."""
+
+    MATES: tuple[str, ...] = ("R1", "R2")
+
+    def __init__(self):
+        self.mates: dict[str, ReadStats] = {mate: ReadStats() for mate in self.MATES}
+        self.counts: dict[str, int] = {}
+
+    def merge(self, other: "DatasetStats") -> None:
+        for mate in self.MATES:
+            self.mates[mate].merge(other.mates[mate])
+        for name, value in other.counts.items():
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def save(self, path: str) -> None:
+        arrays: dict[str, np.ndarray] = {}
+        for mate, read_stats in self.mates.items():
+            arrays[f"{mate}_base_counts"] = read_stats.base_counts
+            arrays[f"{mate}_quality_counts"] = read_stats.quality_counts
+            arrays[f"{mate}_length_counts"] = read_stats.length_counts
+        arrays["counts"] = np.array(json.dumps(self.counts))
+        with open(path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "DatasetStats":
+        stats = cls()
+        with np.load(path) as data:
+            for mate, read_stats in stats.mates.items():
+                read_stats.base_counts = data[f"{mate}_base_counts"]
+                read_stats.quality_counts = data[f"{mate}_quality_counts"]
+                read_stats.length_counts = data[f"{mate}_length_counts"]
+            stats.counts = json.loads(str(data["counts"]))
+        return stats
@@ -9,6 +9,45 @@ class Config:
     TRAIN_DATA_PERCENTAGE: int
     KEEP_CORRECT_TRAIN_PAIR: float  # decimal
     KEEP_CORRECT_TEST_PAIR: float
+    FILTER_READS: bool
+    FILTER_MIN_LENGTH: int
+    FILTER_MAX_N_FRACTION: float
+    FILTER_MIN_MEAN_QUALITY: float
+    FILTER_MIN_PERCENTILE_QUALITY: float
+    FILTER_QUALITY_PERCENTILE: float
+    KMER_EXPORT: bool
+    KMER_SIZE: int
+    KMER_STRIDE: int
+    KMER_ONLY: bool
+    DEDUP_MODE: str
+    DEDUP_PREFIX_LENGTH: int
+    DEDUP_EXPECTED_PAIRS: int
+    DEDUP_FALSE_POSITIVE_RATE: float
+    OUTPUT_LAYOUT: str
+    SUBSAMPLE_STRATEGY: str
+    SUBSAMPLE_FRACTION: float
+    SUBSAMPLE_READS: int
+    SUBSAMPLE_SEED: int
+    AUGMENT_REVERSE_COMPLEMENT: bool
+    AUGMENT_SUBSTITUTION_RATE: float
+    AUGMENT_SEED: int
+    CONTACT_RESOLUTIONS: str
+    MAX_MEMORY: str
+    STAGE_WORKERS: int
+    STAGE_EXECUTOR: str
+    ENCODER_WORKERS: int
+    WRITE_STATS: bool
+    WRITE_NAME_INDEX: bool
+    OUTPUT_COMPRESSION: str
+    OUTPUT_FRAME_READS: int
+    OUTPUT_COMPRESSION_LEVEL: int
+    PROFILE_MODE: str
+    PROFILE_MEMORY: bool
+    PROFILE_DIR: str
+    PROGRESS_INTERVAL: float
+    PROGRESS_TEXTFILE: str
+    PROGRESS_LOG: bool
+    CHECKPOINT_INTERVAL: float
     LOG_CONFIG: dict
 
     def __init__(self, **kwargs):
@@ -0,0 +1,214 @@
+import os
+from dataclasses import dataclass
+
+import numpy as np
+
+from . import common, log
+from .planner import estimate_record_count
+from .profiler import profiler
+
+SUBSAMPLE_STRATEGIES: tuple[str, ...] = ("bernoulli", "reservoir", "offset")
+RESYNC_LINES: int = 8  # a record starts within the first 4 full lines after any offset, with margin
+MATE_SEARCH_RECORDS: int = 2  # first mate search window, records of the size of the R1 record on each side
+OFFSET_DRAW_ROUNDS: int = 8
+
+
+@dataclass(slots=True)
+class Subsampler:
+    """
+    Random subset of the read pairs.
+    - bernoulli: every pair is kept with probability fraction, during the streaming selection pass
+    - reservoir: exactly reads pairs (or all when there are fewer), during the streaming selection pass
+    - offset: reads pairs (or fraction of the estimated number of pairs) read at random byte offsets,
+      the files are not read as a whole. Records are drawn proportionally to their size in bytes.
+    """
+
+    strategy: str
+    fraction: float = 0.0
+    reads: int = 0
+    seed: int = 0
+
+    def __post_init__(self):
+        if self.strategy not in SUBSAMPLE_STRATEGIES:
+            raise ValueError(f"Unknown subsample strategy {self.strategy}, expected one of {SUBSAMPLE_STRATEGIES}")
+        if not (0 <= self.fraction <= 1):
+            raise ValueError("Subsample fraction must be between 0 and 1")
+        if self.strategy == "bernoulli" and not self.fraction:
+            raise ValueError("bernoulli subsampling needs a fraction")
+        if self.strategy == "reservoir" and self.reads <= 0:
+            raise ValueError("reservoir subsampling needs a number of reads")
+        if self.strategy == "offset" and self.reads <= 0 and not self.fraction:
+            raise ValueError("offset subsampling needs a number of reads or a fraction")
+
+    def is_streaming(self) -> bool:
+        return self.strategy != "offset"
+
+    def streaming_sampler(self) -> "BernoulliSampler | ReservoirSampler":
+        rng = np.random.default_rng(self.seed)
+        if self.strategy == "bernoulli":
+            return BernoulliSampler(self.fraction, rng)
+        if self.strategy == "reservoir":
+            return ReservoirSampler(self.reads, rng)
+        raise ValueError(f"{self.strategy} subsampling is not done in the streaming pass")
+
+
+class BernoulliSampler:
+    def __init__(self, fraction: float, rng: np.random.Generator):
+        self.fraction = fraction
+        self.rng = rng
+
+    def sample(self, keep: np.ndarray, start: int) -> np.ndarray:
+        """Keep mask of one batch, start is the position of its first pair."""
+        return keep & (self.rng.random(len(keep)) < self.fraction)
+
+    def finish(self, keep_mask: np.ndarray) -> np.ndarray:
+        return keep_mask
+
+
+class ReservoirSampler:
+    """
+    Uniform sample of a fixed number of candidates: every candidate gets a random key and the smallest keys are kept.
+    Only the current sample is held in memory.
+    """
+
+    def __init__(self, reads: int, rng: np.random.Generator):
+        self.reads = reads
+        self.rng = rng
+        self.keys = np.zeros(0, dtype=np.float64)
+        self.positions = np.zeros(0, dtype=np.int64)
+
+    def sample(self, keep: np.ndarray, start: int) -> np.ndarray:
+        self.keys = np.concatenate([self.keys, self.rng.random(int(keep.sum()))])
+        self.positions = np.concatenate([self.positions, start + np.flatnonzero(keep)])
+        if len(self.keys) > self.reads:
+            smallest = np.argpartition(self.keys, self.reads)[: self.reads]
+            self.keys, self.positions = self.keys[smallest], self.positions[smallest]
+        return keep
+
+    def finish(self, keep_mask: np.ndarray) -> np.ndarray:
+        """Final keep mask, only pairs of the sample are kept."""
+        sampled = np.zeros(len(keep_mask), dtype=bool)
+        sampled[self.positions] = True
+        return sampled
+
+
+def mate_name(header_line: bytes) -> bytes:
+    """Read name of a FASTQ header line without '@' and without the /1 or /2 mate suffix."""
+    name = header_line.split()[0][1:]
+    if name[-2:] in (b"/1", b"/2"):
+        name = name[:-2]
+    return name
+
+
+def is_record(lines: list[bytes]) -> bool:
+    return (
+        len(lines) == 4
+        and lines[0].startswith(b"@")
+        and lines[2].startswith(b"+")
+        and len(lines[1].rstrip(b"\r\n")) == len(lines[3].rstrip(b"\r\n"))
+    )
+
+
+def resync_record(fastq_file, offset: int) -> int | None:
+    """
+    Offset of the first record starting after a byte offset. Quality lines can start with '@' as well,
+    a line is only taken as a header when the 4 lines from it have the shape of a record.
+
+    :return: Offset of the record, None when there is no record after the offset.
+    """
+    fastq_file.seek(offset)
+    if offset > 0:
+        offset += len(fastq_file.readline())  # partial line
+    lines: list[bytes] = [fastq_file.readline() for _ in range(RESYNC_LINES + 3)]
+    for i in range(RESYNC_LINES):
+        if is_record(lines[i : i + 4]):
+            return offset
+        offset += len(lines[i])
+    return None
+
+
+def read_record_at(fastq_file, offset: int) -> list[bytes]:
+    """The 4 lines of the record at offset, each ending with a newline."""
+    fastq_file.seek(offset)
+    lines: list[bytes] = [fastq_file.readline() for _ in range(4)]
+    return [line if line.endswith(b"\n") else line + b"\n" for line in lines]
+
+
+def find_mate(fastq_file, name: bytes, estimate: int, file_size: int, radius: int) -> list[bytes]:
+    """
+    The record named name, searched in windows around the estimated offset. The first window reaches radius bytes
+    to each side, it grows 4 times until the record is found. Only the bytes of the windows are read.
+
+    :raise ValueError: When the file has no record with that name.
+    """
+    while True:
+        start, end = max(estimate - radius, 0), min(estimate + radius, file_size)
+        # the window starts with the newline before start, a record at start is found too
+        if start:
+            window: bytes = os.pread(fastq_file.fileno(), end - start + 1, start - 1)
+        else:
+            window = b"\n" + os.pread(fastq_file.fileno(), end, 0)
+        found: int = window.find(b"\n@" + name)
+        while found != -1:
+            lines: list[bytes] = window[found + 1 :].split(b"\n", 4)
+            if len(lines) == 5:
+                record: list[bytes] = [line + b"\n" for line in lines[:4]]
+            else:  # the record ends after the window
+                record = read_record_at(fastq_file, start + found)
+            if is_record(record) and mate_name(record[0]) == name:
+                return record
+            found = window.find(b"\n@" + name, found + 1)
+        if start == 0 and end == file_size:
+            raise ValueError(f"Mate of {name.decode()} not found in {fastq_file.name}")
+        radius *= 4
+
+
+@profiler
+def subsample_by_offset(
+    fastq_r1_path: str, fastq_r2_path: str, output_dir: str, subsampler: Subsampler
+) -> tuple[str, str]:
+    """
+    Write a sample of read pairs read at random byte offsets, without reading the input files as a whole.
+    Offsets of R1 are resynchronized to the next record, the mate is looked up by name in R2
+    around the proportional offset. The sample is written in input order.
+
+    :param fastq_r1_path: Path to the R1 FASTQ file.
+    :param fastq_r2_path: Path to the R2 FASTQ file.
+    :param output_dir: Directory of the sampled FASTQ files.
+    :param subsampler: Subsampler with the offset strategy.
+    :return: Paths to the sampled R1 and R2 files.
+    """
+    r1_size, r2_size = os.path.getsize(fastq_r1_path), os.path.getsize(fastq_r2_path)
+    wanted: int = subsampler.reads or max(int(round(subsampler.fraction * estimate_record_count(fastq_r1_path))), 1)
+    rng = np.random.default_rng(subsampler.seed)
+
+    offsets: set[int] = set()
+    with open(fastq_r1_path, "rb") as r1_file:
+        # offsets resyncing to an already drawn record are drawn again, the sample is without replacement
+        for _ in range(OFFSET_DRAW_ROUNDS):
+            for offset in rng.integers(0, r1_size, size=wanted - len(offsets)):
+                record_offset = resync_record(r1_file, int(offset))
+                if record_offset is not None:
+                    offsets.add(record_offset)
+            if len(offsets) >= wanted:
+                break
+    if len(offsets) < wanted:
+        log.warning(f"offset subsampling found {len(offsets)} of {wanted} pairs, the input is smaller than the sample")
+
+    common.create_dir(output_dir)
+    output_r1_path: str = f"{output_dir}/{os.path.basename(fastq_r1_path)}"
+    output_r2_path: str = f"{output_dir}/{os.path.basename(fastq_r2_path)}"
+    with (
+        open(fastq_r1_path, "rb") as r1_file,
+        open(fastq_r2_path, "rb") as r2_file,
+        open(output_r1_path, "wb") as output_r1,
+        open(output_r2_path, "wb") as output_r2,
+    ):
+        for offset in sorted(offsets):
+            record_r1 = read_record_at(r1_file, offset)
+            radius: int = MATE_SEARCH_RECORDS * sum(map(len, record_r1))
+            record_r2 = find_mate(r2_file, mate_name(record_r1[0]), offset * r2_size // r1_size, r2_size, radius)
+            output_r1.writelines(record_r1)
+            output_r2.writelines(record_r2)
+    log.info(f"offset subsampling wrote {len(offsets)} pairs to {output_dir}")
+    return output_r1_path, output_r2_path
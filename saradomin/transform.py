@@ -1,30 +1,66 @@
 import os, shutil
-import ast
 import random
-import tempfile
+from collections import deque
+from dataclasses import asdict
 from datetime import datetime
+from typing import Iterable
+
+import numpy as np
 
 from . import common
+from .augment import Augmenter, AugmentedCopy
+from .checkpoint import FastqCheckpoint, checkpoint_key, derived_fastq_source, open_checkpoint, remove_checkpoint
+from .contacts import CONTACTS_DIR_NAME, build_contact_matrices
+from .dedup import PairDeduplicator
+from .fastq import FastqBatch, LineRange, iter_fastq_batches, open_fastq
+from .filter import ReadFilter
+from .interleave import FILE_PAIRS_NAME, OUTPUT_LAYOUTS, interleave_pairs
+from .kmer import KmerTokenizer
+from .manifest import input_entry, new_manifest, write_manifest
+from .names import write_fastq_name_index, write_name_index
+from .planner import (
+    MemoryPlanner,
+    DICT_ENTRY_OVERHEAD,
+    KEEP_MASK_ENTRY_SIZE,
+    estimate_range_record_count,
+    estimate_record_count,
+)
 from .profiler import profiler
+from .progress import track
+from .scheduler import StageGraph
+from .selection import select_pairs
+from .shm import SharedMemoryEncoder
+from .stats import DatasetStats, ReadStats
+from .subsample import Subsampler, subsample_by_offset
 from . import log
 
 __all__ = ["transform_data_to_vectors"]
 
+FILE_R1_NAME: str = "READ_1.txt"
+FILE_R2_NAME: str = "READ_2.txt"
+
 
 def create_file_header(
     path_to_file: str,
     read_vector_schema: list[str],
     version: list[int],
+    kmer_tokenizer: KmerTokenizer | None = None,
+    augmenter: Augmenter | None = None,
 ) -> None:
     mapping = {"A": 0, "C": 1, "G": 2, "T": 3, "N": 4}
+    rows: str = "\t".join(f"{i}.row {name}" for i, name in enumerate(["UID", *read_vector_schema], start=1))
     header_: str = (
         "#HEADER#\n"
         f"#DATE={datetime.utcnow().isoformat()}\n"
         f"#pre_processing_version={version}\n"
         f"#mapping: {mapping}\n"
-        f"#schema=1.row UID\t2.row {read_vector_schema[0]}\t3.row {read_vector_schema[1]} \n"
-        "####END####\n"
+        f"#schema={rows} \n"
     )
+    if kmer_tokenizer is not None:
+        header_ += f"#kmer_vocabulary: {kmer_tokenizer.vocabulary()}\n"
+    if augmenter is not None:
+        header_ += f"#augmentation: {asdict(augmenter)}\n"
+    header_ += "####END####\n"
     with open(path_to_file, "w") as f:
         f.write(header_)
 
@@ -44,7 +80,21 @@ def convert_ascii_score_to_int(quality_string: str) -> list[int]:
 
 
 @profiler
-def save_fastq(fastq_read_path: str, output_file_path: str, read_id_counter: dict[str, int]) -> None:
+def save_fastq(
+    fastq_read_path: str,
+    output_file_path: str,
+    read_id_counter: dict[str, int] | None,
+    keep_mask: np.ndarray | None = None,
+    read_vector_schema: list[str] | None = None,
+    kmer_tokenizer: KmerTokenizer | None = None,
+    read_stats: ReadStats | None = None,
+    byte_range: tuple[int, int] | None = None,
+    uid_start: int = 0,
+    batch_size: int = 65536,
+    encoder_workers: int = 0,
+    augmenter: Augmenter | None = None,
+    checkpoint: FastqCheckpoint | None = None,
+) -> int:
     """
     Saves a modified FASTQ read to a specified output file.
     The saved values looks like this:
@@ -54,74 +104,223 @@ def save_fastq(fastq_read_path: str, output_file_path: str, read_id_counter: dic
     :param fastq_read_path: Path to the input FASTQ file from which reads are processed.
     :param output_file_path: Path to the output file where processed reads are to be saved.
     :param read_id_counter: A dictionary mapping read identifiers to their new occurrence count after processing.
-    :return: None. Outputs are written directly to the specified file.
+    None gives the kept reads consecutive UIDs by position, the n-th kept R2 read gets the UID of the n-th kept R1 read.
+    :param keep_mask: Optional boolean mask indexed by the position of the read in the FASTQ file.
+    Reads with False are skipped and get no UID.
+    :param read_vector_schema: Rows written after the UID, default NUCLEOTIDE and SCORE.
+    :param kmer_tokenizer: Tokenizer of the KMER row, required when KMER is in the schema.
+    :param read_stats: Optional statistics accumulators, updated with every kept read.
+    :param byte_range: Optional byte range of the FASTQ file to process, keep_mask is indexed from its start.
+    :param uid_start: UID of the first new read.
+    :param batch_size: Number of reads processed at once.
+    :param encoder_workers: Number of processes rendering the NUCLEOTIDE and SCORE rows, 0 renders them inline.
+    :param augmenter: Optional augmentation, tagged copies are written after every kept read.
+    :param checkpoint: Optional checkpoint saved every CHECKPOINT_INTERVAL seconds, a resumed one continues
+    at its input offset, see checkpoint.open_checkpoint.
+    :return: UID after the last new read. Outputs are written directly to the specified file.
+    """
+    if read_vector_schema is None:
+        read_vector_schema = ["NUCLEOTIDE", "SCORE"]
+    if encoder_workers > 0:
+        return save_fastq_shared(
+            fastq_read_path,
+            output_file_path,
+            read_id_counter,
+            keep_mask,
+            read_vector_schema,
+            kmer_tokenizer,
+            read_stats,
+            byte_range,
+            uid_start,
+            batch_size,
+            encoder_workers,
+            augmenter,
+            checkpoint,
+        )
+    uid_counter: int = uid_start
+    position: int = 0
+    if checkpoint is not None:
+        byte_range = checkpoint.begin(fastq_read_path, keep_mask, read_id_counter, read_stats, batch_size)
+        if checkpoint.done:
+            return checkpoint.uid_counter
+        position, uid_counter, batch_size = checkpoint.position, checkpoint.uid_counter, checkpoint.batch_size
+    total_reads: int = estimate_range_record_count(fastq_read_path, byte_range)
+    with (
+        open_fastq(fastq_read_path, byte_range) as fastq_file,
+        open(output_file_path, "a") as output_file,
+        track(
+            "save_fastq",
+            os.path.basename(fastq_read_path),
+            total_reads,
+            file=fastq_file if byte_range is None else None,
+        ) as progress,
+    ):
+        for batch in iter_fastq_batches(fastq_file, batch_size):
+            if read_stats is not None:
+                read_stats.add_batch(batch, None if keep_mask is None else keep_mask[position : position + len(batch)])
+            tokens: list[np.ndarray] | None = None
+            if "KMER" in read_vector_schema:
+                tokens = kmer_tokenizer.tokenize_batch(batch.sequences)
+            copies: list[AugmentedCopy] = augment_batch(
+                augmenter, batch, fastq_read_path, uid_start + position, read_vector_schema, kmer_tokenizer
+            )
+
+            for i, (read_id, sequence_line, quality_line) in enumerate(
+                zip(batch.read_ids, batch.sequences, batch.qualities)
+            ):
+                if keep_mask is not None and not keep_mask[position + i]:
+                    continue
+                if read_id_counter is None:
+                    uid: int = uid_counter
+                    uid_counter += 1
+                else:
+                    if read_id not in read_id_counter:
+                        read_id_counter[read_id] = uid_counter
+                        uid_counter += 1
+                    uid = read_id_counter[read_id]
+
+                output_file.write(f"{uid}\n")
+                for row in read_vector_schema:
+                    if row == "NUCLEOTIDE":
+                        # encode the entire sequence
+                        output_file.write(f"{str(encode_sequence(sequence_line))}\n")
+                    elif row == "SCORE":
+                        output_file.write(f"{str(convert_ascii_score_to_int(quality_line))}\n")
+                    elif row == "KMER":
+                        output_file.write(f"{str(tokens[i].tolist())}\n")
+                for augmented in copies:
+                    output_file.write(augmented.record(uid, i, read_vector_schema))
+            position += len(batch)
+            progress.add(len(batch))
+            if checkpoint is not None and checkpoint.due():
+                checkpoint.save(output_file, fastq_file.offset, position, uid_counter, read_stats)
+        if checkpoint is not None:
+            checkpoint.done = True
+            checkpoint.save(output_file, fastq_file.offset, position, uid_counter, read_stats)
+    return uid_counter
+
+
+def save_fastq_shared(
+    fastq_read_path: str,
+    output_file_path: str,
+    read_id_counter: dict[str, int] | None,
+    keep_mask: np.ndarray | None,
+    read_vector_schema: list[str],
+    kmer_tokenizer: KmerTokenizer | None,
+    read_stats: ReadStats | None,
+    byte_range: tuple[int, int] | None,
+    uid_start: int,
+    batch_size: int,
+    encoder_workers: int,
+    augmenter: Augmenter | None = None,
+    checkpoint: FastqCheckpoint | None = None,
+) -> int:
+    """
+    save_fastq with the NUCLEOTIDE and SCORE rows rendered by encoder processes.
+    The rows are written straight from the shared memory slots, see shm.SharedMemoryEncoder.
     """
-    uid_counter: int = 0
-    with open(fastq_read_path, "r") as fastq_file, open(output_file_path, "a") as output_file:
-        for line in fastq_file:
-            if line.startswith("@"):
-                read_id = line.split()[0][1:]  # Remove the '@' character
-                sequence_line = next(fastq_file).strip()  # Nucleotide sequence
-                next(fastq_file)  # Skip the '+' line
-                quality_line = next(fastq_file).strip()  # PHRED quality scores
-
-                if read_id not in read_id_counter:
-                    read_id_counter[read_id] = uid_counter
+    uid_counter: int = uid_start
+    position: int = 0
+    if checkpoint is not None:
+        byte_range = checkpoint.begin(fastq_read_path, keep_mask, read_id_counter, read_stats, batch_size)
+        if checkpoint.done:
+            return checkpoint.uid_counter
+        position, uid_counter, batch_size = checkpoint.position, checkpoint.uid_counter, checkpoint.batch_size
+    batch_ends: deque[int] = deque()  # input offsets after the batches handed to the encoders
+    total_reads: int = estimate_range_record_count(fastq_read_path, byte_range)
+    with (
+        open_fastq(fastq_read_path, byte_range) as fastq_file,
+        open(output_file_path, "ab") as output_file,
+        SharedMemoryEncoder(encoder_workers) as encoder,
+        track(
+            "save_fastq",
+            os.path.basename(fastq_read_path),
+            total_reads,
+            file=fastq_file if byte_range is None else None,
+        ) as progress,
+    ):
+        batches: Iterable[FastqBatch] = iter_fastq_batches(fastq_file, batch_size)
+        if checkpoint is not None:
+            batches = iter_with_batch_ends(batches, fastq_file, batch_ends)
+        for batch, encoded in encoder.imap(batches):
+            if read_stats is not None:
+                read_stats.add_batch(batch, None if keep_mask is None else keep_mask[position : position + len(batch)])
+            tokens: list[np.ndarray] | None = None
+            if "KMER" in read_vector_schema:
+                tokens = kmer_tokenizer.tokenize_batch(batch.sequences)
+            copies: list[AugmentedCopy] = augment_batch(
+                augmenter, batch, fastq_read_path, uid_start + position, read_vector_schema, kmer_tokenizer
+            )
+
+            for i, read_id in enumerate(batch.read_ids):
+                if keep_mask is not None and not keep_mask[position + i]:
+                    continue
+                if read_id_counter is None:
+                    uid: int = uid_counter
                     uid_counter += 1
-                # encode the entire sequence
-                encoded_sequence = encode_sequence(sequence_line)
-                score: list[int] = convert_ascii_score_to_int(quality_line)
-
-                output_file.write(f"{read_id_counter[read_id]}\n")
-                output_file.write(f"{str(encoded_sequence)}\n")
-                output_file.write(f"{str(score)}\n")
-
-
-def insert_valid_pair(line_vector: list, valid_pair_pos: int, genomic_distance_pos: int, genomic_distance: int) -> None:
-    line_vector[valid_pair_pos] = 1
-    line_vector[genomic_distance_pos] = genomic_distance
-
-
-def insert_all_valid_pairs(
-    hic_pro_valid_pairs_path: str, output_file_path: str, read_vector_schema: str, read_id_counter: dict[str, int]
-) -> None:  # TODO Profile this function is slow
-    valid_pairs_dict: dict[str, dict] = {}
-    with open(hic_pro_valid_pairs_path, "r") as valid_pairs_file:
-        for line in valid_pairs_file:
-            columns = line.strip().split("\t")
-
-            read_id: str = columns[0]
-            genomic_distance = columns[-5]  # Fifth element from the end
-            valid_pairs_dict[read_id] = {"genomic_distance": genomic_distance}
-
-    uid_index_from_end: int = common.get_position_feature(read_vector_schema, "UID")
-    genomic_distance_index_from_end: int = common.get_position_feature(read_vector_schema, "GENOMIC_DISTANCE")
-    valid_pair_index_from_end: int = common.get_position_feature(read_vector_schema, "VALID_PAIR")
-    temp_file_path: str = output_file_path + ".tmp"
-    with open(output_file_path, "r") as o_file, open(temp_file_path, "w") as temp_file:
-        for line in o_file:
-            if line.startswith("#"):
-                temp_file.write(line)
-                continue
-            line_list = ast.literal_eval(line)
-            uid: int = int(line_list[len(line_list) - 1 - uid_index_from_end])
-
-            uid_str: str = common.get_key_from_value(read_id_counter, uid)
-            if uid_str in valid_pairs_dict:
-                insert_valid_pair(
-                    line_list,
-                    (len(line_list) - 1) - valid_pair_index_from_end,
-                    (len(line_list) - 1) - genomic_distance_index_from_end,
-                    valid_pairs_dict[uid_str]["genomic_distance"],
-                )
-            temp_file.write(str(line_list) + "\n")
-
-    os.replace(temp_file_path, output_file_path)
+                else:
+                    if read_id not in read_id_counter:
+                        read_id_counter[read_id] = uid_counter
+                        uid_counter += 1
+                    uid = read_id_counter[read_id]
+
+                output_file.write(f"{uid}\n".encode("ascii"))
+                for row in read_vector_schema:
+                    if row == "NUCLEOTIDE":
+                        output_file.write(encoded.nucleotide_row(i))
+                    elif row == "SCORE":
+                        output_file.write(encoded.score_row(i))
+                    elif row == "KMER":
+                        output_file.write(f"{str(tokens[i].tolist())}\n".encode("ascii"))
+                for augmented in copies:
+                    output_file.write(augmented.record(uid, i, read_vector_schema).encode("ascii"))
+            position += len(batch)
+            progress.add(len(batch))
+            if checkpoint is not None:
+                batch_end: int = batch_ends.popleft()
+                if checkpoint.due():
+                    checkpoint.save(output_file, batch_end, position, uid_counter, read_stats)
+        if checkpoint is not None:
+            checkpoint.done = True
+            checkpoint.save(output_file, fastq_file.offset, position, uid_counter, read_stats)
+    return uid_counter
+
+
+def iter_with_batch_ends(
+    batches: Iterable[FastqBatch], fastq_file: LineRange, batch_ends: deque[int]
+) -> Iterable[FastqBatch]:
+    """Pass the batches through, noting the input offset after each one, the encoders read ahead of the output."""
+    for batch in batches:
+        batch_ends.append(fastq_file.offset)
+        yield batch
+
+
+def augment_batch(
+    augmenter: Augmenter | None,
+    batch: FastqBatch,
+    fastq_read_path: str,
+    batch_start: int,
+    read_vector_schema: list[str],
+    kmer_tokenizer: KmerTokenizer | None,
+) -> list[AugmentedCopy]:
+    """Augmented copies of a batch, none without an active augmenter."""
+    if augmenter is None or not augmenter.is_active():
+        return []
+    return augmenter.augment_batch(
+        batch,
+        augmenter.batch_rng(fastq_read_path, batch_start),
+        kmer_tokenizer if "KMER" in read_vector_schema else None,
+    )
 
 
 @profiler
 def split_file(
-    original_file: str, new_file: str, train_data_percentage: float, training_id_counter: [str, int]
+    original_file: str,
+    new_file: str,
+    train_data_percentage: float,
+    training_uids: np.ndarray,
+    lines_per_read: int = 3,
+    spill_dir: str | None = None,
 ) -> None:
     """
     Split file into training and testing data. The data are split based on  number of reads.
@@ -130,104 +329,77 @@ def split_file(
     :param original_file:
     :param new_file: (testing file)
     :param train_data_percentage:
+    :param training_uids: UIDs of the training reads.
+    :param lines_per_read: Number of lines of one read, UID line included.
+    Augmented copies (UID line with a tag) stay in the training file with their read and are dropped from the test file.
+    :param spill_dir: Optional directory of the external split, the record index and the selected records are
+    memory-mapped from it. Removed afterwards.
     :return: None, create new testing file
     """
     log.debug(f"splitting {original_file}, train_data_percentage {train_data_percentage}")
-    header_lines: list[str] = []
-
-    # Read the original file to extract header lines and determine the split index
-    with open(original_file, "r") as file:
-        for line in file:
-            if line.startswith("####END####"):
-                header_lines.append(line)
-                break
-            header_lines.append(line)
-
-    # Use a temporary file to store the first part
-    temp_file = original_file + ".tmp"
-
-    # Process the original file line by line, preserving headers in both files
-    with open(original_file, "r") as file, open(temp_file, "w") as temp, open(new_file, "w") as new_f:
-        # Write header lines to both files
-        for header in header_lines:
-            temp.write(header)
-            new_f.write(header)
-
-        # Skip header lines already read
-        _ = [next(file) for _ in range(len(header_lines))]
-
-        # Split the remaining lines between the original (temp) and new file
-        it = iter(enumerate(file, start=len(header_lines)))
-        for i, line in it:
-            if int(line.strip()) in training_id_counter.values():
-                # Write the current and the next two lines to temp
-                temp.write(line)
-                temp.write(next(it)[1])  # Write next line
-                temp.write(next(it)[1])  # Write the line after next
-            else:
-                new_f.write(line)
-                new_f.write(next(it)[1])  # Write next line
-                new_f.write(next(it)[1])  # Write the line after next
-
-    # Replace the original file with the temporary file containing the first part
-    shutil.move(temp_file, original_file)
+    if spill_dir is not None:
+        common.create_dir(spill_dir)
+    try:
+        index: common.RecordIndex = common.index_records(
+            original_file, lines_per_read, with_uids=True, spill_dir=spill_dir
+        )
+        training_uids = np.sort(np.asarray(training_uids, dtype=np.int64))
+        in_train: np.ndarray = common.find_records(
+            index, lambda uids, tagged: np.isin(uids, training_uids), f"{spill_dir}/train.bin" if spill_dir else None
+        )
+        # augmented copies of test reads are dropped, test data stays as sequenced
+        in_test: np.ndarray = common.find_records(
+            index,
+            lambda uids, tagged: ~np.isin(uids, training_uids) & (tagged == 0),
+            f"{spill_dir}/test.bin" if spill_dir else None,
+        )
+
+        # Records are range copies of the original file, the header is kept in both files
+        temp_file = original_file + ".tmp"
+        for path, selected in ((temp_file, in_train), (new_file, in_test)):
+            common.write_records_in_order(original_file, path, index, selected)
+
+        # Replace the original file with the temporary file containing the first part
+        os.replace(temp_file, original_file)
+    finally:
+        if spill_dir is not None and os.path.exists(spill_dir):
+            shutil.rmtree(spill_dir)
 
 
 @profiler
-def shuffle_data_in_file(file_path: str, right_pair_percentage: float):
-    index_file = file_path + ".idx"
-    temp_file = file_path + ".tmp"
-
+def shuffle_data_in_file(file_path: str, right_pair_percentage: float, lines_per_read: int = 3):
     # Indexing Phase
-    with open(file_path, "r") as file, open(index_file, "w") as idx:
-        pos = file.tell()
-        line = file.readline()
-        while line:
-            if not line.startswith("#") and not line.startswith("####END####"):
-                idx.write(f"{pos}\n")
-                file.readline()  # Skip next 2 lines belonging to the same block
-                file.readline()
-            pos = file.tell()
-            line = file.readline()
+    index: common.RecordIndex = common.index_records(file_path, lines_per_read)
 
     # Shuffling Phase with right_pair_percentage consideration
-    with open(index_file, "r") as idx:
-        indices = idx.readlines()
-        # Calculate the cutoff for the number of triads to remain in place
-        cutoff = int(len(indices) * right_pair_percentage)
-        # Separate the indices to shuffle and to keep
-        to_keep = indices[:cutoff]
-        to_shuffle = indices[cutoff:]
-        random.shuffle(to_shuffle)
-        # Combine back, keeping the specified percentage in original position
-        indices = to_keep + to_shuffle
-
-    # Reconstruction Phase
-    with open(file_path, "r") as file, open(temp_file, "w") as out:
-        # Write the header
-        for line in file:
-            if not line.startswith("#"):
-                break
-            out.write(line)
-
-        # Write the data blocks based on the adjusted indices
-        for index in indices:
-            file.seek(int(index))
-            for _ in range(3):  # Write each block of 3 lines
-                out.write(file.readline())
-
-    # Replace the original file with the shuffled data
-    shutil.move(temp_file, file_path)
-    os.remove(index_file)  # Clean up the index file
+    indices: list[int] = list(range(len(index)))
+    # Calculate the cutoff for the number of records to remain in place
+    cutoff = int(len(indices) * right_pair_percentage)
+    to_shuffle = indices[cutoff:]
+    random.shuffle(to_shuffle)
+    order = np.array(indices[:cutoff] + to_shuffle, dtype=np.int64)
+
+    # Reconstruction Phase, records are copied by offset
+    temp_file = file_path + ".tmp"
+    common.write_records_in_order(file_path, temp_file, index, order)
+    os.replace(temp_file, file_path)
 
 
 def transform_one_read(
     fastq_read_path: str,
     output_file_path: str,
     read_vector_schema: list[str],
-    read_id_counter: dict[str, int],
+    read_id_counter: dict[str, int] | None,
     version: list[int],
-) -> None:
+    keep_mask: np.ndarray | None = None,
+    kmer_tokenizer: KmerTokenizer | None = None,
+    read_stats: ReadStats | None = None,
+    byte_range: tuple[int, int] | None = None,
+    uid_start: int = 0,
+    encoder_workers: int = 0,
+    augmenter: Augmenter | None = None,
+    source: dict | None = None,
+) -> int:
     """
     Processes a single FASTQ read, transforming it according to a specified schema, and writes the output to a file.
     It updates the read_id_counter dictionary to keep track of read identifiers.
@@ -236,132 +408,201 @@ def transform_one_read(
     :param output_file_path: Path to the file where the transformed read output will be written.
     :param read_vector_schema: A list of strings defining the schema for each read.
     :param read_id_counter: A dictionary mapping read identifiers to their occurrence count,
-    used to track how many times each read is processed.
+    used to track how many times each read is processed. None gives the reads UIDs by position, see save_fastq.
     :param version: A list of integers specifying the version of script.
-    :return: None. The function writes the processed read directly to the output file path specified.
-    """
-    common.create_file_if_not_exists(output_file_path)
-    create_file_header(output_file_path, read_vector_schema, version)
-    save_fastq(fastq_read_path, output_file_path, read_id_counter)
-
-
-def shuffle_triples_in_file(file_path: str):
-    """
-    Shuffle triples in a file and overwrite the original file with the shuffled data.
-
-    Parameters:
-    - file_path: Path to the file whose triples are to be shuffled.
+    :param keep_mask: Optional boolean mask of reads to keep, see select_pairs.
+    :param kmer_tokenizer: Tokenizer of the KMER row, its vocabulary is recorded in the header.
+    :param read_stats: Optional statistics accumulators of the read.
+    :param byte_range: Optional byte range of the FASTQ file to process.
+    :param uid_start: UID of the first new read.
+    :param encoder_workers: Number of processes rendering the rows, see save_fastq.
+    :param augmenter: Optional augmentation of the reads, recorded in the header.
+    :param source: Source of a FASTQ file the run writes itself, keys the checkpoint, see checkpoint.checkpoint_key.
+    :return: UID after the last new read. The function writes the processed read directly to the output file path.
     """
-    triples = []
+    key: dict = checkpoint_key(
+        fastq_read_path, byte_range, uid_start, read_vector_schema, keep_mask, augmenter, kmer_tokenizer, source
+    )
+    checkpoint: FastqCheckpoint | None = open_checkpoint(output_file_path, key)
+    if checkpoint is None or not checkpoint.resumed:
+        common.create_file_if_not_exists(output_file_path)
+        create_file_header(output_file_path, read_vector_schema, version, kmer_tokenizer, augmenter)
+    return save_fastq(
+        fastq_read_path,
+        output_file_path,
+        read_id_counter,
+        keep_mask,
+        read_vector_schema,
+        kmer_tokenizer,
+        read_stats,
+        byte_range,
+        uid_start,
+        encoder_workers=encoder_workers,
+        augmenter=augmenter,
+        checkpoint=checkpoint,
+    )
 
-    # Read the file and group lines into triples
-    with open(file_path, "r") as file:
-        triple = []
-        for line in file:
-            triple.append(line)
-            if len(triple) == 3:  # Check if the triple is complete
-                triples.append(triple)
-                triple = []
 
-        # Handle case where the last group might not be a complete triple
-        if triple:
-            triples.append(triple)
+def select_pairs_working_set(fastq_r1_path: str, deduplicator: PairDeduplicator | None) -> int:
+    """Bytes of the keep mask of the pairs and of the deduplicator table, select_pairs has no external algorithm."""
+    working_set: int = estimate_record_count(fastq_r1_path) * KEEP_MASK_ENTRY_SIZE
+    return working_set + (deduplicator.memory_size() if deduplicator is not None else 0)
 
-    # Shuffle the triples
-    random.shuffle(triples)
 
-    # Overwrite the original file with shuffled triples
-    with open(file_path, "w") as file:
-        for triple in triples:
-            for line in triple:
-                file.write(line)
+def build_read_vector_schema(kmer_tokenizer: KmerTokenizer | None = None, kmer_only: bool = False) -> list[str]:
+    """Rows written for every read after the UID."""
+    if kmer_tokenizer is None:
+        return ["NUCLEOTIDE", "SCORE"]
+    return ["KMER", "SCORE"] if kmer_only else ["NUCLEOTIDE", "SCORE", "KMER"]
 
 
-def shuffle_triples_in_file_keep_header(file_path: str):
+def split_and_disrupt(
+    output_dir: str,
+    uids: np.ndarray | list[int],
+    train_data_fraction: float,
+    keep_correct_train_pair: float,
+    keep_correct_test_pair: float,
+    lines_per_read: int = 3,
+    planner: MemoryPlanner | None = None,
+    max_workers: int = 1,
+    executor: str = "thread",
+    read_vector_schema: list[str] | None = None,
+    output_layout: str = "separate",
+) -> dict[str, int]:
     """
-    Shuffle triples in a file, keeping header lines intact at the beginning, and overwrite the original file with the shuffled data.
-
-    Parameters:
-    - file_path: Path to the file whose triples are to be shuffled.
+    Split the encoded READ_1.txt and READ_2.txt in output_dir/train into train and test data
+    and disrupt the pairs by shuffling the selected R2 reads.
+
+    :param output_dir: Directory with train/READ_1.txt and train/READ_2.txt.
+    :param uids: UIDs of the reads in the order they were assigned. The first train_data_fraction of them are train.
+    :param train_data_fraction: Fraction of the reads used as training data.
+    :param keep_correct_train_pair: Fraction of correct pairs to keep in the training dataset.
+    :param keep_correct_test_pair: Fraction of correct pairs to keep in the testing dataset.
+    :param lines_per_read: Number of lines of one read, UID line included.
+    :param planner: Optional memory planner, lowers the number of stages run at once or spills their record indexes.
+    :param max_workers: Number of independent stages (split of R1 and R2, shuffle of train and test) run concurrently.
+    :param executor: "thread" or "process" pool of the stages.
+    :param read_vector_schema: Rows of a read after its UID, needed by the interleaved layout.
+    :param output_layout: "separate" READ_1/READ_2 files, "interleaved" PAIRS files or "both".
+    :return: Number of train/test pairs and of disrupted pairs.
     """
-    headers = []
-    triples = []
-    triple = []
-
-    # Read the file, keep headers, and group the rest into triples
-    with open(file_path, "r") as file:
-        for line in file:
-            if line.startswith("#"):
-                # Store headers separately
-                headers.append(line)
-            else:
-                # Group the rest into triples
-                triple.append(line)
-                if len(triple) == 3:
-                    triples.append(triple)
-                    triple = []
-
-        # Handle case where the last group might not be a complete triple
-        if triple:
-            triples.append(triple)
-
-    # Shuffle the triples
-    random.shuffle(triples)
-
-    # Overwrite the original file with headers and shuffled triples
-    with open(file_path, "w") as file:
-        # Write headers back first
-        for header in headers:
-            file.write(header)
-        # Write shuffled triples
-        for triple in triples:
-            for line in triple:
-                file.write(line)
-
-
-def shuffle_triples_preserve_headers(file_path1: str, file_path2: str):
-    def extract_headers_and_write_temp(file_path):
-        headers = []
-        temp_file = tempfile.NamedTemporaryFile(delete=False, mode="w")
-        with open(file_path, "r") as f:
-            for line in f:
-                if line.startswith("#"):
-                    headers.append(line)
-                else:
-                    temp_file.write(line)
-        temp_file.close()
-        return headers, temp_file.name
-
-    def count_triples(temp_file_path):
-        with open(temp_file_path, "r") as f:
-            line_count = sum(1 for _ in f)
-        return line_count // 3
-
-    def shuffle_and_rewrite(temp_file_path, indices, file_path, headers):
-        with open(temp_file_path, "r") as temp_f, open(file_path, "w") as out_f:
-            triples = [next(temp_f) + next(temp_f) + next(temp_f) for _ in range(len(indices))]
-            # Write headers back first
-            out_f.writelines(headers)
-            # Write shuffled triples
-            for i in indices:
-                out_f.write(triples[i])
-
-    # Step 1: Extract headers and write lines to temp files, skipping lines starting with '#'
-    headers1, temp_file_path1 = extract_headers_and_write_temp(file_path1)
-    headers2, temp_file_path2 = extract_headers_and_write_temp(file_path2)
-
-    # Step 2: Count triples and shuffle indices
-    num_triples = count_triples(temp_file_path1)  # Assuming both files have the same number of lines after headers
-    indices = list(range(num_triples))
-    random.shuffle(indices)
-
-    # Step 3: Shuffle and rewrite triples along with headers to the original files
-    shuffle_and_rewrite(temp_file_path1, indices, file_path1, headers1)
-    shuffle_and_rewrite(temp_file_path2, indices, file_path2, headers2)
-
-    # Clean up initial temp files
-    os.remove(temp_file_path1)
-    os.remove(temp_file_path2)
+    if output_layout not in OUTPUT_LAYOUTS:
+        raise ValueError(f"Unknown output layout {output_layout}, expected one of {OUTPUT_LAYOUTS}")
+    train_dir: str = f"{output_dir}/train"
+    test_dir: str = f"{output_dir}/test"
+    train_output_r1_path: str = f"{train_dir}/{FILE_R1_NAME}"
+    train_output_r2_path: str = f"{train_dir}/{FILE_R2_NAME}"
+    test_r1_path: str = common.insert_before_extension(f"{test_dir}/{FILE_R1_NAME}", "_test")
+    test_r2_path: str = common.insert_before_extension(f"{test_dir}/{FILE_R2_NAME}", "_test")
+
+    for name, fraction in (
+        ("train data fraction", train_data_fraction),
+        ("correct train pair fraction", keep_correct_train_pair),
+        ("correct test pair fraction", keep_correct_test_pair),
+    ):
+        if not (0 <= fraction <= 1):
+            raise ValueError(f"The {name} must be between 0 and 1")
+    uids = np.asarray(uids, dtype=np.int64)
+    training_uids: np.ndarray = uids[: int(len(uids) * train_data_fraction)]
+    test_uids: np.ndarray = uids[len(training_uids) :]
+
+    train_shuffled_output_r2_path: str = common.insert_before_extension(train_output_r2_path, "_shuffled")
+    test_shuffled_output_r2_path: str = common.insert_before_extension(test_r2_path, "_shuffled")
+
+    # the reads after the kept correct pairs are shuffled
+    train_read_ids_to_shuffle: np.ndarray = training_uids[int(len(training_uids) * keep_correct_train_pair) :]
+    test_read_ids_to_shuffle: np.ndarray = test_uids[int(len(test_uids) * keep_correct_test_pair) :]
+
+    # each stage holds the index of the records it splits or shuffles, the planner limits how many run at once
+    # and spills the indexes to the disk when not even one fits
+    spill_dir: str | None = None
+    if planner is not None:
+        records: int = estimate_record_count(train_output_r1_path, lines_per_read)
+        train_records: int = int(records * train_data_fraction)
+        working_sets: list[int] = [
+            size * common.INDEX_ENTRY_SIZE for size in (records, records, train_records, records - train_records)
+        ]
+        workers: int = planner.concurrent_stages("split_and_disrupt", working_sets, max_workers)
+        if workers == 0:
+            spill_dir = f"{output_dir}/spill"
+            log.info(f"split and shuffle indexes are spilled to {spill_dir}")
+        else:
+            max_workers = workers
+
+    # split_file rewrites the train file in place, its output is the split train file and the test file.
+    # The shuffle stages get their seeds here, workers do not share the state of the random module
+    graph = StageGraph()
+    for name, train_path, test_path in (
+        ("split_r1", train_output_r1_path, test_r1_path),
+        ("split_r2", train_output_r2_path, test_r2_path),
+    ):
+        graph.add(
+            name,
+            split_file,
+            train_path,
+            test_path,
+            train_data_fraction,
+            training_uids,
+            lines_per_read,
+            f"{spill_dir}/{name}" if spill_dir else None,
+            inputs=(train_path,),
+            outputs=(train_path, test_path),
+        )
+    for name, to_shuffle, r2_path, shuffled_path in (
+        ("shuffle_train_r2", train_read_ids_to_shuffle, train_output_r2_path, train_shuffled_output_r2_path),
+        ("shuffle_test_r2", test_read_ids_to_shuffle, test_r2_path, test_shuffled_output_r2_path),
+    ):
+        graph.add(
+            name,
+            common.shuffle_selected_reads,
+            to_shuffle,
+            r2_path,
+            shuffled_path,
+            lines_per_read,
+            f"{spill_dir}/{name}" if spill_dir else None,
+            random.getrandbits(64),
+            inputs=(r2_path,),
+            outputs=(shuffled_path,),
+        )
+        # the unshuffled file can go once the shuffled one is written
+        graph.add(name.replace("shuffle", "delete"), common.delete_file, r2_path, inputs=(shuffled_path,))
+    if output_layout != "separate":
+        for name, r1_path, shuffled_path, output_path in (
+            ("interleave_train", train_output_r1_path, train_shuffled_output_r2_path, f"{train_dir}/{FILE_PAIRS_NAME}"),
+            (
+                "interleave_test",
+                test_r1_path,
+                test_shuffled_output_r2_path,
+                common.insert_before_extension(f"{test_dir}/{FILE_PAIRS_NAME}", "_test"),
+            ),
+        ):
+            graph.add(
+                name,
+                interleave_pairs,
+                r1_path,
+                shuffled_path,
+                output_path,
+                read_vector_schema or ["NUCLEOTIDE", "SCORE"],
+                inputs=(r1_path, shuffled_path),
+                outputs=(output_path,),
+            )
+            if output_layout == "interleaved":
+                for path in (r1_path, shuffled_path):
+                    graph.add(f"delete_{os.path.basename(path)}", common.delete_file, path, inputs=(output_path,))
+    try:
+        results: dict = graph.run(max_workers, executor)
+    finally:
+        if spill_dir is not None and os.path.exists(spill_dir):
+            shutil.rmtree(spill_dir)
+    train_disrupted: int = results["shuffle_train_r2"]
+    test_disrupted: int = results["shuffle_test_r2"]
+
+    return {
+        "train_pairs": len(training_uids),
+        "test_pairs": len(test_uids),
+        "train_disrupted": train_disrupted,
+        "test_disrupted": test_disrupted,
+    }
 
 
 @profiler
@@ -372,6 +613,22 @@ def transform_data_to_vectors(
     keep_correct_train_pair: float,  # CORRECT_TRAIN_PAIR_PERCENTAGE
     keep_correct_test_pair: float,
     version_: list[int],
+    read_filter: ReadFilter | None = None,
+    kmer_tokenizer: KmerTokenizer | None = None,
+    kmer_only: bool = False,
+    deduplicator: PairDeduplicator | None = None,
+    write_stats: bool = False,
+    planner: MemoryPlanner | None = None,
+    max_workers: int = 1,
+    executor: str = "thread",
+    encoder_workers: int = 0,
+    augmenter: Augmenter | None = None,
+    subsampler: Subsampler | None = None,
+    output_layout: str = "separate",
+    contact_resolutions: list[int] | None = None,
+    fastq_pair: tuple[str, str] | None = None,
+    uid_start: int = 0,
+    name_index: bool = False,
 ) -> None:
     """
     Transforms sequence data from FASTQ files into vector representations suitable for machine learning models.
@@ -384,43 +641,130 @@ def transform_data_to_vectors(
     :param keep_correct_train_pair: Percentage of correct pairs to keep in the training dataset.
     :param keep_correct_test_pair: Percentage of correct pairs to keep in the testing dataset.
     :param version_: A list of integers specifying the version of the processing algorithm or tools used.
-    :return: None. The function writes the output directly to the specified directory.
+    :param read_filter: Optional read filter. Pairs where either mate fails are dropped before encoding.
+    :param kmer_tokenizer: Optional k-mer tokenizer, k-mer token ids are exported as KMER row.
+    :param kmer_only: Export the KMER row instead of the NUCLEOTIDE row.
+    :param deduplicator: Optional PCR duplicate removal, duplicate pairs are dropped before encoding.
+    :param write_stats: Accumulate dataset statistics during the transform and save them to stats.npz.
+    :param planner: Optional memory planner, chooses in-memory or external algorithms of the stages.
+    :param max_workers: Number of independent stages run concurrently after the encoding.
+    :param executor: "thread" or "process" pool of the stages.
+    :param encoder_workers: Number of processes rendering the rows of the reads, 0 renders them inline.
+    :param augmenter: Optional augmentation, reverse complement and substituted copies are added to the train data.
+    :param subsampler: Optional subsampling of the read pairs, see subsample.Subsampler.
+    :param output_layout: "separate" READ_1/READ_2 files, "interleaved" PAIRS files with a pair label or "both".
+    :param contact_resolutions: Bin sizes of sparse contact matrices built from the .allValidPairs file in fastq_dir.
+    :param fastq_pair: R1 and R2 FASTQ files to transform, default the _R1/_R2 files found in fastq_dir.
+    :param uid_start: UID of the first read.
+    :param name_index: Write the read name <-> UID index to output_dir/read_names, see names.NameIndex.
+    :return: None. The function writes the output and its manifest.json directly to the specified directory.
     """
-    read_vector_schema: list = ["NUCLEOTIDE", "SCORE"]
+    read_vector_schema: list[str] = build_read_vector_schema(kmer_tokenizer, kmer_only)
+    lines_per_read: int = len(read_vector_schema) + 1
 
     if not common.is_directory(fastq_dir):
         return
     train_dir: str = f"{output_dir}/train"
     test_dir: str = f"{output_dir}/test"
-    file_r1_name: str = "READ_1.txt"
-    file_r2_name: str = "READ_2.txt"
     common.create_dir(train_dir)
     common.create_dir(test_dir)
-    fastq_r1_path, fastq_r2_path = common.find_r1_r2_files(fastq_dir)
-
-    read_id_counter: dict[str, int] = {}
-    train_output_r1_path: str = f"{train_dir}/{file_r1_name}"
-    train_output_r2_path: str = f"{train_dir}/{file_r2_name}"
-    transform_one_read(fastq_r1_path, train_output_r1_path, read_vector_schema, read_id_counter, version_)
-    transform_one_read(fastq_r2_path, train_output_r2_path, read_vector_schema, read_id_counter, version_)
-    test_r1_path: str = common.insert_before_extension(f"{test_dir}/{file_r1_name}", "_test")
-    test_r2_path: str = common.insert_before_extension(f"{test_dir}/{file_r2_name}", "_test")
-
-    training_id_counter: dict[str, int]
-    test_id_counter: dict[str, int]
-    training_id_counter, test_id_counter = common.copy_keys_by_fraction(read_id_counter, train_data_fraction)
-
-    split_file(train_output_r1_path, test_r1_path, train_data_fraction, training_id_counter)
-    split_file(train_output_r2_path, test_r2_path, train_data_fraction, training_id_counter)
-
-    train_shuffled_output_r2_path: str = common.insert_before_extension(train_output_r2_path, "_shuffled")
-    test_shuffled_output_r2_path: str = common.insert_before_extension(test_r2_path, "_shuffled")
-
-    train_read_ids_to_shuffle: list[int] = common.get_shuffled_values_only(training_id_counter, keep_correct_train_pair)
-    test_read_ids_to_shuffle: list[int] = common.get_shuffled_values_only(test_id_counter, keep_correct_test_pair)
-
-    common.shuffle_selected_reads(train_read_ids_to_shuffle, train_output_r2_path, train_shuffled_output_r2_path)
-    common.delete_file(train_output_r2_path)
-
-    common.shuffle_selected_reads(test_read_ids_to_shuffle, test_r2_path, test_shuffled_output_r2_path)
-    common.delete_file(test_r2_path)
+    fastq_r1_path, fastq_r2_path = fastq_pair or common.find_r1_r2_files(fastq_dir)
+    if fastq_r1_path is None or fastq_r2_path is None:
+        raise ValueError(f"No _R1/_R2 FASTQ pair in {fastq_dir}")
+    input_r1_path, input_r2_path = fastq_r1_path, fastq_r2_path
+    sample_dir: str | None = None
+    sources: tuple[dict | None, dict | None] = (None, None)
+    try:
+        if subsampler is not None and not subsampler.is_streaming():
+            sample_dir = f"{output_dir}/subsample"
+            # the sample is written again by a restarted run, the same inputs and seed give the same sample
+            sources = (
+                derived_fastq_source(input_r1_path, asdict(subsampler)),
+                derived_fastq_source(input_r2_path, asdict(subsampler)),
+            )
+            fastq_r1_path, fastq_r2_path = subsample_by_offset(fastq_r1_path, fastq_r2_path, sample_dir, subsampler)
+            subsampler = None
+
+        if planner is not None:
+            # select_pairs fills the keep mask of every pair and the table of the deduplicator
+            planner.check("select_pairs", select_pairs_working_set(fastq_r1_path, deduplicator))
+        keep_mask: np.ndarray | None = select_pairs(
+            fastq_r1_path, fastq_r2_path, read_filter, deduplicator, subsampler=subsampler
+        )
+
+        # read_id_counter holds every read name, without room for it the reads get their UIDs by position
+        kept_reads: int = estimate_record_count(fastq_r1_path) if keep_mask is None else int(keep_mask.sum())
+        uids_by_position: bool = planner is not None and not planner.fits(
+            "save_fastq", kept_reads * DICT_ENTRY_OVERHEAD
+        )
+        stats: DatasetStats | None = DatasetStats() if write_stats else None
+        read_id_counter: dict[str, int] | None = None if uids_by_position else {}
+        next_uid: int = transform_one_read(
+            fastq_r1_path,
+            f"{train_dir}/{FILE_R1_NAME}",
+            read_vector_schema,
+            read_id_counter,
+            version_,
+            keep_mask,
+            kmer_tokenizer,
+            stats.mates["R1"] if stats else None,
+            uid_start=uid_start,
+            encoder_workers=encoder_workers,
+            augmenter=augmenter,
+            source=sources[0],
+        )
+        transform_one_read(
+            fastq_r2_path,
+            f"{train_dir}/{FILE_R2_NAME}",
+            read_vector_schema,
+            read_id_counter,
+            version_,
+            keep_mask,
+            kmer_tokenizer,
+            stats.mates["R2"] if stats else None,
+            uid_start=uid_start,
+            encoder_workers=encoder_workers,
+            augmenter=augmenter,
+            source=sources[1],
+        )
+        if read_id_counter is None:
+            uids: np.ndarray = np.arange(uid_start, next_uid, dtype=np.int64)
+            if name_index:
+                write_fastq_name_index(output_dir, fastq_r1_path, keep_mask, uid_start, len(uids), planner)
+        else:
+            uids = np.fromiter(read_id_counter.values(), dtype=np.int64, count=len(read_id_counter))
+            if name_index:
+                write_name_index(output_dir, read_id_counter, planner)
+        # the read names are not needed by the split and shuffle stages
+        read_id_counter = keep_mask = None
+    finally:
+        # the sample is removed on failures too, it can be as large as the input
+        if sample_dir is not None and os.path.exists(sample_dir):
+            shutil.rmtree(sample_dir)
+    remove_checkpoint(f"{train_dir}/{FILE_R1_NAME}")
+    remove_checkpoint(f"{train_dir}/{FILE_R2_NAME}")
+
+    counts: dict[str, int] = split_and_disrupt(
+        output_dir,
+        uids,
+        train_data_fraction,
+        keep_correct_train_pair,
+        keep_correct_test_pair,
+        lines_per_read,
+        planner,
+        max_workers,
+        executor,
+        read_vector_schema,
+        output_layout,
+    )
+    if stats is not None:
+        stats.counts = counts
+        stats.save(f"{output_dir}/stats.npz")
+    entry: dict = input_entry(input_r1_path, input_r2_path, uids, uid_start, counts)
+    write_manifest(output_dir, new_manifest(version_, read_vector_schema, output_layout, [entry]))
+    if contact_resolutions:
+        valid_pairs_path: str | None = common.find_all_valid_pairs_file(fastq_dir)
+        if valid_pairs_path is None:
+            log.warning(f"no .allValidPairs file in {fastq_dir}, contact matrices are not built")
+        else:
+            build_contact_matrices(valid_pairs_path, f"{output_dir}/{CONTACTS_DIR_NAME}", contact_resolutions)
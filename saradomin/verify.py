@@ -0,0 +1,239 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from . import common, log
+from .convert import CONVERT_CHUNK_SIZE, chunk_boundaries, parse_chunk, read_text_header
+from .framed import find_framed_outputs
+from .interleave import FILE_PAIRS_NAME
+from .packed import parse_schema
+from .profiler import profiler
+from .transform import FILE_R1_NAME, FILE_R2_NAME
+
+NUCLEOTIDE_VALUES = np.array([0, 1, 2, 3, 4, 100])
+SCORE_RANGE: tuple[int, int] = (33, 126)  # printable ASCII of the quality line
+MAX_ERRORS_PER_CHUNK: int = 10
+DISRUPTED_TOLERANCE: float = 0.01
+# a shuffle leaves on average one read in place, more than 6 happens with probability < 1e-4
+FIXED_POINTS_ALLOWED: int = 6
+
+
+@dataclass
+class VerificationReport:
+    """Errors found in an output directory and counts of its datasets."""
+
+    errors: list[str] = field(default_factory=list)
+    counts: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def error(self, msg: str) -> None:
+        self.errors.append(msg)
+
+
+@dataclass
+class ChunkResult:
+    records: int = 0
+    uids: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    tagged_uids: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    errors: list[str] = field(default_factory=list)
+
+
+def output_paths(output_dir: str) -> dict[str, str]:
+    """Text outputs of the separate layout by dataset name."""
+    return {
+        "train_r1": f"{output_dir}/train/{FILE_R1_NAME}",
+        "train_r2": common.insert_before_extension(f"{output_dir}/train/{FILE_R2_NAME}", "_shuffled"),
+        "test_r1": common.insert_before_extension(f"{output_dir}/test/{FILE_R1_NAME}", "_test"),
+        "test_r2": common.insert_before_extension(f"{output_dir}/test/{FILE_R2_NAME}", "_test_shuffled"),
+    }
+
+
+def header_errors(header_lines: list[str]) -> list[str]:
+    errors: list[str] = []
+    if not header_lines or header_lines[0].strip() != "#HEADER#":
+        errors.append("header does not start with #HEADER#")
+    for prefix in ("#DATE=", "#schema="):
+        if not any(line.startswith(prefix) for line in header_lines):
+            errors.append(f"header has no {prefix} line")
+    if any(not line.startswith("#") for line in header_lines):
+        errors.append("header has lines not starting with #")
+    return errors
+
+
+def structure_errors(data: bytes, lines_per_record: int) -> list[str]:
+    """UID lines have to start with a digit and row lines have to be [...] lists."""
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    newlines = np.flatnonzero(buffer == ord("\n"))
+    line_starts = np.concatenate([[0], newlines[:-1] + 1])
+    is_uid_line = np.arange(len(newlines)) % lines_per_record == 0
+    errors: list[str] = []
+    first_bytes = buffer[np.minimum(line_starts, len(buffer) - 1)]
+    bad_uid_lines = is_uid_line & ~((first_bytes >= ord("0")) & (first_bytes <= ord("9")))
+    last_bytes = buffer[np.maximum(newlines - 1, 0)]
+    bad_row_lines = ~is_uid_line & ((first_bytes != ord("[")) | (last_bytes != ord("]")))
+    if bad_uid_lines.any():
+        errors.append(f"{int(bad_uid_lines.sum())} UID lines do not start with a UID")
+    if bad_row_lines.any():
+        errors.append(f"{int(bad_row_lines.sum())} row lines are not lists")
+    return errors
+
+
+def verify_chunk(path: str, start: int, end: int, read_vector_schema: list[str]) -> ChunkResult:
+    """Check the records of a byte range, runs in a worker process."""
+    result = ChunkResult()
+    with open(path, "rb") as f:
+        data: bytes = os.pread(f.fileno(), end - start, start)
+    where: str = f"{path} bytes {start}-{end}"
+    if not data.endswith(b"\n"):
+        data += b"\n"
+    lines_per_record: int = len(read_vector_schema) + 1
+    errors = structure_errors(data, lines_per_record)
+    try:
+        uids, tags, values = parse_chunk(data, len(read_vector_schema))
+    except ValueError as e:
+        errors.append(str(e))
+    else:
+        result.records = len(uids)
+        result.uids, result.tagged_uids = uids[tags == 0], uids[tags != 0]
+        rows = dict(zip(read_vector_schema, values.values()))
+        if "NUCLEOTIDE" in rows and "SCORE" in rows:
+            different = rows["NUCLEOTIDE"][1] != rows["SCORE"][1]
+            if different.any():
+                errors.append(f"{int(different.sum())} reads have different sequence and score lengths")
+        if "NUCLEOTIDE" in rows and not np.isin(rows["NUCLEOTIDE"][0], NUCLEOTIDE_VALUES).all():
+            errors.append("NUCLEOTIDE row has values outside of the mapping")
+        if "SCORE" in rows and len(rows["SCORE"][0]):
+            low, high = int(rows["SCORE"][0].min()), int(rows["SCORE"][0].max())
+            if low < SCORE_RANGE[0] or high > SCORE_RANGE[1]:
+                errors.append(f"SCORE row has values {low}-{high} outside of {SCORE_RANGE}")
+    result.errors = [f"{where}: {e}" for e in errors[:MAX_ERRORS_PER_CHUNK]]
+    return result
+
+
+def duplicates(uids: np.ndarray) -> np.ndarray:
+    unique, counts = np.unique(uids, return_counts=True)
+    return unique[counts > 1]
+
+
+def check_disrupted_fraction(
+    report: VerificationReport,
+    dataset: str,
+    r1_uids: np.ndarray,
+    r2_uids: np.ndarray,
+    keep_correct: float,
+    tolerance: float,
+) -> None:
+    """
+    Pairs are disrupted when R1 and R2 at the same position are different reads.
+    Reads the shuffle put back in place count as correct pairs, a few of them are allowed on top of the tolerance.
+    """
+    if len(r1_uids) != len(r2_uids) or not len(r1_uids):
+        return
+    disrupted: float = float(np.mean(r1_uids != r2_uids))
+    expected: float = 1 - keep_correct
+    report.counts[f"{dataset}_disrupted_fraction"] = disrupted
+    if abs(disrupted - expected) > tolerance + FIXED_POINTS_ALLOWED / len(r1_uids):
+        report.error(f"{dataset} has {disrupted:.4f} disrupted pairs, expected {expected:.4f}")
+
+
+@profiler
+def verify_output(
+    output_dir: str,
+    keep_correct_train_pair: float,
+    keep_correct_test_pair: float,
+    workers: int = 1,
+    tolerance: float = DISRUPTED_TOLERANCE,
+    chunk_size: int = CONVERT_CHUNK_SIZE,
+) -> VerificationReport:
+    """
+    Verify the train/test outputs of output_dir. Files are scanned in chunks of whole records in parallel,
+    UIDs are collected as arrays so the dataset checks take one sort per file.
+    - header: #HEADER#, #DATE=, #schema= and ####END#### lines, same schema in all files
+    - records: UID line followed by one list line per schema row, equal sequence and score lengths, value ranges
+    - UIDs: unique per file, augmented copies belong to a read of the file and are only in train data
+    - partition: train and test reads are disjoint, R2 files hold the same reads as their R1 files
+    - disruption: fraction of positions where R1 and R2 are different reads against 1 - KEEP_CORRECT_*_PAIR
+
+    :param output_dir: Output directory with the train and test directories.
+    :param keep_correct_train_pair: Configured fraction of correct train pairs.
+    :param keep_correct_test_pair: Configured fraction of correct test pairs.
+    :param workers: Number of processes scanning chunks.
+    :param tolerance: Allowed absolute difference of the disrupted fraction.
+    :param chunk_size: Approximate size of a chunk in bytes.
+    :return: Report with all errors found and counts of the datasets.
+    """
+    report = VerificationReport()
+    paths: dict[str, str] = {name: path for name, path in output_paths(output_dir).items() if os.path.exists(path)}
+    if not paths:
+        if os.path.exists(f"{output_dir}/train/{FILE_PAIRS_NAME}"):
+            log.warning("only interleaved outputs found, verification covers the separate layout")
+        if find_framed_outputs(output_dir):
+            log.warning("only compressed outputs found, verification covers the text outputs")
+        report.error(f"{output_dir} has no train/test outputs")
+        return report
+    for name, path in output_paths(output_dir).items():
+        if name not in paths:
+            report.error(f"{path} is missing")
+
+    schemas: dict[str, list[str]] = {}
+    chunks: list[tuple[str, int, int]] = []
+    for name, path in paths.items():
+        try:
+            header_lines, data_start = read_text_header(path)
+            schemas[name] = parse_schema(header_lines)
+        except ValueError as e:
+            report.error(f"{path}: {e}")
+            continue
+        for e in header_errors(header_lines):
+            report.error(f"{path}: {e}")
+        chunks += [(name, start, end) for start, end in chunk_boundaries(path, data_start, chunk_size)]
+    if len({tuple(schema) for schema in schemas.values()}) > 1:
+        report.error(f"schemas of the outputs differ: {schemas}")
+    log.info(f"verifying {len(schemas)} files of {output_dir} in {len(chunks)} chunks with {workers} workers")
+
+    results: dict[str, list[ChunkResult]] = {name: [] for name in schemas}
+    with ProcessPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = [
+            (name, executor.submit(verify_chunk, paths[name], start, end, schemas[name])) for name, start, end in chunks
+        ]
+        for name, future in futures:
+            results[name].append(future.result())
+
+    uids: dict[str, np.ndarray] = {}
+    for name, chunk_results in results.items():
+        for result in chunk_results:
+            for e in result.errors:
+                report.error(e)
+        uids[name] = np.concatenate([np.zeros(0, dtype=np.int64)] + [result.uids for result in chunk_results])
+        tagged_uids = np.concatenate([np.zeros(0, dtype=np.int64)] + [result.tagged_uids for result in chunk_results])
+        report.counts[f"{name}_records"] = sum(result.records for result in chunk_results)
+        repeated = duplicates(uids[name])
+        if len(repeated):
+            report.error(f"{paths[name]}: {len(repeated)} UIDs are not unique, e.g. {repeated[:5].tolist()}")
+        if name.startswith("test") and len(tagged_uids):
+            report.error(f"{paths[name]}: {len(tagged_uids)} augmented copies in test data")
+        elif not np.isin(tagged_uids, uids[name]).all():
+            report.error(f"{paths[name]}: augmented copies without their read")
+
+    for dataset, keep_correct in (("train", keep_correct_train_pair), ("test", keep_correct_test_pair)):
+        r1, r2 = uids.get(f"{dataset}_r1"), uids.get(f"{dataset}_r2")
+        if r1 is None or r2 is None:
+            continue
+        if len(r1) != len(r2) or not np.array_equal(np.sort(r1), np.sort(r2)):
+            report.error(f"{dataset} R1 and R2 outputs do not hold the same reads ({len(r1)} and {len(r2)})")
+        else:
+            check_disrupted_fraction(report, dataset, r1, r2, keep_correct, tolerance)
+    if "train_r1" in uids and "test_r1" in uids:
+        shared = np.intersect1d(uids["train_r1"], uids["test_r1"])
+        if len(shared):
+            report.error(f"{len(shared)} reads are in both train and test data, e.g. {shared[:5].tolist()}")
+
+    for e in report.errors:
+        log.error(e)
+    log.info(f"verification of {output_dir}: {len(report.errors)} errors, {report.counts}")
+    return report
@@ -0,0 +1,88 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from saradomin.append import append_new_pairs, rollback_pending
+from saradomin.manifest import read_manifest
+from saradomin.names import NameIndex, name_index_dir
+from saradomin.stats import DatasetStats
+from saradomin.verify import verify_output
+
+from . import test_config
+from .common import get_read_uid_from_output
+
+LANE_READS: int = 1500
+ARGUMENTS: tuple = (0.9, 0.5, 0.0, [0, 1, 0])
+
+
+def write_lanes(fastq_dir: str, lane_dir: str) -> list[str]:
+    """Split the test FASTQ pair into two lanes, the second lane is written to lane_dir."""
+    names = sorted(os.listdir(test_config.FASTQ_DIR))
+    paths: list[str] = []
+    for mate in ("R1", "R2"):
+        source = next(f"{test_config.FASTQ_DIR}/{name}" for name in names if f"_{mate}" in name)
+        with open(source) as f:
+            lines = f.readlines()
+        for lane, directory, part in ((1, fastq_dir, lines[: LANE_READS * 4]), (2, lane_dir, lines[LANE_READS * 4 :])):
+            path = f"{directory}/SAMPLE_L00{lane}_{mate}.fastq"
+            with open(path, "w") as f:
+                f.writelines(part)
+            paths.append(path)
+    return paths
+
+
+class TestAppend(unittest.TestCase):
+    def test_append_lane(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            fastq_dir, output_dir = f"{temp_dir}/fastq", f"{temp_dir}/output"
+            os.makedirs(fastq_dir)
+            os.makedirs(f"{temp_dir}/later")
+            write_lanes(fastq_dir, f"{temp_dir}/later")
+            self.assertEqual(append_new_pairs(fastq_dir, output_dir, *ARGUMENTS, name_index=True), 0)
+            self.assertEqual(read_manifest(output_dir)["next_uid"], LANE_READS)
+
+            for name in os.listdir(f"{temp_dir}/later"):
+                os.rename(f"{temp_dir}/later/{name}", f"{fastq_dir}/{name}")
+            self.assertEqual(append_new_pairs(fastq_dir, output_dir, *ARGUMENTS, name_index=True), 1)
+            self.assertEqual(append_new_pairs(fastq_dir, output_dir, *ARGUMENTS, name_index=True), 0)
+
+            manifest = read_manifest(output_dir)
+            self.assertEqual([entry["first_uid"] for entry in manifest["inputs"]], [0, LANE_READS])
+            uids = get_read_uid_from_output(f"{output_dir}/train/READ_1.txt")
+            uids += get_read_uid_from_output(f"{output_dir}/test/READ_1_test.txt")
+            self.assertEqual(sorted(uids), list(range(manifest["next_uid"])))
+            index = NameIndex(name_index_dir(output_dir))
+            self.assertEqual(len(index), manifest["next_uid"])
+            self.assertEqual(index.uids_of(index.names_of([0, LANE_READS])).tolist(), [0, LANE_READS])
+            self.assertFalse(os.path.exists(f"{output_dir}/append"))
+            self.assertTrue(verify_output(output_dir, 0.5, 0.0, tolerance=0.02).ok)
+
+    def test_rollback(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            os.makedirs(f"{temp_dir}/train")
+            with open(f"{temp_dir}/train/READ_1.txt", "w") as f:
+                f.write("#HEADER#\n####END####\n0\n[1]\n[66]\n1\n[2]\n")
+            manifest = {"next_uid": 1, "inputs": [], "pending": {"fastq_r1": "L002", "sizes": {"train/READ_1.txt": 32}}}
+            self.assertNotIn("pending", rollback_pending(temp_dir, manifest))
+            with open(f"{temp_dir}/train/READ_1.txt") as f:
+                self.assertEqual(f.read(), "#HEADER#\n####END####\n0\n[1]\n[66]\n")
+
+    def test_interrupted_append_keeps_stats(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            fastq_dir, output_dir = f"{temp_dir}/fastq", f"{temp_dir}/output"
+            os.makedirs(fastq_dir)
+            write_lanes(fastq_dir, fastq_dir)
+            interrupted = mock.patch("saradomin.append.merge_name_indexes", side_effect=KeyboardInterrupt)
+            with interrupted, self.assertRaises(KeyboardInterrupt):  # after the stats are merged
+                append_new_pairs(fastq_dir, output_dir, *ARGUMENTS, write_stats=True, name_index=True)
+            self.assertIn("pending", read_manifest(output_dir))
+            self.assertEqual(append_new_pairs(fastq_dir, output_dir, *ARGUMENTS, write_stats=True, name_index=True), 1)
+
+            stats = DatasetStats.load(f"{output_dir}/stats.npz")
+            self.assertEqual(stats.mates["R1"].reads, read_manifest(output_dir)["next_uid"])
+            self.assertFalse(os.path.exists(f"{output_dir}/stats.npz.pending"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from saradomin.augment import Augmenter, reverse_complement, substitute
+from saradomin.fastq import FastqBatch
+from saradomin.transform import encode_sequence, split_file
+
+COMPLEMENT: dict[str, str] = {"A": "T", "C": "G", "G": "C", "T": "A", "N": "N"}
+
+
+class TestAugment(unittest.TestCase):
+    def test_reverse_complement_matches_per_read(self):
+        sequences, qualities = ["ACGTN", "", "GGA"], ["ABCDE", "", "FGH"]
+        lengths = np.array([len(s) for s in sequences])
+        codes = np.array([c for s in sequences for c in encode_sequence(s)], dtype=np.uint8)
+        scores = np.array([ord(q) for quality in qualities for q in quality], dtype=np.uint8)
+
+        rc_codes, rc_scores = reverse_complement(codes, scores, lengths)
+        expected = [encode_sequence("".join(COMPLEMENT[b] for b in reversed(s))) for s in sequences]
+        self.assertEqual(rc_codes.tolist(), [c for e in expected for c in e])
+        self.assertEqual(rc_scores.tolist(), [ord(q) for quality in qualities for q in reversed(quality)])
+
+    def test_substitution(self):
+        codes = np.array([0, 1, 2, 3, 4] * 100, dtype=np.uint8)
+        substituted = substitute(codes, 1.0, np.random.default_rng(0))
+        self.assertTrue((substituted[codes == 4] == 4).all())
+        self.assertTrue((substituted[codes < 4] != codes[codes < 4]).all())
+        self.assertEqual(substitute(codes, 0.0, np.random.default_rng(0)).tolist(), codes.tolist())
+
+    def test_seeded(self):
+        batch = FastqBatch(["r0", "r1"], ["ACGTACGTAC", "GGGGCCCCAA"], ["I" * 10, "J" * 10])
+        augmenter = Augmenter(reverse_complement=True, substitution_rate=0.3, seed=7)
+        runs = [
+            [copy.record(0, 1, ["NUCLEOTIDE", "SCORE"]) for copy in augmenter.augment_batch(batch, rng)]
+            for rng in (augmenter.batch_rng("x", 0), augmenter.batch_rng("x", 0))
+        ]
+        self.assertEqual(runs[0], runs[1])
+        self.assertTrue(runs[0][0].startswith("0\trc\n"))
+        self.assertTrue(runs[0][1].startswith("0\tsub\n"))
+
+    def test_unknown_bases(self):
+        batch = FastqBatch(["r0"], ["ACRTa"], ["ABCDE"])
+        augmenter = Augmenter(reverse_complement=True, substitution_rate=1.0)
+        rc, sub = augmenter.augment_batch(batch, augmenter.batch_rng("x", 0))
+        # the same '100' as encode_sequence writes in the record of the read
+        self.assertEqual(encode_sequence("ACRTa"), [0, 1, "100", 3, 0])
+        self.assertEqual(rc.record(0, 0, ["NUCLEOTIDE"]), "0\trc\n[3, 0, '100', 2, 3]\n")
+        self.assertEqual(sub.record(0, 0, ["NUCLEOTIDE"]).split("\n")[1].split(", ")[2], "'100'")
+
+    def test_split_keeps_copies_with_train_reads(self):
+        records = ["0\n[0]\n", "0\trc\n[3]\n", "1\n[1]\n", "1\trc\n[2]\n"]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            train_path, test_path = f"{temp_dir}/train.txt", f"{temp_dir}/test.txt"
+            with open(train_path, "w") as f:
+                f.write("#HEADER#\n####END####\n" + "".join(records))
+            split_file(train_path, test_path, 0.5, np.array([0]), lines_per_read=2)
+            with open(train_path) as train, open(test_path) as test:
+                self.assertEqual(train.read().split("####END####\n")[1], records[0] + records[1])
+                self.assertEqual(test.read().split("####END####\n")[1], records[2])
+            self.assertFalse(os.path.exists(train_path + ".tmp"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import os
+import tempfile
+import unittest
+
+from saradomin.batch import BATCH_REPORT_NAME, SAMPLE_LOG_NAME, find_samples, run_batch
+from saradomin.common import read_json
+from saradomin.main import load_config, parse_namespace
+
+from . import test_config
+
+
+class TestBatch(unittest.TestCase):
+    def test_find_samples(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for name in ("a", "b"):
+                os.makedirs(f"{temp_dir}/runs/{name}")
+            samples = find_samples([f"{temp_dir}/runs/*", f"{temp_dir}/runs/a"], "out")
+            self.assertEqual([sample.name for sample in samples], ["a", "b"])
+            self.assertEqual(samples[1].output_dir, "out/b")
+
+    def test_failed_sample_does_not_stop_batch(self):
+        fastq_dir = os.path.abspath(test_config.FASTQ_DIR)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for name in ("s1", "s2"):
+                os.makedirs(f"{temp_dir}/samples/{name}")
+                for file_name in os.listdir(fastq_dir):
+                    os.symlink(f"{fastq_dir}/{file_name}", f"{temp_dir}/samples/{name}/{file_name}")
+            os.makedirs(f"{temp_dir}/samples/empty")
+            parsed_config = parse_namespace(load_config())
+            samples = run_batch([f"{temp_dir}/samples/*"], f"{temp_dir}/out", parsed_config, 2, 64 << 20)
+
+            statuses = {sample.name: sample.result["status"] for sample in samples}
+            self.assertEqual(statuses, {"empty": "failed", "s1": "ok", "s2": "ok"})
+            self.assertEqual(samples[1].result["reads"], 2500)
+            self.assertTrue(os.path.exists(f"{temp_dir}/out/s2/train/READ_1.txt"))
+            self.assertTrue(os.path.exists(f"{temp_dir}/out/s2/{SAMPLE_LOG_NAME}"))
+            self.assertEqual(read_json(f"{temp_dir}/out/{BATCH_REPORT_NAME}")["failed"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
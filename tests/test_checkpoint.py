@@ -0,0 +1,171 @@
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from saradomin import checkpoint
+from saradomin.augment import Augmenter
+from saradomin.checkpoint import (
+    FastqCheckpoint,
+    checkpoint_key,
+    checkpoint_path,
+    derived_fastq_source,
+    open_checkpoint,
+)
+from saradomin.stats import ReadStats
+from saradomin.subsample import Subsampler
+from saradomin.transform import create_file_header, save_fastq, transform_data_to_vectors
+
+from . import test_config
+
+SCHEMA: list[str] = ["NUCLEOTIDE", "SCORE"]
+AUGMENTER = Augmenter(substitution_rate=0.1, seed=3)
+
+
+class Preempted(Exception):
+    pass
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        fastq_dir = os.path.abspath(test_config.FASTQ_DIR)
+        names = sorted(os.listdir(fastq_dir))
+        self.fastq_paths = [f"{fastq_dir}/{name}" for mate in ("_R1", "_R2") for name in names if mate in name]
+        self.keep_mask = np.random.default_rng(0).random(2500) < 0.8
+        checkpoint.configure_checkpoints(1e-9)  # a checkpoint after every batch
+        self.addCleanup(checkpoint.configure_checkpoints, 0.0)
+
+    def run_mates(self, output_dir: str, encoder_workers: int = 0) -> tuple[dict, list[bytes], list[ReadStats]]:
+        """Encode R1 and R2 like transform_one_read, with batches of 100 reads."""
+        read_id_counter: dict[str, int] = {}
+        outputs, stats = [], []
+        for fastq_path, name in zip(self.fastq_paths, ("READ_1.txt", "READ_2.txt")):
+            output_path = f"{output_dir}/{name}"
+            key = checkpoint_key(fastq_path, None, 10, SCHEMA, self.keep_mask, AUGMENTER)
+            stage_checkpoint = open_checkpoint(output_path, key)
+            if not stage_checkpoint.resumed:
+                create_file_header(output_path, SCHEMA, [0, 1, 0], augmenter=AUGMENTER)
+            read_stats = ReadStats()
+            save_fastq(
+                fastq_path,
+                output_path,
+                read_id_counter,
+                self.keep_mask,
+                SCHEMA,
+                read_stats=read_stats,
+                uid_start=10,
+                batch_size=100,
+                encoder_workers=encoder_workers,
+                augmenter=AUGMENTER,
+                checkpoint=stage_checkpoint,
+            )
+            with open(output_path, "rb") as f:
+                outputs.append(b"".join(line for line in f if not line.startswith(b"#DATE=")))
+            stats.append(read_stats)
+        return read_id_counter, outputs, stats
+
+    def assert_same_run(self, expected: tuple, resumed: tuple):
+        self.assertEqual(expected[0], resumed[0])
+        self.assertEqual(expected[1], resumed[1])
+        for expected_stats, resumed_stats in zip(expected[2], resumed[2]):
+            self.assertEqual(expected_stats.state(), resumed_stats.state())
+
+    def interrupted_run(self, output_dir: str, saves: int, encoder_workers: int = 0) -> tuple:
+        """Stop after a number of checkpoints with an unflushed tail in the output, then run again."""
+        save = FastqCheckpoint.save
+        calls = []
+
+        def preempt(self_, output_file, *args):
+            save(self_, output_file, *args)
+            calls.append(1)
+            if len(calls) == saves:
+                output_file.write("0\n[1, 2" if "b" not in output_file.mode else b"0\n[1, 2")
+                output_file.flush()
+                raise Preempted()
+
+        with mock.patch.object(FastqCheckpoint, "save", preempt), self.assertRaises(Preempted):
+            self.run_mates(output_dir, encoder_workers)
+        self.assertTrue(os.path.exists(checkpoint_path(f"{output_dir}/READ_1.txt")))
+        return self.run_mates(output_dir, encoder_workers)
+
+    def test_resume_same_output(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            os.makedirs(f"{temp_dir}/full")
+            expected = self.run_mates(f"{temp_dir}/full")
+            self.assertGreater(len(expected[0]), 0)
+            for saves in (5, 30):  # in R1, in R2 after R1 is done
+                output_dir = f"{temp_dir}/{saves}"
+                os.makedirs(output_dir)
+                self.assert_same_run(expected, self.interrupted_run(output_dir, saves))
+
+    def test_resume_with_encoder_workers(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            os.makedirs(f"{temp_dir}/full")
+            os.makedirs(f"{temp_dir}/resumed")
+            expected = self.run_mates(f"{temp_dir}/full")
+            self.assert_same_run(expected, self.interrupted_run(f"{temp_dir}/resumed", 8, encoder_workers=2))
+
+    def test_other_settings_start_over(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self.run_mates(temp_dir)
+            output_path = f"{temp_dir}/READ_1.txt"
+            self.assertTrue(os.path.exists(checkpoint_path(output_path)))
+            key = checkpoint_key(self.fastq_paths[0], None, 0, SCHEMA, self.keep_mask, AUGMENTER)
+            self.assertFalse(open_checkpoint(output_path, key).resumed)
+            checkpoint.configure_checkpoints(0.0)
+            self.assertIsNone(open_checkpoint(output_path, key))
+
+    def test_derived_fastq_key(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            sample_path = f"{temp_dir}/sample_R1.fastq"
+            with open(self.fastq_paths[0], "rb") as source, open(sample_path, "wb") as sample:
+                sample.write(source.read())
+            source = derived_fastq_source(self.fastq_paths[0], {"seed": 1})
+            key = checkpoint_key(sample_path, None, 0, SCHEMA, None, None, source=source)
+            os.utime(sample_path, ns=(1, 1))  # written again by a restarted run
+            self.assertEqual(checkpoint_key(sample_path, None, 0, SCHEMA, None, None, source=source), key)
+            other = derived_fastq_source(self.fastq_paths[0], {"seed": 2})
+            self.assertNotEqual(checkpoint_key(sample_path, None, 0, SCHEMA, None, None, source=other), key)
+            self.assertNotEqual(checkpoint_key(sample_path, None, 0, SCHEMA, None, None), key)
+
+    def test_resume_offset_subsample(self):
+        """The sample is removed by the failed run and written again, the restarted run still resumes."""
+        fastq_dir = os.path.abspath(test_config.FASTQ_DIR)
+        subsampler = Subsampler("offset", reads=300, seed=7)
+        save = FastqCheckpoint.save
+
+        def preempt(self_, output_file, *args):
+            save(self_, output_file, *args)
+            raise Preempted()
+
+        def run(output_dir: str) -> list[bytes]:
+            random.seed(1)
+            transform_data_to_vectors(fastq_dir, output_dir, 0.8, 0.5, 0.5, [0, 1, 0], subsampler=subsampler)
+            outputs = []
+            for path in ("train/READ_1.txt", "train/READ_2_shuffled.txt", "test/READ_2_test_shuffled.txt"):
+                with open(f"{output_dir}/{path}", "rb") as f:
+                    outputs.append(b"".join(line for line in f if not line.startswith(b"#DATE=")))
+            return outputs
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            expected = run(f"{temp_dir}/full")
+            with mock.patch.object(FastqCheckpoint, "save", preempt), self.assertRaises(Preempted):
+                run(f"{temp_dir}/resumed")
+            self.assertFalse(os.path.exists(f"{temp_dir}/resumed/subsample"))
+            resumed = []
+
+            def open_and_record(output_path: str, key: dict) -> FastqCheckpoint:
+                stage_checkpoint = open_checkpoint(output_path, key)
+                resumed.append(stage_checkpoint.resumed)
+                return stage_checkpoint
+
+            with mock.patch("saradomin.transform.open_checkpoint", open_and_record):
+                self.assertEqual(run(f"{temp_dir}/resumed"), expected)
+            self.assertEqual(resumed, [True, False])  # R1 was checkpointed before the preemption
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import tempfile
+import unittest
+
+import numpy as np
+
+from saradomin.contacts import build_contact_matrices, parse_resolutions
+
+CHROMOSOMES: list[str] = ["chr1", "chr2", "chrX"]
+
+
+def write_valid_pairs(path: str, n: int, rng: np.random.Generator) -> list[tuple[str, int, str, int]]:
+    pairs = []
+    with open(path, "w") as f:
+        for i in range(n):
+            chrom_1, chrom_2 = rng.choice(CHROMOSOMES, size=2)
+            pos_1, pos_2 = (int(p) for p in rng.integers(1, 50_000, size=2))
+            f.write(f"read{i}\t{chrom_1}\t{pos_1}\t+\t{chrom_2}\t{pos_2}\t-\t250\tHIC_a\tHIC_b\t42\t42\n")
+            pairs.append((str(chrom_1), pos_1, str(chrom_2), pos_2))
+    return pairs
+
+
+class TestContacts(unittest.TestCase):
+    def test_parse_resolutions(self):
+        self.assertEqual(parse_resolutions("10000, 1000000,10000"), [1000000, 10000])
+        self.assertEqual(parse_resolutions(""), [])
+        with self.assertRaises(ValueError):
+            parse_resolutions("0")
+
+    def test_matches_dense_counts(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            pairs = write_valid_pairs(f"{temp_dir}/sample.allValidPairs", 500, np.random.default_rng(1))
+            paths = build_contact_matrices(f"{temp_dir}/sample.allValidPairs", temp_dir, [10_000, 1000], chunk_lines=64)
+            for resolution, path in paths.items():
+                with np.load(path) as matrix:
+                    chromosomes = list(matrix["chromosomes"])
+                    offsets = matrix["chrom_offsets"]
+                    dense = np.zeros((offsets[-1], offsets[-1]), dtype=np.int64)
+                    for chrom_1, pos_1, chrom_2, pos_2 in pairs:
+                        i = offsets[chromosomes.index(chrom_1)] + pos_1 // resolution
+                        j = offsets[chromosomes.index(chrom_2)] + pos_2 // resolution
+                        dense[min(i, j), max(i, j)] += 1
+                    sparse = np.zeros_like(dense)
+                    sparse[matrix["row"], matrix["col"]] = matrix["count"]
+                    np.testing.assert_array_equal(sparse, dense)
+                    # CSR row pointers into the COO entries sorted by row
+                    indptr = matrix["indptr"]
+                    self.assertEqual(indptr[-1], len(matrix["count"]))
+                    self.assertTrue(np.all(matrix["row"][indptr[5] : indptr[6]] == 5))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import tempfile
+import unittest
+
+import numpy as np
+
+from saradomin.convert import convert_text_output, parse_chunk
+from saradomin.packed import PackedReader
+
+HEADER: str = "#HEADER#\n#schema=1.row UID\t2.row NUCLEOTIDE\t3.row SCORE\t4.row KMER \n####END####\n"
+RECORDS: str = (
+    "0\n[2, 3]\n[66, 66]\n[11]\n"
+    "0\trc\n[0, 1]\n[66, 66]\n[4]\n"
+    "17\n[]\n[]\n[]\n"
+    "123\n[4, 0, 1]\n[35, 60, 7]\n[1234, 5]\n"
+)
+
+
+class TestConvert(unittest.TestCase):
+    def test_parse_chunk(self):
+        uids, tags, values = parse_chunk(RECORDS.encode(), 3)
+        np.testing.assert_array_equal(uids, [0, 0, 17, 123])
+        np.testing.assert_array_equal(tags, [0, 1, 0, 0])
+        np.testing.assert_array_equal(values[0][0], [2, 3, 0, 1, 4, 0, 1])
+        np.testing.assert_array_equal(values[0][1], [2, 2, 0, 3])
+        np.testing.assert_array_equal(values[2][0], [11, 4, 1234, 5])
+
+    def test_parse_long_numbers(self):
+        uids, _, values = parse_chunk(b"9007199254740993\n[999999999999999999, 0]\n", 1)
+        self.assertEqual(uids.tolist(), [9007199254740993])
+        self.assertEqual(values[0][0].tolist(), [999999999999999999, 0])
+
+    def test_parse_tags(self):
+        _, tags, _ = parse_chunk(b"1\tsub\n[1]\n2\trc \r\n[2]\n3\t\n[3]\n4\n[4]\n", 1)
+        np.testing.assert_array_equal(tags, [2, 1, 0, 0])
+        for data in (b"1\trcx\n[1]\n", b"1\tsu\n[1]\n", b"1\tx\n[1]\n", b"1\trc\tsub\n[1]\n", b"1\n[1\t]\n"):
+            with self.assertRaises(ValueError):
+                parse_chunk(data, 1)
+
+    def test_chunks_give_same_records(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = f"{temp_dir}/READ_1.txt"
+            with open(path, "w") as f:
+                f.write(HEADER + RECORDS * 50)
+            reader = PackedReader(convert_text_output(path, workers=2, chunk_size=100))
+            self.assertEqual(len(reader), 200)
+            self.assertEqual(reader.header["header"][1].split("=")[0], "#schema")
+            record = reader.record(199)
+            self.assertEqual(record["UID"], 123)
+            self.assertEqual(record["TAG"], "")
+            self.assertEqual(list(record["SCORE"]), [35, 60, 7])
+            self.assertEqual(list(record["KMER"]), [1234, 5])
+            self.assertEqual(reader.record(1)["TAG"], "rc")
+            self.assertEqual(len(reader.record(2)["NUCLEOTIDE"]), 0)
+
+    def test_rejects_interleaved(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = f"{temp_dir}/PAIRS.txt"
+            with open(path, "w") as f:
+                f.write("#HEADER#\n#schema=1.row UID_R1 UID_R2 CORRECT_PAIR \n#layout=interleaved\n####END####\n")
+            with self.assertRaises(ValueError):
+                convert_text_output(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from saradomin import common
+
+HEADER: str = "#HEADER#\n####END####\n"
+RECORDS: list[str] = [f"{uid}\n[{uid}, 1]\n[40, 40]\n" for uid in range(6)]
+
+
+class TestCopy(unittest.TestCase):
+    def write(self, path: str, text: str) -> str:
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def read(self, path: str) -> str:
+        with open(path) as f:
+            return f.read()
+
+    def test_append_skips_header(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            destination = self.write(f"{temp_dir}/a.txt", HEADER + RECORDS[0])
+            source = self.write(f"{temp_dir}/b.txt", HEADER + "".join(RECORDS[1:]))
+            common.append_file_skip_hash_lines(destination, source)
+            self.assertEqual(self.read(destination), HEADER + "".join(RECORDS))
+            common.copy_file_skip_hash_lines(source, f"{temp_dir}/c.txt")
+            self.assertEqual(self.read(f"{temp_dir}/c.txt"), "".join(RECORDS[1:]))
+            common.append_file_to_another(f"{temp_dir}/c.txt", source)
+            self.assertEqual(self.read(f"{temp_dir}/c.txt"), "".join(RECORDS[1:]) + HEADER + "".join(RECORDS[1:]))
+
+    def test_fallback_without_kernel_copy(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            source = self.write(f"{temp_dir}/b.txt", HEADER + "".join(RECORDS))
+            with mock.patch.object(common, "disabled_copy_methods", set(common.KERNEL_COPY_METHODS)):
+                common.copy_file_skip_hash_lines(source, f"{temp_dir}/c.txt")
+            self.assertEqual(self.read(f"{temp_dir}/c.txt"), "".join(RECORDS))
+
+    def test_fallback_when_kernel_copy_copies_nothing(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            source = self.write(f"{temp_dir}/b.txt", HEADER + "".join(RECORDS))
+            disabled = set()
+            with (
+                mock.patch.object(common, "disabled_copy_methods", disabled),
+                mock.patch.object(common, "KERNEL_COPY_METHODS", ("copy_file_range",)),
+                mock.patch("os.copy_file_range", return_value=0, create=True),
+            ):
+                common.copy_file_skip_hash_lines(source, f"{temp_dir}/c.txt")
+            self.assertEqual(self.read(f"{temp_dir}/c.txt"), "".join(RECORDS))
+            self.assertEqual(disabled, {"copy_file_range"})
+
+    def test_end_of_source_keeps_kernel_copy(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            source = self.write(f"{temp_dir}/b.txt", "".join(RECORDS))
+            disabled = set()
+            with mock.patch.object(common, "disabled_copy_methods", disabled), open(source, "rb") as f:
+                with open(f"{temp_dir}/c.txt", "wb") as destination:
+                    with self.assertRaisesRegex(OSError, "source ended"):
+                        common.copy_range(f.fileno(), destination.fileno(), 0, os.path.getsize(source) + 10)
+            self.assertEqual(disabled, set())
+
+    def test_write_records_in_order(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            source = self.write(f"{temp_dir}/b.txt", HEADER + "".join(RECORDS))
+            index = common.index_records(source, 3, with_uids=True)
+            self.assertEqual((index.header_size, index.uids.tolist()), (len(HEADER), list(range(6))))
+            order = np.array([0, 1, 2, 5, 3])
+            common.write_records_in_order(source, f"{temp_dir}/c.txt", index, order)
+            self.assertEqual(self.read(f"{temp_dir}/c.txt"), HEADER + "".join(RECORDS[i] for i in order))
+
+    def test_spilled_index(self):
+        with tempfile.TemporaryDirectory() as temp_dir, mock.patch.object(common, "SPILL_RECORDS", 4):
+            source = self.write(f"{temp_dir}/b.txt", HEADER + "".join(RECORDS))
+            os.makedirs(f"{temp_dir}/spill")
+            index = common.index_records(source, 3, with_uids=True, spill_dir=f"{temp_dir}/spill")
+            in_memory = common.index_records(source, 3, with_uids=True)
+            self.assertIsInstance(index.offsets, np.memmap)
+            self.assertEqual(index.header_size, in_memory.header_size)
+            for column in ("offsets", "sizes", "uids", "tagged"):
+                self.assertEqual(getattr(index, column).tolist(), getattr(in_memory, column).tolist())
+            selected = common.find_records(index, lambda uids, tagged: uids % 2 == 1, f"{temp_dir}/spill/odd.bin")
+            self.assertEqual(selected.tolist(), [1, 3, 5])
+
+    def test_coalesce_ranges(self):
+        run_offsets, run_sizes, run_records = common.coalesce_ranges(np.array([0, 10, 30, 40, 5]), np.array([10] * 5))
+        self.assertEqual(run_offsets.tolist(), [0, 30, 5])
+        self.assertEqual(run_sizes.tolist(), [20, 20, 10])
+        self.assertEqual(run_records.tolist(), [2, 2, 1])
+        self.assertEqual(len(common.coalesce_ranges(np.zeros(0, np.int64), np.zeros(0, np.int64))[0]), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+
+import numpy as np
+
+from saradomin.dedup import BloomDeduplicator, ExactDeduplicator, PairDeduplicator, pair_fingerprints
+from saradomin.fastq import FastqBatch
+
+
+def batch(sequences: list[str]) -> FastqBatch:
+    return FastqBatch([f"read{i}" for i in range(len(sequences))], sequences, ["I" * len(s) for s in sequences])
+
+
+def random_fingerprints(n: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).integers(0, 2**64, size=(n, 2), dtype=np.uint64)
+
+
+class TestDedup(unittest.TestCase):
+    def test_exact_within_and_across_batches(self):
+        dedup = PairDeduplicator("exact", 100)
+        duplicates = dedup.find_duplicates(
+            batch(["AC", "AC", "GT", "AC"]), batch(["TT", "TT", "TT", "TA"]), np.ones(4, bool)
+        )
+        self.assertEqual(duplicates.tolist(), [False, True, False, False])
+        duplicates = dedup.find_duplicates(batch(["GT", "CC", "AC"]), batch(["TT", "TT", "TA"]), np.ones(3, bool))
+        self.assertEqual(duplicates.tolist(), [True, False, True])
+        self.assertEqual((dedup.pairs, dedup.duplicates), (7, 3))
+
+    def test_prefix_length(self):
+        dedup = PairDeduplicator("exact", 100, prefix_length=3)
+        r1, r2 = batch(["ACGTA", "ACGCC", "ACTTA"]), batch(["GGGAA", "GGGTT", "GGGAA"])
+        self.assertEqual(dedup.find_duplicates(r1, r2, np.ones(3, bool)).tolist(), [False, True, False])
+        self.assertEqual(
+            pair_fingerprints(["ACGTA"], ["GGG"], 3).tolist(), pair_fingerprints(["ACG"], ["GGGAA"], 3).tolist()
+        )
+        self.assertNotEqual(
+            pair_fingerprints(["ACGTA"], ["GGG"]).tolist(), pair_fingerprints(["ACG"], ["GGG"]).tolist()
+        )
+
+    def test_candidates(self):
+        dedup = PairDeduplicator("exact", 100)
+        r1, r2 = batch(["AC", "AC", "AC"]), batch(["TT", "TT", "TT"])
+        duplicates = dedup.find_duplicates(r1, r2, np.array([False, True, True]))
+        self.assertEqual(duplicates.tolist(), [False, False, True])
+        self.assertEqual(dedup.pairs, 2)
+        # a pair which was not a candidate is not remembered
+        dedup = PairDeduplicator("exact", 100)
+        dedup.find_duplicates(batch(["GG"]), batch(["CC"]), np.array([False]))
+        self.assertEqual(dedup.find_duplicates(batch(["GG"]), batch(["CC"]), np.array([True])).tolist(), [False])
+
+    def test_exact_compares_both_words(self):
+        fingerprints = np.array([[0, 0], [0, 1], [1, 0], [0, 0], [5, 7], [5, 8]], dtype=np.uint64)
+        self.assertEqual(ExactDeduplicator(10).add(fingerprints).tolist(), [False] * 3 + [True] + [False] * 2)
+
+    def test_exact_against_set(self):
+        dedup = ExactDeduplicator(3000)
+        fingerprints = random_fingerprints(2000)
+        fingerprints[:, 0] &= np.uint64(0xFF)  # many keys share their first slot and probe
+        seen: set = set()
+        for part in np.array_split(np.concatenate([fingerprints, fingerprints[::3]]), 7):
+            expected = []
+            for row in map(tuple, part.tolist()):
+                expected.append(row in seen)
+                seen.add(row)
+            self.assertEqual(dedup.add(part).tolist(), expected)
+
+    def test_exact_table_full(self):
+        dedup = ExactDeduplicator(10)
+        fingerprints = random_fingerprints(100)
+        self.assertFalse(dedup.add(fingerprints).any())
+        self.assertEqual(dedup.size, dedup.max_size)
+        self.assertTrue(dedup.warned_full)
+        repeated = dedup.add(fingerprints)
+        # remembered pairs are still found, pairs which did not fit are missed, new pairs are never duplicates
+        self.assertEqual(int(repeated.sum()), dedup.max_size)
+        self.assertFalse(dedup.add(random_fingerprints(100, seed=1)).any())
+
+    def test_bloom_no_false_negatives(self):
+        dedup = BloomDeduplicator(5000, 0.01)
+        fingerprints = random_fingerprints(5000)
+        dedup.add(fingerprints[:2500])
+        self.assertTrue(dedup.add(fingerprints[:2500]).all())
+        self.assertTrue(dedup.add(np.concatenate([fingerprints[2500:], fingerprints[2500:]]))[2500:].all())
+        self.assertTrue(dedup.add(fingerprints).all())
+        self.assertLess(dedup.add(random_fingerprints(5000, seed=1)).mean(), 0.1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+
+import numpy as np
+
+from saradomin.fastq import FastqBatch
+from saradomin.filter import ReadFilter, evaluate_batch, filter_pairs
+
+
+def make_batch(sequences: list[str], qualities: list[str]) -> FastqBatch:
+    return FastqBatch([f"read{i}" for i in range(len(sequences))], sequences, qualities)
+
+
+class TestReadFilter(unittest.TestCase):
+    def test_inactive_by_default(self):
+        self.assertFalse(ReadFilter().is_active())
+        self.assertTrue(ReadFilter(min_length=10).is_active())
+
+    def test_min_length(self):
+        batch = make_batch(["ACGT", "ACGTACGT", ""], ["IIII", "IIIIIIII", ""])
+        failed = evaluate_batch(ReadFilter(min_length=5), batch)
+        self.assertEqual(failed["min_length"].tolist(), [True, False, True])
+
+    def test_max_n_fraction(self):
+        batch = make_batch(["NNNA", "ANNN", "ACGT"], ["IIII", "IIII", "IIII"])
+        failed = evaluate_batch(ReadFilter(max_n_fraction=0.5), batch)
+        self.assertEqual(failed["max_n_fraction"].tolist(), [True, True, False])
+
+    def test_quality(self):
+        # '#' is PHRED 2, 'I' is PHRED 40
+        batch = make_batch(["ACGT", "ACGT", "ACGT"], ["####", "II##", "IIII"])
+        failed = evaluate_batch(ReadFilter(min_mean_quality=20.0), batch)
+        self.assertEqual(failed["min_mean_quality"].tolist(), [True, False, False])
+
+        failed = evaluate_batch(ReadFilter(min_percentile_quality=30.0, quality_percentile=10.0), batch)
+        self.assertEqual(failed["min_percentile_quality"].tolist(), [True, True, False])
+
+    def test_pair_dropped_when_either_mate_fails(self):
+        batch_r1 = make_batch(["ACGT", "ACGTACGT"], ["IIII", "IIIIIIII"])
+        batch_r2 = make_batch(["ACGTACGT", "ACGTACGT"], ["IIIIIIII", "IIIIIIII"])
+        failed = filter_pairs(ReadFilter(min_length=5), batch_r1, batch_r2)
+        np.testing.assert_array_equal(failed["min_length"], [True, False])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import gzip
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+from saradomin.framed import FramedReader, compress_text_output, find_framed_outputs, seek_table_path
+
+HEADER: str = "#HEADER#\n#schema=1.row UID\t2.row NUCLEOTIDE\t3.row SCORE \n####END####\n"
+
+
+def record(uid: int, tag: str = "") -> str:
+    uid_line = f"{uid}\t{tag}\n" if tag else f"{uid}\n"
+    return f"{uid_line}[{uid % 5}, 1]\n[{33 + uid % 90}, 40]\n"
+
+
+try:
+    import zstandard  # noqa: F401
+
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+
+class TestFramed(unittest.TestCase):
+    def write_output(self, temp_dir: str) -> tuple[str, list[str]]:
+        records = []
+        for uid in range(100):
+            records.append(record(uid))
+            if uid % 10 == 0:
+                records.append(record(uid, "rc"))
+        os.makedirs(f"{temp_dir}/train")
+        path = f"{temp_dir}/train/READ_1.txt"
+        with open(path, "w") as f:
+            f.write(HEADER + "".join(records))
+        return path, records
+
+    def test_random_access(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path, records = self.write_output(temp_dir)
+            framed = compress_text_output(path, "gzip", frame_reads=16, workers=2)
+            self.assertFalse(os.path.exists(path))
+            self.assertEqual(find_framed_outputs(temp_dir), [framed])
+
+            reader = FramedReader(framed)
+            self.assertEqual((len(reader), reader.frames), (110, 7))
+            self.assertEqual("".join(reader.header()), HEADER)
+            self.assertEqual(reader.record(0), records[0])
+            self.assertEqual(reader.record(109), records[109])
+            self.assertEqual(reader.records(10, 40, workers=3), records[10:40])
+            self.assertEqual(reader.find_uid(50), [record(50), record(50, "rc")])
+            self.assertEqual(reader.find_uid(1000), [])
+            with self.assertRaises(IndexError):
+                reader.record(110)
+
+            # the frames are one valid gzip file holding the text output
+            with gzip.open(framed, "rt") as f:
+                self.assertEqual(f.read(), HEADER + "".join(records))
+
+    def test_find_uid_shuffled(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            _, records = self.write_output(temp_dir)
+            random.Random(3).shuffle(records)
+            with open(f"{temp_dir}/train/READ_1.txt", "w") as f:
+                f.write(HEADER + "".join(records))
+            reader = FramedReader(compress_text_output(f"{temp_dir}/train/READ_1.txt", "gzip", frame_reads=8))
+            # every frame of a shuffled output spans nearly all UIDs
+            self.assertGreater(sum((reader.min_uids <= 51) & (reader.max_uids >= 51)), reader.frames // 2)
+            with mock.patch.object(reader, "read_frame", wraps=reader.read_frame) as read_frame:
+                self.assertEqual(reader.find_uid(51), [record(51)])
+            self.assertEqual(read_frame.call_count, 1)
+            self.assertEqual(sorted(reader.find_uid(50)), sorted([record(50), record(50, "rc")]))
+            self.assertEqual(reader.find_uid(1000), [])
+
+    def test_keep_text(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path, _ = self.write_output(temp_dir)
+            framed = compress_text_output(path, "gzip", frame_reads=1000, keep_text=True)
+            self.assertTrue(os.path.exists(path))
+            self.assertTrue(os.path.exists(seek_table_path(framed)))
+            self.assertEqual(FramedReader(framed).frames, 1)
+
+    @unittest.skipUnless(HAS_ZSTD, "zstandard is not installed")
+    def test_zstd(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path, records = self.write_output(temp_dir)
+            reader = FramedReader(compress_text_output(path, "zstd", frame_reads=8))
+            self.assertEqual(reader.records(0, 110), records)
+
+    def test_unknown_codec(self):
+        with self.assertRaises(ValueError):
+            compress_text_output("READ_1.txt", "bz2")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import tempfile
+import unittest
+
+from saradomin.interleave import interleave_pairs
+
+HEADER: str = "#HEADER#\n#schema=1.row UID\t2.row NUCLEOTIDE \n####END####\n"
+
+
+def write_reads(path: str, records: list[str]) -> None:
+    with open(path, "w") as f:
+        f.write(HEADER + "".join(records))
+
+
+class TestInterleave(unittest.TestCase):
+    def test_pairs_and_labels(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            r1_path, r2_path, output_path = f"{temp_dir}/r1.txt", f"{temp_dir}/r2.txt", f"{temp_dir}/pairs.txt"
+            write_reads(r1_path, ["0\n[0]\n", "1\n[1]\n", "1\trc\n[2]\n"])
+            write_reads(r2_path, ["0\n[3]\n", "1\trc\n[4]\n", "1\n[5]\n"])
+            self.assertEqual(interleave_pairs(r1_path, r2_path, output_path, ["NUCLEOTIDE"]), 3)
+            with open(output_path) as f:
+                header, records = f.read().split("####END####\n")
+            self.assertIn("#schema=1.row UID_R1 UID_R2 CORRECT_PAIR\t2.row R1 NUCLEOTIDE\t3.row R2 NUCLEOTIDE", header)
+            self.assertEqual(records, "0\t0\t1\n[0]\n[3]\n1\t1:rc\t0\n[1]\n[4]\n1:rc\t1\t0\n[2]\n[5]\n")
+
+    def test_different_number_of_reads(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            r1_path, r2_path = f"{temp_dir}/r1.txt", f"{temp_dir}/r2.txt"
+            write_reads(r1_path, ["0\n[0]\n"])
+            write_reads(r2_path, ["0\n[3]\n", "1\n[4]\n"])
+            with self.assertRaises(ValueError):
+                interleave_pairs(r1_path, r2_path, f"{temp_dir}/pairs.txt", ["NUCLEOTIDE"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+
+import numpy as np
+
+from saradomin.kmer import KmerTokenizer, encode_bases
+
+
+class TestKmerTokenizer(unittest.TestCase):
+    def test_encode_bases(self):
+        codes, lengths = encode_bases(["ACGTN", "acgtx"])
+        self.assertEqual(codes.tolist(), [0, 1, 2, 3, 4, 0, 1, 2, 3, 4])
+        self.assertEqual(lengths.tolist(), [5, 5])
+
+    def test_token_ids(self):
+        tokenizer = KmerTokenizer(k=2, stride=1)
+        tokens = tokenizer.tokenize_batch(["ACGT"])[0]
+        # AC = 0*4 + 1, CG = 1*4 + 2, GT = 2*4 + 3
+        self.assertEqual(tokens.tolist(), [1, 6, 11])
+
+    def test_n_token_and_stride(self):
+        tokenizer = KmerTokenizer(k=2, stride=2)
+        tokens = tokenizer.tokenize_batch(["ANGTT"])[0]
+        self.assertEqual(tokens.tolist(), [tokenizer.n_token, 11])
+
+    def test_batch_matches_single_reads(self):
+        sequences = ["ACGTACGTTG", "A", "", "GGNCATTA", "TTTTTTT"]
+        tokenizer = KmerTokenizer(k=3, stride=2)
+        batch_tokens = tokenizer.tokenize_batch(sequences)
+        self.assertEqual(len(batch_tokens), len(sequences))
+        for sequence, tokens in zip(sequences, batch_tokens):
+            np.testing.assert_array_equal(tokens, tokenizer.tokenize_batch([sequence])[0])
+
+    def test_short_reads_have_no_tokens(self):
+        tokenizer = KmerTokenizer(k=6)
+        self.assertEqual([len(tokens) for tokens in tokenizer.tokenize_batch(["ACG", "ACGTAC"])], [0, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from saradomin.fastq import iter_fastq_records
+from saradomin.names import NameIndex, hash_names, merge_name_indexes, name_index_dir, write_name_index
+from saradomin.transform import transform_data_to_vectors
+
+from . import test_config
+
+NAME_INDEX_FILES: list[str] = ["uids.npy", "name_offsets.npy", "names.bin", "hashes.npy", "hash_rows.npy"]
+
+
+def fnv1a(name: bytes) -> int:
+    value = 0xCBF29CE484222325
+    for byte in name:
+        value = ((value ^ byte) * 0x100000001B3) % 2**64
+    return value
+
+
+class TestNameIndex(unittest.TestCase):
+    def test_hash(self):
+        names = [b"", b"a", b"SRR1.1", b"A00123:8:H3:1:1101:1000:2000"]
+        self.assertEqual(hash_names(names).tolist(), [fnv1a(name) for name in names])
+
+    def test_lookups(self):
+        counter = {f"SRR{i * 7919 % 10007}.{i}": 5 + i for i in range(5000)}
+        counter["r2_only"] = 7  # a name of R2 only, its UID is out of order
+        with tempfile.TemporaryDirectory() as temp_dir:
+            index = NameIndex(write_name_index(temp_dir, counter))
+            self.assertEqual(len(index), 5001)
+            names = list(counter) + ["unknown", "SRR1"]
+            self.assertEqual(index.uids_of(names).tolist(), list(counter.values()) + [-1, -1])
+            self.assertEqual(index.uid_of("SRR0.0"), 5)
+            self.assertIsNone(index.uid_of("unknown"))
+            last_name = list(counter)[4999]
+            self.assertEqual(index.names_of([5, 4, 5004, 5005]), ["SRR0.0", None, last_name, None])
+            self.assertIn(index.name_of(7), ("SRR5831.2", "r2_only"))
+
+    def test_hash_collisions(self):
+        counter = {"a": 0, "bb": 1, "cc": 2, "dd": 3}
+        same_hash = mock.patch("saradomin.names.hash_names", lambda names: np.zeros(len(names), dtype=np.uint64))
+        with tempfile.TemporaryDirectory() as temp_dir, same_hash:
+            index = NameIndex(write_name_index(temp_dir, counter))
+            self.assertEqual(index.uids_of(["dd", "a", "cc", "ee", "bb"]).tolist(), [3, 0, 2, -1, 1])
+
+    def test_merge(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            write_name_index(f"{temp_dir}/dataset", {"a": 0, "b": 1, "stale": 2})
+            write_name_index(f"{temp_dir}/lane", {"c": 2, "d": 3})
+            index_dir = name_index_dir(f"{temp_dir}/dataset")
+            merge_name_indexes(index_dir, [index_dir, name_index_dir(f"{temp_dir}/lane")], [2, None])
+            index = NameIndex(index_dir)
+            self.assertEqual(index.uids_of(["a", "b", "c", "d", "stale"]).tolist(), [0, 1, 2, 3, -1])
+            self.assertEqual(index.names_of(range(4)), ["a", "b", "c", "d"])
+
+    def test_chunks(self):
+        counter = {f"read{i}": i for i in range(1000)}
+        counter["r2_only"] = 3
+        with tempfile.TemporaryDirectory() as temp_dir, mock.patch("saradomin.names.HASH_CHUNK", 64):
+            index = NameIndex(write_name_index(temp_dir, dict(list(counter.items())[:1000])))
+            self.assertEqual(index.uids_of(list(counter)[:1000]).tolist(), list(range(1000)))
+            self.assertEqual(index.names_of([0, 999]), ["read0", "read999"])
+            self.assertEqual(sorted(os.listdir(name_index_dir(temp_dir))), sorted(NAME_INDEX_FILES))
+            index = NameIndex(write_name_index(temp_dir, counter))
+            self.assertEqual(index.uids_of(list(counter)).tolist(), list(counter.values()))
+
+    def test_non_ascii_names(self):
+        counter = {"read\u00e9": 0, "\u8aad\u307f": 1, "bad\udcff": 2, "ascii": 3}
+        with tempfile.TemporaryDirectory() as temp_dir:
+            index = NameIndex(write_name_index(temp_dir, counter))
+            self.assertEqual(index.uids_of(list(counter)).tolist(), [0, 1, 2, 3])
+            self.assertEqual(index.names_of(range(4)), list(counter))
+
+    def test_empty(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            index = NameIndex(write_name_index(temp_dir, {}))
+            self.assertEqual(index.uids_of(["a"]).tolist(), [-1])
+            self.assertEqual(index.names_of([0]), [None])
+
+    def test_transform(self):
+        fastq_dir = os.path.abspath(test_config.FASTQ_DIR)
+        fastq_path = next(f"{fastq_dir}/{name}" for name in sorted(os.listdir(fastq_dir)) if "_R1" in name)
+        with open(fastq_path, "r") as f:
+            names = [read_id for read_id, _, _ in iter_fastq_records(f)]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            transform_data_to_vectors(fastq_dir, temp_dir, 0.8, 0.5, 0.5, [0, 1, 0], name_index=True, uid_start=100)
+            index = NameIndex(name_index_dir(temp_dir))
+            self.assertEqual(index.uids_of(names).tolist(), list(range(100, 100 + len(names))))
+            self.assertEqual(index.names_of([100, 99]), [names[0], None])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from saradomin.names import NameIndex, name_index_dir
+from saradomin.partition import plan_work_units, run_work_unit, merge_work_units
+from saradomin.stats import DatasetStats
+from saradomin.transform import transform_data_to_vectors
+
+from . import common, test_config
+
+VERSION: list[int] = [0, 1, 0]
+
+
+def run_worker(plan_path: str, unit_index: int) -> None:
+    run_work_unit(plan_path, unit_index, VERSION, write_stats=True, name_index=True)
+
+
+def read_records(path: str) -> list[str]:
+    with open(path, "r") as f:
+        return [line for line in f if not line.startswith("#")]
+
+
+class TestPartition(unittest.TestCase):
+    """Local workers against a shared directory must produce the same dataset as a single job."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = tempfile.TemporaryDirectory()
+        cls.fastq_dir = os.path.abspath(test_config.FASTQ_DIR)
+        cls.single_dir = f"{cls.temp_dir.name}/single"
+        cls.merged_dir = f"{cls.temp_dir.name}/merged"
+        transform_data_to_vectors(
+            cls.fastq_dir, cls.single_dir, 0.9, 0.5, 0.0, VERSION, write_stats=True, name_index=True
+        )
+
+        plan_path = plan_work_units(cls.fastq_dir, f"{cls.temp_dir.name}/work", 3)
+        with ProcessPoolExecutor(max_workers=3) as executor:
+            list(executor.map(run_worker, [plan_path] * 3, range(3)))
+        merge_work_units(plan_path, cls.merged_dir, 0.9, 0.5, 0.0, VERSION, write_stats=True, name_index=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.temp_dir.cleanup()
+
+    def test_work_dir_removed(self):
+        self.assertFalse(os.path.exists(f"{self.temp_dir.name}/work"))
+
+    def test_same_r1_as_single_job(self):
+        for path in ("train/READ_1.txt", "test/READ_1_test.txt"):
+            self.assertEqual(read_records(f"{self.single_dir}/{path}"), read_records(f"{self.merged_dir}/{path}"))
+
+    def test_same_uids_in_mates(self):
+        for sub_dir, suffix in (("train", ""), ("test", "_test")):
+            uids_r1 = common.get_read_uid_from_output(f"{self.merged_dir}/{sub_dir}/READ_1{suffix}.txt")
+            uids_r2 = common.get_read_uid_from_output(f"{self.merged_dir}/{sub_dir}/READ_2{suffix}_shuffled.txt")
+            self.assertEqual(sorted(uids_r1), sorted(uids_r2))
+
+    def test_merged_stats(self):
+        single = DatasetStats.load(f"{self.single_dir}/stats.npz")
+        merged = DatasetStats.load(f"{self.merged_dir}/stats.npz")
+        for mate in DatasetStats.MATES:
+            self.assertEqual(single.mates[mate].base_counts.tolist(), merged.mates[mate].base_counts.tolist())
+        self.assertEqual(single.counts["train_pairs"], merged.counts["train_pairs"])
+
+    def test_merged_name_index(self):
+        single = NameIndex(name_index_dir(self.single_dir))
+        merged = NameIndex(name_index_dir(self.merged_dir))
+        self.assertEqual(len(single), len(merged))
+        names = single.names_of(range(len(single)))
+        self.assertEqual(merged.names_of(range(len(single))), names)
+        self.assertEqual(merged.uids_of(names).tolist(), list(range(len(single))))
+
+    def test_shared_work_dir_and_units_without_stats(self):
+        work_dir = f"{self.temp_dir.name}/shared"
+        plan_path = plan_work_units(self.fastq_dir, work_dir, 2)
+        with open(f"{work_dir}/notes.txt", "w") as f:
+            f.write("not written by the workers\n")
+        for unit_index in range(2):
+            run_work_unit(plan_path, unit_index, VERSION, write_stats=unit_index == 0)
+        output_dir = f"{self.temp_dir.name}/without_stats"
+        merge_work_units(plan_path, output_dir, 0.9, 0.5, 0.0, VERSION, write_stats=True)
+        self.assertEqual(os.listdir(work_dir), ["notes.txt"])
+        # stats of some units would undercount the reads
+        self.assertFalse(os.path.exists(f"{output_dir}/stats.npz"))
+        self.assertTrue(os.path.exists(f"{output_dir}/train/READ_1.txt"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import pickle
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+from saradomin import transform
+from saradomin.fastq import iter_fastq_records
+from saradomin.names import NameIndex, name_index_dir
+from saradomin.planner import MemoryPlanner, estimate_range_record_count, estimate_record_count, parse_memory_size
+
+from . import test_config
+
+
+def read_records(path: str) -> list[str]:
+    with open(path) as f:
+        return [line for line in f if not line.startswith("#")]
+
+
+class TestPlanner(unittest.TestCase):
+    def test_parse_memory_size(self):
+        self.assertEqual(parse_memory_size("512M"), 512 * 1024**2)
+        self.assertEqual(parse_memory_size(" 8gb "), 8 * 1024**3)
+        self.assertEqual(parse_memory_size("1.5K"), 1536)
+        self.assertEqual(parse_memory_size("1000"), 1000)
+        self.assertEqual(parse_memory_size(2048), 2048)
+        self.assertEqual(parse_memory_size(""), 0)
+        self.assertEqual(parse_memory_size("0"), 0)
+        with self.assertRaises(ValueError):
+            parse_memory_size("many")
+
+    def test_estimate_record_count(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = f"{temp_dir}/reads.fastq"
+            with open(path, "w") as f:
+                f.write("".join(f"@r{i:04d}\nACGT\n+\nIIII\n" for i in range(3000)))
+            self.assertEqual(estimate_record_count(path), 3000)
+            self.assertEqual(estimate_record_count(path, lines_per_record=2), 6000)
+            self.assertEqual(estimate_range_record_count(path), 3000)
+            self.assertEqual(estimate_range_record_count(path, (0, os.path.getsize(path) // 3)), 1000)
+            open(f"{temp_dir}/empty.fastq", "w").close()
+            self.assertEqual(estimate_record_count(f"{temp_dir}/empty.fastq"), 0)
+
+    def test_fits_and_check(self):
+        unlimited = MemoryPlanner()
+        self.assertIsNone(unlimited.available())
+        self.assertTrue(unlimited.fits("stage", 1 << 50))
+
+        planner = MemoryPlanner(1 << 50)
+        self.assertTrue(planner.fits("stage", 1 << 20))
+        self.assertFalse(planner.fits("stage", 1 << 51))
+        exhausted = MemoryPlanner(1)  # the process already uses more
+        self.assertEqual(exhausted.available(), 0)
+        self.assertFalse(exhausted.fits("stage", 1))
+        exhausted.check("stage", 1)  # only warns
+
+        self.assertEqual(pickle.loads(pickle.dumps(planner)).max_memory, 1 << 50)
+
+    def test_concurrent_stages(self):
+        planner = MemoryPlanner(1 << 50)
+        with mock.patch.object(MemoryPlanner, "available", return_value=100):
+            self.assertEqual(planner.concurrent_stages("stages", [10, 40, 30, 20], 4), 4)
+            self.assertEqual(planner.concurrent_stages("stages", [10, 40, 30, 20], 2), 2)
+            self.assertEqual(planner.concurrent_stages("stages", [50, 40, 30, 20], 4), 2)
+            self.assertEqual(planner.concurrent_stages("stages", [150, 40], 2), 0)
+        self.assertEqual(MemoryPlanner().concurrent_stages("stages", [1 << 50] * 4, 3), 3)
+
+    def test_uids_by_position(self):
+        """Without room for the read name dict the reads get the same UIDs by position."""
+        fastq_dir = os.path.abspath(test_config.FASTQ_DIR)
+        fastq_path = next(f"{fastq_dir}/{name}" for name in sorted(os.listdir(fastq_dir)) if "_R1" in name)
+        with open(fastq_path, "r") as f:
+            names = [read_id for read_id, _, _ in iter_fastq_records(f)]
+        outputs = []
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for name, planner in (("dict", None), ("position", MemoryPlanner(1))):
+                random.seed(5)
+                transform.transform_data_to_vectors(
+                    fastq_dir, f"{temp_dir}/{name}", 0.8, 0.5, 0.5, [0, 1, 0], planner=planner, name_index=True
+                )
+                outputs.append(
+                    {
+                        path: read_records(f"{temp_dir}/{name}/{path}")
+                        for path in ("train/READ_1.txt", "train/READ_2_shuffled.txt", "test/READ_1_test.txt")
+                    }
+                )
+                self.assertFalse(os.path.exists(f"{temp_dir}/{name}/spill"))
+            self.assertEqual(outputs[0], outputs[1])
+            index = NameIndex(name_index_dir(f"{temp_dir}/position"))
+            self.assertEqual(index.uids_of(names).tolist(), list(range(len(names))))
+
+
+if __name__ == "__main__":
+    unittest.main()
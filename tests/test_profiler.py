@@ -0,0 +1,74 @@
+import glob
+import os
+import pstats
+import tempfile
+import time
+import unittest
+
+from saradomin import profiler as profiler_module
+from saradomin.profiler import configure_profiling, profiler
+
+
+def busy(seconds: float) -> int:
+    total, end = 0, time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        total += 1
+    return total
+
+
+@profiler
+def inner_stage() -> int:
+    return busy(0.05)
+
+
+@profiler
+def outer_stage() -> int:
+    return busy(0.05) + inner_stage()
+
+
+class TestProfiler(unittest.TestCase):
+    def tearDown(self):
+        configure_profiling()
+
+    def test_disabled_writes_nothing(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            configure_profiling("", f"{temp_dir}/profile")
+            outer_stage()
+            self.assertFalse(os.path.exists(f"{temp_dir}/profile"))
+            self.assertFalse(any(profiler_module.active_stages.values()))
+
+    def test_deterministic_nested_stages(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            configure_profiling("deterministic", temp_dir)
+            outer_stage()
+            outer_prof = glob.glob(f"{temp_dir}/outer_stage.*.prof")
+            inner_prof = glob.glob(f"{temp_dir}/inner_stage.*.prof")
+            self.assertEqual((len(outer_prof), len(inner_prof)), (1, 1))
+
+            # time of the nested stage is left out of the outer stage
+            outer_functions = {name for _, _, name in pstats.Stats(outer_prof[0]).stats}
+            self.assertIn("busy", outer_functions)
+            self.assertNotIn("inner_stage", outer_functions)
+
+            with open(inner_prof[0].replace(".prof", ".collapsed")) as f:
+                lines = f.read().splitlines()
+            self.assertTrue(lines)
+            stack, weight = lines[0].rsplit(" ", 1)
+            self.assertIn("inner_stage (test_profiler.py:", stack.split(";")[0])
+            self.assertGreater(sum(int(line.rsplit(" ", 1)[1]) for line in lines), 10_000)  # microseconds
+
+    def test_sampling_and_memory(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            configure_profiling("sampling", temp_dir, memory=True)
+            outer_stage()
+            with open(glob.glob(f"{temp_dir}/outer_stage.*.collapsed")[0]) as f:
+                stacks = dict(line.rsplit(" ", 1) for line in f.read().splitlines())
+            self.assertTrue(stacks)
+            self.assertTrue(all(stack.startswith("outer_stage (test_profiler.py:") for stack in stacks))
+            self.assertFalse(any("inner_stage" in stack for stack in stacks))
+            with open(glob.glob(f"{temp_dir}/inner_stage.*.memory.txt")[0]) as f:
+                self.assertIn("allocations at the end of inner_stage", f.readline())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import os
+import tempfile
+import unittest
+
+from saradomin import progress
+from saradomin.progress import ProgressExporter, track, write_textfile
+
+
+class TestProgress(unittest.TestCase):
+    def test_counted_reads(self):
+        exporter = ProgressExporter(60, to_log=False)
+        with track("save_fastq", "x_R1.fastq", total_reads=400) as stage:
+            stage.add(100)
+            row = exporter.snapshot()[0]
+            self.assertEqual((row["stage"], row["name"], row["reads"]), ("save_fastq", "x_R1.fastq", 100))
+            self.assertAlmostEqual(row["fraction"], 0.25)
+            self.assertGreater(row["eta_seconds"], 0)
+            self.assertGreater(row["reads_per_second"], 0)
+        self.assertEqual(exporter.snapshot(), [])
+        self.assertEqual(progress.running, {})
+
+    def test_file_position(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with open(f"{temp_dir}/data.bin", "wb") as f:
+                f.write(b"x" * 1000)
+            with open(f"{temp_dir}/data.bin", "rb", buffering=0) as f, track("split_file", file=f) as stage:
+                f.read(250)
+                self.assertEqual((stage.processed_bytes(), stage.total_bytes), (250, 1000))
+                self.assertAlmostEqual(stage.fraction(), 0.25)
+
+    def test_textfile(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = f"{temp_dir}/saradomin.prom"
+            with track("select_pairs", "x_R1.fastq", total_reads=10) as stage:
+                stage.add(5)
+                write_textfile(path, ProgressExporter(60, to_log=False).snapshot())
+            with open(path) as f:
+                text = f.read()
+            self.assertIn("# TYPE saradomin_stage_reads gauge", text)
+            labels = f'stage="select_pairs",input="x_R1.fastq",pid="{os.getpid()}"'
+            self.assertIn(f"saradomin_stage_reads{{{labels}}} 5", text)
+            self.assertIn("saradomin_progress_timestamp_seconds ", text)
+            self.assertEqual(os.listdir(temp_dir), ["saradomin.prom"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import threading
+import time
+import unittest
+
+from saradomin.scheduler import StageGraph
+
+
+class TestStageGraph(unittest.TestCase):
+    def test_dependencies_from_inputs_and_outputs(self):
+        graph = StageGraph()
+        graph.add("a", str, outputs=("x",))
+        graph.add("b", str, inputs=("x", "source"), outputs=("y",))
+        graph.add("c", str, inputs=("x", "y"))
+        self.assertEqual(graph.dependencies(), {"a": set(), "b": {"a"}, "c": {"a", "b"}})
+
+    def test_order_and_results(self):
+        finished: list[str] = []
+
+        def step(name: str) -> str:
+            time.sleep(0.01)
+            finished.append(name)
+            return name.upper()
+
+        graph = StageGraph()
+        graph.add("last", step, "last", inputs=("x", "y"))
+        graph.add("first", step, "first", outputs=("x",))
+        graph.add("second", step, "second", inputs=("x",), outputs=("y",))
+        results = graph.run(max_workers=4)
+        self.assertEqual(finished, ["first", "second", "last"])
+        self.assertEqual(results, {"first": "FIRST", "second": "SECOND", "last": "LAST"})
+        self.assertEqual(graph.timings.keys(), results.keys())
+
+    def test_independent_stages_run_concurrently(self):
+        barrier = threading.Barrier(2, timeout=5)
+        graph = StageGraph()
+        graph.add("a", barrier.wait)
+        graph.add("b", barrier.wait)
+        graph.run(max_workers=2)  # a single worker would wait for the barrier forever
+
+    def test_failure_and_cycle(self):
+        graph = StageGraph()
+        graph.add("fail", int, "not a number")
+        with self.assertRaises(ValueError):
+            graph.run()
+
+        graph = StageGraph()
+        graph.add("a", str, inputs=("y",), outputs=("x",))
+        graph.add("b", str, inputs=("x",), outputs=("y",))
+        with self.assertRaisesRegex(ValueError, "depend on each other"):
+            graph.run()
+
+    def test_process_executor(self):
+        graph = StageGraph()
+        graph.add("a", pow, 2, 10, outputs=("x",))
+        graph.add("b", pow, 3, 2, inputs=("x",))
+        self.assertEqual(graph.run(max_workers=2, executor="process"), {"a": 1024, "b": 9})
+
+
+if __name__ == "__main__":
+    unittest.main()
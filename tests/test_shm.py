@@ -0,0 +1,87 @@
+import os
+import queue
+import tempfile
+import unittest
+from multiprocessing.shared_memory import SharedMemory
+from unittest import mock
+
+import numpy as np
+
+from saradomin.fastq import FastqBatch
+from saradomin.render import render_int_rows
+from saradomin.shm import SharedMemoryEncoder, SharedRing, SlotLayout, encoder_worker
+from saradomin.transform import convert_ascii_score_to_int, encode_sequence, save_fastq
+
+from . import test_config
+
+
+def make_batch(sequences: list[str]) -> FastqBatch:
+    return FastqBatch([f"read{i}" for i in range(len(sequences))], sequences, ["I" * len(s) for s in sequences])
+
+
+class TestRender(unittest.TestCase):
+    def test_same_as_str_of_list(self):
+        rows = [[0, 1, 2], [], [100, 93, 7, 45], [5], []]
+        values = np.array([value for row in rows for value in row], dtype=np.uint8)
+        rendered, row_ends = render_int_rows(values, [len(row) for row in rows])
+        self.assertEqual(rendered.tobytes().decode("ascii"), "".join(f"{str(row)}\n" for row in rows))
+        self.assertEqual(row_ends.tolist(), np.cumsum([len(f"{str(row)}\n") for row in rows]).tolist())
+
+    def test_buffer_too_small(self):
+        with self.assertRaises(ValueError):
+            render_int_rows(np.array([1, 2], dtype=np.uint8), [2], out=np.empty(3, dtype=np.uint8))
+
+
+class TestSharedMemoryEncoder(unittest.TestCase):
+    def test_rows_in_input_order(self):
+        batches = [make_batch(["ACGT", "NNa", "ARa"]), make_batch(["G"]), make_batch(["ACGTACGTAC" * 20, ""])]
+        with SharedMemoryEncoder(workers=2, n_slots=2) as encoder:
+            for expected, (batch, encoded) in zip(batches, encoder.imap(batches)):
+                self.assertIs(batch, expected)
+                for i, (sequence, quality) in enumerate(zip(batch.sequences, batch.qualities)):
+                    self.assertEqual(bytes(encoded.nucleotide_row(i)).decode(), f"{encode_sequence(sequence)}\n")
+                    self.assertEqual(bytes(encoded.score_row(i)).decode(), f"{convert_ascii_score_to_int(quality)}\n")
+
+    def test_worker_detaches_replaced_ring(self):
+        batch = make_batch(["ACGT"])
+        rings = [SharedRing(1, 2 * SlotLayout(1, 4).size) for _ in range(2)]
+        names = [ring.blocks[0].name for ring in rings]
+        events: list[tuple] = []
+        tasks, done = queue.Queue(), mock.Mock()
+        done.put.side_effect = lambda answer: events.append(("done", answer[0]))
+        close = SharedMemory.close
+        try:
+            for number, ring in enumerate(rings):
+                ring.write_batch(0, batch)
+                tasks.put((number, number, names[number]))
+            tasks.put(None)
+            with mock.patch.object(SharedMemory, "close", autospec=True) as close_block:
+                close_block.side_effect = lambda block: (events.append(("close", block.name)), close(block))
+                encoder_worker(tasks, done)
+            self.assertEqual(events, [("done", 0), ("close", names[0]), ("done", 1), ("close", names[1])])
+            self.assertEqual(bytes(rings[1].encoded(0).nucleotide_row(0)).decode(), "[0, 1, 2, 3]\n")
+        finally:
+            for ring in rings:
+                ring.close()
+
+    def test_save_fastq_same_as_inline(self):
+        fastq_dir = os.path.abspath(test_config.FASTQ_DIR)
+        fastq_path = next(f"{fastq_dir}/{name}" for name in sorted(os.listdir(fastq_dir)) if "_R1" in name)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # reads with bases outside ACGTN, encode_sequence writes them as '100'
+            with open(fastq_path) as f, open(f"{temp_dir}/R1.fastq", "w") as mixed:
+                mixed.write(f.read() + "@unknown1\nACGRRN\n+\nIIIIII\n@unknown2\nacgtRaY\n+\nIIIIIII\n")
+            fastq_path = f"{temp_dir}/R1.fastq"
+            outputs: list[bytes] = []
+            for encoder_workers in (0, 2):
+                output_path = f"{temp_dir}/{encoder_workers}.txt"
+                save_fastq(fastq_path, output_path, {}, batch_size=100, encoder_workers=encoder_workers)
+                with open(output_path, "rb") as f:
+                    outputs.append(f.read())
+            self.assertGreater(len(outputs[0]), 0)
+            self.assertIn(b"[0, 1, 2, '100', '100', 4]\n", outputs[0])
+            self.assertEqual(outputs[0], outputs[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import os
+import random
+import tempfile
+import unittest
+
+from saradomin.planner import MemoryPlanner
+from saradomin.transform import split_and_disrupt
+
+HEADER: str = "#HEADER#\n#schema=1.row UID\t2.row NUCLEOTIDE\t3.row SCORE\n####END####\n"
+READS: int = 200
+
+
+def write_reads(path: str, uids: list[int], copies: bool = False) -> None:
+    """Reads in UID order, with copies every even read is followed by an augmented copy."""
+    records = [
+        f"{uid}\n[{uid % 4}]\n[{uid}]\n" + (f"{uid}\trc\n[0]\n[0]\n" if copies and uid % 2 == 0 else "") for uid in uids
+    ]
+    with open(path, "w") as f:
+        f.write(HEADER + "".join(records))
+
+
+def read_uid_lines(path: str) -> list[str]:
+    with open(path) as f:
+        lines = [line.rstrip("\n") for line in f if not line.startswith("#")]
+    return lines[::3]
+
+
+class TestSplitAndDisrupt(unittest.TestCase):
+    def write_dataset(self, output_dir: str, copies: bool = False) -> None:
+        os.makedirs(f"{output_dir}/train")
+        os.makedirs(f"{output_dir}/test")
+        for name in ("READ_1.txt", "READ_2.txt"):
+            write_reads(f"{output_dir}/train/{name}", list(range(READS)), copies)
+
+    def test_process_executor(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self.write_dataset(temp_dir)
+            counts = split_and_disrupt(
+                temp_dir,
+                list(range(READS)),
+                0.8,
+                0.5,
+                0.5,
+                planner=MemoryPlanner(1 << 40),
+                max_workers=2,
+                executor="process",
+            )
+            self.assertEqual((counts["train_pairs"], counts["test_pairs"]), (160, 40))
+            self.assertGreater(counts["train_disrupted"], 0)
+            self.assertEqual(read_uid_lines(f"{temp_dir}/train/READ_1.txt"), [str(uid) for uid in range(160)])
+            shuffled = read_uid_lines(f"{temp_dir}/train/READ_2_shuffled.txt")
+            self.assertEqual(sorted(shuffled, key=int), [str(uid) for uid in range(160)])
+            moved = sum(uid != str(position) for position, uid in enumerate(shuffled))
+            self.assertEqual(moved, counts["train_disrupted"])
+            self.assertEqual(len(read_uid_lines(f"{temp_dir}/test/READ_2_test_shuffled.txt")), 40)
+
+    def test_seeded_stages(self):
+        outputs: list[list[list[str]]] = []
+        for executor in ("thread", "process", "thread"):
+            with tempfile.TemporaryDirectory() as temp_dir:
+                self.write_dataset(temp_dir)
+                random.seed(11)
+                split_and_disrupt(temp_dir, list(range(READS)), 0.5, 0.0, 0.0, max_workers=2, executor=executor)
+                outputs.append(
+                    [
+                        read_uid_lines(f"{temp_dir}/train/READ_2_shuffled.txt"),
+                        read_uid_lines(f"{temp_dir}/test/READ_2_test_shuffled.txt"),
+                    ]
+                )
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual(outputs[0], outputs[2])
+        # the train and test shuffles have seeds of their own, not the same permutation
+        train, test = outputs[0]
+        self.assertNotEqual([int(uid) for uid in train], [int(uid) - 100 for uid in test])
+
+    def test_augmented_copies_are_not_shuffled(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self.write_dataset(temp_dir, copies=True)
+            counts = split_and_disrupt(temp_dir, list(range(READS)), 0.8, 0.0, 0.0)
+            unshuffled = read_uid_lines(f"{temp_dir}/train/READ_1.txt")
+            shuffled = read_uid_lines(f"{temp_dir}/train/READ_2_shuffled.txt")
+            self.assertEqual(len(unshuffled), 240)
+            copies = [position for position, uid in enumerate(unshuffled) if "\t" in uid]
+            self.assertEqual([shuffled[position] for position in copies], [unshuffled[position] for position in copies])
+            moved = sum(uid != expected for uid, expected in zip(shuffled, unshuffled))
+            self.assertEqual(moved, counts["train_disrupted"])
+            self.assertGreater(counts["train_disrupted"], 150)
+            self.assertLessEqual(counts["train_disrupted"], counts["train_pairs"])
+            self.assertLessEqual(counts["test_disrupted"], counts["test_pairs"])
+
+    def test_spilled_indexes(self):
+        """Without room for the record indexes the stages spill them and write the same outputs."""
+        outputs = []
+        for planner in (None, MemoryPlanner(1)):
+            with tempfile.TemporaryDirectory() as temp_dir:
+                self.write_dataset(temp_dir, copies=True)
+                random.seed(3)
+                counts = split_and_disrupt(temp_dir, list(range(READS)), 0.8, 0.25, 0.5, planner=planner)
+                self.assertFalse(os.path.exists(f"{temp_dir}/spill"))
+                paths = ("train/READ_1.txt", "train/READ_2_shuffled.txt", "test/READ_1_test.txt")
+                outputs.append((counts, [read_uid_lines(f"{temp_dir}/{path}") for path in paths]))
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertGreater(outputs[1][0]["train_disrupted"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import tempfile
+import unittest
+
+import numpy as np
+
+from saradomin.fastq import FastqBatch
+from saradomin.stats import DatasetStats, ReadStats
+
+
+def read_stats(sequences: list[str], qualities: list[str]) -> ReadStats:
+    stats = ReadStats()
+    stats.add_sequences(sequences, qualities)
+    return stats
+
+
+class TestStats(unittest.TestCase):
+    def test_accumulation(self):
+        stats = read_stats(["ACG", "TN"], ["!!I", "#+"])
+        self.assertEqual(stats.reads, 2)
+        self.assertEqual(stats.length_counts.tolist(), [0, 0, 1, 1])
+        self.assertEqual(stats.base_counts.tolist(), [[1, 0, 0, 1, 0], [0, 1, 0, 0, 1], [0, 0, 1, 0, 0]])
+        self.assertEqual(np.flatnonzero(stats.quality_counts[0]).tolist(), [0, 2])
+        self.assertEqual(np.flatnonzero(stats.quality_counts[1]).tolist(), [0, 10])
+        self.assertEqual(np.flatnonzero(stats.quality_counts[2]).tolist(), [40])
+
+        stats.add_sequences(["GGGGG"], ["IIIII"])  # a longer read grows the histograms
+        self.assertEqual(stats.base_counts.shape, (5, 5))
+        self.assertEqual(stats.base_counts[:, 2].tolist(), [1, 1, 2, 1, 1])
+        self.assertEqual(stats.length_counts.tolist(), [0, 0, 1, 1, 0, 1])
+
+    def test_add_batch_mask(self):
+        batch = FastqBatch(["a", "b", "c"], ["AA", "CCC", "G"], ["II", "III", "I"])
+        stats = ReadStats()
+        stats.add_batch(batch, np.array([True, False, True]))
+        self.assertEqual(stats.length_counts.tolist(), [0, 1, 1])
+        self.assertEqual(stats.base_counts.sum(axis=0).tolist(), [2, 0, 1, 0, 0])
+
+    def test_merge(self):
+        merged = read_stats(["ACG"], ["III"])
+        merged.merge(read_stats(["TTTTT", "A"], ["IIIII", "!"]))
+        expected = read_stats(["ACG", "TTTTT", "A"], ["III", "IIIII", "!"])
+        self.assertEqual(merged.state(), expected.state())
+
+        restored = ReadStats()
+        restored.set_state(expected.state())
+        self.assertEqual(restored.state(), expected.state())
+
+    def test_dataset_merge_and_round_trip(self):
+        first, second = DatasetStats(), DatasetStats()
+        first.mates["R1"].add_sequences(["ACGT"], ["IIII"])
+        second.mates["R1"].add_sequences(["AC"], ["II"])
+        second.mates["R2"].add_sequences(["GG"], ["##"])
+        first.counts = {"train_pairs": 3, "test_pairs": 1}
+        second.counts = {"train_pairs": 2, "train_disrupted": 1}
+        first.merge(second)
+        self.assertEqual((first.mates["R1"].reads, first.mates["R2"].reads), (2, 1))
+        self.assertEqual(first.counts, {"train_pairs": 5, "test_pairs": 1, "train_disrupted": 1})
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            first.save(f"{temp_dir}/stats.npz")
+            loaded = DatasetStats.load(f"{temp_dir}/stats.npz")
+        self.assertEqual(loaded.counts, first.counts)
+        for mate in DatasetStats.MATES:
+            self.assertEqual(loaded.mates[mate].state(), first.mates[mate].state())
+
+
+if __name__ == "__main__":
+    unittest.main()
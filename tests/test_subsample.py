@@ -0,0 +1,78 @@
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from saradomin.fastq import iter_paired_batches
+from saradomin.selection import select_pairs
+from saradomin.subsample import Subsampler, resync_record, subsample_by_offset
+from saradomin.transform import transform_data_to_vectors
+
+from . import test_config
+
+
+class TestSubsample(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        fastq_dir = os.path.abspath(test_config.FASTQ_DIR)
+        names = sorted(os.listdir(fastq_dir))
+        cls.r1_path = next(f"{fastq_dir}/{name}" for name in names if "_R1" in name)
+        cls.r2_path = next(f"{fastq_dir}/{name}" for name in names if "_R2" in name)
+
+    def test_reservoir_exact_size(self):
+        subsampler = Subsampler("reservoir", reads=100, seed=3)
+        keep_mask = select_pairs(self.r1_path, self.r2_path, subsampler=subsampler, batch_size=64)
+        self.assertEqual(int(keep_mask.sum()), 100)
+        # same seed, same sample whatever the batch size
+        again = select_pairs(self.r1_path, self.r2_path, subsampler=subsampler, batch_size=1000)
+        np.testing.assert_array_equal(keep_mask, again)
+
+    def test_bernoulli_fraction(self):
+        keep_mask = select_pairs(self.r1_path, self.r2_path, subsampler=Subsampler("bernoulli", fraction=0.2))
+        self.assertAlmostEqual(keep_mask.mean(), 0.2, delta=0.05)
+
+    def test_resync_skips_quality_lines_starting_with_at(self):
+        records = b"@r1\nACGT\n+\n@@@@\n@r2\nGGCC\n+\nIIII\n"
+        fastq_file = io.BytesIO(records)
+        self.assertEqual(resync_record(fastq_file, 0), 0)
+        self.assertEqual(resync_record(fastq_file, 1), records.index(b"@r2"))
+        self.assertIsNone(resync_record(fastq_file, records.index(b"@r2") + 1))
+
+    def test_offset_sample_keeps_mates(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            r1_path, r2_path = subsample_by_offset(
+                self.r1_path, self.r2_path, temp_dir, Subsampler("offset", reads=200, seed=5)
+            )
+            read_ids: list[str] = []
+            for batch_r1, batch_r2 in iter_paired_batches(r1_path, r2_path):
+                for read_id_r1, read_id_r2 in zip(batch_r1.read_ids, batch_r2.read_ids):
+                    self.assertEqual(read_id_r1.removesuffix("/1"), read_id_r2.removesuffix("/2"))
+                read_ids += batch_r1.read_ids
+            self.assertEqual(len(read_ids), 200)
+            self.assertEqual(len(set(read_ids)), 200)
+
+    def test_mate_search_reads_few_bytes(self):
+        with open(self.r2_path, "rb") as f:
+            record_size: int = len(b"".join(f.readline() for _ in range(4)))
+        with tempfile.TemporaryDirectory() as temp_dir, mock.patch("os.pread", wraps=os.pread) as pread:
+            subsample_by_offset(self.r1_path, self.r2_path, temp_dir, Subsampler("offset", reads=200, seed=5))
+            # only the R2 mate search reads with pread, one window of a few records per sampled pair
+            self.assertEqual(pread.call_count, 200)
+            self.assertLess(sum(call.args[1] for call in pread.call_args_list) / 200, 20 * record_size)
+
+    def test_offset_sample_removed_on_failure(self):
+        fastq_dir = os.path.dirname(self.r1_path)
+        subsampler = Subsampler("offset", reads=200, seed=5)
+        failing = mock.patch("saradomin.transform.transform_one_read", side_effect=RuntimeError("encoding failed"))
+        with tempfile.TemporaryDirectory() as temp_dir, failing, self.assertRaises(RuntimeError):
+            try:
+                transform_data_to_vectors(fastq_dir, temp_dir, 0.8, 0.5, 0.5, [0, 1, 0], subsampler=subsampler)
+            finally:
+                self.assertFalse(os.path.exists(f"{temp_dir}/subsample"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+
+from saradomin.verify import output_paths, verify_output
+
+HEADER: str = "#HEADER#\n#DATE=2024-04-22T12:47:59\n#schema=1.row UID\t2.row NUCLEOTIDE\t3.row SCORE \n####END####\n"
+
+
+def record(uid: int | str, length: int = 2) -> str:
+    return f"{uid}\n{[1] * length}\n{[66] * length}\n"
+
+
+def write_output(output_dir: str, files: dict[str, list[str]]) -> None:
+    for name, path in output_paths(output_dir).items():
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(HEADER + "".join(files[name]))
+
+
+class TestVerify(unittest.TestCase):
+    def setUp(self):
+        # train pairs 0-3 keep 2 correct pairs, all test pairs are disrupted
+        self.files = {
+            "train_r1": [record(uid) for uid in range(4)] + [record("1\trc")],
+            "train_r2": [record(uid) for uid in (0, 1, 3, 2)],
+            "test_r1": [record(uid) for uid in (4, 5)],
+            "test_r2": [record(uid) for uid in (5, 4)],
+        }
+
+    def verify(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            write_output(temp_dir, self.files)
+            return verify_output(temp_dir, 0.5, 0.0, workers=2, tolerance=0.0, chunk_size=20)
+
+    def test_valid_output(self):
+        report = self.verify()
+        self.assertEqual(report.errors, [])
+        self.assertEqual(report.counts["train_r1_records"], 5)
+        self.assertEqual(report.counts["train_disrupted_fraction"], 0.5)
+
+    def test_lengths_and_duplicates(self):
+        self.files["test_r1"] = [record(4), "5\n[1, 2]\n[66]\n", record(4)]
+        self.files["test_r2"] = [record(5), record(4), record(4)]
+        errors = "\n".join(self.verify().errors)
+        self.assertIn("different sequence and score lengths", errors)
+        self.assertIn("UIDs are not unique", errors)
+
+    def test_partition(self):
+        self.files["test_r1"] = [record(3), record(5)]
+        self.files["test_r2"] = [record(5), record(4)]
+        errors = "\n".join(self.verify().errors)
+        self.assertIn("in both train and test", errors)
+        self.assertIn("test R1 and R2 outputs do not hold the same reads", errors)
+
+    def test_structure(self):
+        self.files["train_r2"][1] = "1\n[1, 1]\n"
+        self.assertTrue(self.verify().errors)
+
+
+if __name__ == "__main__":
+    unittest.main()